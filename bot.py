@@ -3,28 +3,124 @@ Sunshine Solar Sim - Bot Class
 Handles the main functionality of the Discord bot.
 """
 import asyncio
+import copy
+import datetime
 import discord
-import json
 import logging
 import os
+import time
+import weakref
+from discord import app_commands
 from discord.ext import commands, tasks
-from pathlib import Path
+import config
+import rules
+from interactions import deserialize_reply
+from leader import TickLeader, create_lease
+from notifications import NotificationDispatcher, RestTransport
+from production import ProductionMatrix
+from ratelimit import CommandRateLimiter, RequestCoalescer
+from recorder import CommandRecorder
+from sharding import LOCAL_COMMANDS, Partition, PartitionCoordinator
+from startup import StartupTimer
+from storage import StorageError, UserStore, open_storage
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
-# Create data directory if it doesn't exist
-data_dir = Path("data")
-data_dir.mkdir(exist_ok=True)
+# Cogs loaded at startup (also used by the offline replay tool)
+EXTENSIONS = (
+    "cogs.user_management",
+    "cogs.generators",
+    "cogs.batteries",
+    "cogs.economy",
+    "cogs.forecast",
+    "cogs.leaderboard",
+    "cogs.analytics",
+)
 
-# Create empty users.json file if it doesn't exist
-users_file = data_dir / "users.json"
-if not users_file.exists():
-    with open(users_file, "w") as f:
-        json.dump({}, f)
+# Record fields the energy tick and maintenance change
+TICK_FIELDS = ("energy", "money", "energy_fraction")
+
+def command_log_fields(interaction: discord.Interaction):
+    """Structured log fields for a slash command: user, command and latency so far"""
+    started = interaction.extras.get("started")
+    command = interaction.command
+    return {
+        "user_id": str(interaction.user.id),
+        "command": command.qualified_name if command else None,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2) if started is not None else None
+    }
+
+class SolarCommandTree(app_commands.CommandTree):
+    """Command tree that runs global checks in front of every slash command"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Apply per-user rate limits, forward commands for farms owned by another
+        partition, then record the invocation before the command callback runs"""
+        if interaction.type != discord.InteractionType.application_command:
+            return True
+        
+        # Command latency is measured from here (see on_app_command_completion)
+        interaction.extras["started"] = time.perf_counter()
+        
+        data = interaction.data or {}
+        command_name = data.get("name")
+        user_id = str(interaction.user.id)
+        
+        # Reject spam cheaply, before any command work or save happens
+        retry_after = self.client.rate_limiter.check(user_id, command_name)
+        if retry_after:
+            await interaction.response.send_message(
+                f"Slow down! You can use `/{command_name}` again in {retry_after:.1f}s.",
+                ephemeral=True
+            )
+            return False
+        
+        args = {option["name"]: option.get("value") for option in data.get("options", [])}
+        
+        # The owning partition runs the command; this process only relays the reply
+        partition = self.client.partition
+        if partition.enabled and command_name not in LOCAL_COMMANDS and not partition.owns(user_id):
+            # Acknowledge within Discord's 3 seconds; the peer may take longer than that
+            await interaction.response.defer(thinking=True)
+            try:
+                reply = await self.client.coordinator.forward_command(user_id, interaction.user.name, command_name, args)
+            except (ConnectionError, RuntimeError) as e:
+                logger.error("Forwarding /%s for %s failed: %s", command_name, user_id, e,
+                             extra={"user_id": user_id, "command": command_name})
+                reply = {
+                    "content": "Your solar farm is temporarily unreachable. Please try again in a moment.",
+                    "ephemeral": True
+                }
+            kwargs = deserialize_reply(reply)
+            # The first followup would replace the public "thinking" message, which
+            # cannot become ephemeral; remove it so the reply is sent on its own
+            if kwargs["ephemeral"]:
+                await interaction.delete_original_response()
+            await interaction.followup.send(**kwargs)
+            return False
+        
+        recorder = self.client.recorder
+        if recorder is not None:
+            recorder.record_command(user_id, interaction.user.name, command_name, args)
+        return True
+    
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """Log a failed command with its user, name and latency"""
+        command = interaction.command
+        logger.error("Ignoring exception in command %r", command.name if command else None,
+                     exc_info=error, extra=command_log_fields(interaction))
 
 class SunshineSolarBot(commands.Bot):
-    def __init__(self):
+    # Location of persisted user data
+    users_file_path = "data/users.json"
+    default_file_path = "data/default_users.json"
+    
+    # Storage backend for user records (see storage/)
+    storage_backend = config.STORAGE_BACKEND
+    storage_url = config.STORAGE_URL
+
+    def __init__(self, partition: Partition = None, **options):
         # Initialize the bot with intents
         # Using default intents only to avoid requiring privileged intents
         intents = discord.Intents.default()
@@ -38,187 +134,559 @@ class SunshineSolarBot(commands.Bot):
             command_prefix=commands.when_mentioned,  # Only respond to @mentions for text commands
             intents=intents,
             help_command=None,  # We'll create our own help command
-            application_id=os.getenv("APPLICATION_ID")  # App ID is needed for slash commands
+            tree_cls=SolarCommandTree,
+            application_id=os.getenv("APPLICATION_ID"),  # App ID is needed for slash commands
+            **options
         )
         
-        # Store of user data
+        # Farms owned by this process; with several partitions each keeps its own file
+        # and takes its share of the unpartitioned users.json the first time it starts
+        self.partition = partition or Partition.from_env()
+        self.coordinator = None
+        if self.partition.enabled:
+            self.users_file_path = f"data/users.{self.partition.index}.json"
+            self.default_file_path = SunshineSolarBot.users_file_path
+            self.coordinator = PartitionCoordinator(self, self.partition)
+        
+        # Store of user data, the local read-through cache of the storage backend
         self.user_data = {}
+        self._storage = None
+        
+        # Users changed since the last write, flushed in one batch by flush_data
+        self._dirty = set()
+        self._flush_task = None
+        
+        # One lock per user with a transaction in progress (see update_farm)
+        self._farm_locks = weakref.WeakValueDictionary()
+        
+        # Tick lease, when several instances share storage (see leader.py)
+        self.tick_leader = None
+        
+        # Command usage counter (shown by /analytics, incremented by several cogs)
+        self.command_count = 0
+        
+        # Optional command recorder, enabled with the RECORD_COMMANDS env var
+        self.recorder = None
+        
+        # Direct-message notifications (config.NOTIFICATIONS) and the farms whose
+        # gas generators the tick last found out of money, so each stop is reported once
+        self.notifier = None
+        self._out_of_fuel = set()
+        
+        # Phase timings of this start, reported at the first on_ready (see startup.py)
+        self.startup = StartupTimer()
+        
+        # Per-user command budgets and shared in-flight reads
+        self.rate_limiter = CommandRateLimiter(config.COMMAND_RATE_LIMITS, config.DEFAULT_COMMAND_RATE_LIMIT)
+        self.coalescer = RequestCoalescer()
         
-        # Energy generation rates (per minute)
-        self.generation_rates = {
-            "solar_panel": 15,   # 15 energy per minute per panel
-            "wind_turbine": 25,  # 25 energy per minute per turbine
-            "gas_generator": 40, # 40 energy per minute per generator
-        }
-        
-        # Generator prices
-        self.generator_prices = {
-            "solar_panel": 1000,
-            "wind_turbine": 2500,
-            "gas_generator": 5000
-        }
-        
-        # Generator maintenance costs (per day)
-        self.maintenance_costs = {
-            "solar_panel": 20,
-            "wind_turbine": 75,
-            "gas_generator": 200
-        }
-        
-        # Gas costs (per minute of operation)
-        self.gas_cost = 5
-        
-        # Battery capacity per tier
-        self.battery_capacities = {
-            1: 1000,    # Tier 1: 1000 energy
-            2: 3000,    # Tier 2: 3000 energy
-            3: 10000,   # Tier 3: 10000 energy
-            4: 50000,   # Tier 4: 50000 energy
-            5: 250000   # Tier 5: 250000 energy
-        }
-        
-        # Battery tier prices
-        self.battery_prices = {
-            1: 2000,
-            2: 7500,
-            3: 25000,
-            4: 100000,
-            5: 500000
-        }
-        
-        # Energy selling price (per unit)
-        self.energy_price = 0.1  # $0.1 per energy unit
+        # Balance tables, hot-reloaded from config.BALANCE_FILE by watch_balance
+        self.balance = config.load_balance(config.BALANCE_FILE)
+        self._balance_mtime = os.path.getmtime(config.BALANCE_FILE)
+        
+        # Generator counts of every user as rows aligned with the catalog
+        self.fleet = ProductionMatrix(self.balance.generator_types)
+    
+    # Read-only views of the current balance tables, swapped as a whole on reload
+    @property
+    def generation_rates(self):
+        return self.balance.generation_rates
+    
+    @property
+    def generator_prices(self):
+        return self.balance.generator_prices
+    
+    @property
+    def maintenance_costs(self):
+        return self.balance.maintenance_costs
+    
+    @property
+    def battery_capacities(self):
+        return self.balance.battery_capacities
+    
+    @property
+    def battery_prices(self):
+        return self.balance.battery_prices
+    
+    @property
+    def energy_price(self):
+        return self.balance.energy_price
+    
+    @property
+    def game_config(self):
+        """Balance tables in the dict layout used by helpers and rules"""
+        return self.balance.config
+    
+    def reload_balance(self) -> bool:
+        """Recompile the balance file and swap it in; keeps the old tables on error
+        or when they lack a battery tier or generator type a cached farm uses"""
+        try:
+            mtime = os.path.getmtime(config.BALANCE_FILE)
+            balance = config.load_balance(config.BALANCE_FILE, self.balance.version + 1)
+        except (OSError, ValueError) as e:
+            logger.error("Balance reload failed, keeping version %s: %s", self.balance.version, e)
+            return False
+        
+        # Tables that drop a tier or generator type still in use would break the tick
+        uncovered = {}
+        for user_id, data in self.user_data.items():
+            problems = rules.catalog_problems(data, balance.config)
+            if problems:
+                uncovered[user_id] = problems
+        if uncovered:
+            user_id, problems = next(iter(uncovered.items()))
+            logger.error("Balance reload rejected, keeping version %s: %d farms are not covered "
+                         "by the new tables (user %s: %s)", self.balance.version, len(uncovered),
+                         user_id, "; ".join(problems))
+            return False
+        
+        # The matrix columns follow the catalog; rebuild it and swap the tables
+        # without awaiting in between, so the tick never sees them disagree
+        self.fleet.rebuild(self.user_data, balance.generator_types)
+        self.balance = balance
+        self._balance_mtime = mtime
+        self.dispatch("balance_reload", balance)
+        logger.info("Loaded balance version %s from %s", balance.version, config.BALANCE_FILE)
+        return True
+    
+    async def login(self, token: str):
+        """Log in to Discord; setup_hook runs at the end of this"""
+        self.startup.begin("login")
+        await super().login(token)
+        # The gateway connection starts once login returns
+        self.startup.begin("ready")
     
     async def setup_hook(self):
         """Called when the bot is setting up"""
+        self.startup.end("login")
         logger.info("Setting up Sunshine Solar Sim Bot...")
         
-        # Load user data
-        self.load_data()
+        # Load user data (storage I/O runs in an executor) while the cogs load;
+        # the cogs only read user_data when a command runs
+        await asyncio.gather(
+            self.startup.measure("load", self.load_data()),
+            self.startup.measure("cogs", self.load_extensions())
+        )
+        
+        # Accept forwarded commands from the other partitions
+        if self.coordinator is not None:
+            await self.coordinator.start()
+        
+        # Compete for the tick lease; each partition elects its own ticker
+        if self.partition.enabled:
+            lease_name = f"tick.{self.partition.index}"
+            lock_path = f"{config.TICK_LEASE_FILE}.{self.partition.index}"
+        else:
+            lease_name, lock_path = "tick", config.TICK_LEASE_FILE
+        lease = create_lease(config.TICK_LEASE, self, lease_name, lock_path)
+        if lease is not None:
+            if not self.storage.shared:
+                logger.warning("A tick lease is configured but the storage backend is not shared between instances")
+            self.tick_leader = TickLeader(lease, config.TICK_LEASE_SECONDS)
+            await self.tick_leader.step()
+            self.renew_tick_lease.start()
         
-        # Register cogs
-        await self.load_extension("cogs.user_management")
-        await self.load_extension("cogs.generators")
-        await self.load_extension("cogs.batteries")
-        await self.load_extension("cogs.economy")
+        # Deliver farm notifications; the tick only queues events
+        if config.NOTIFICATIONS:
+            self.notifier = NotificationDispatcher(
+                RestTransport(self.http.token),
+                workers=config.NOTIFY_WORKERS,
+                flush_seconds=config.NOTIFY_FLUSH_SECONDS,
+                queue_size=config.NOTIFY_QUEUE_SIZE,
+                global_rate=config.NOTIFY_GLOBAL_RATE
+            )
+            await self.notifier.start()
+        
+        # Start recording commands if requested
+        record_path = os.getenv("RECORD_COMMANDS")
+        if record_path:
+            self.recorder = CommandRecorder(record_path, self.user_data)
+            logger.info("Recording commands to %s", record_path)
         
         # Start background tasks
         self.generate_energy.start()
         self.apply_maintenance_costs.start()
+        self.watch_balance.start()
         
         logger.info("Bot setup complete!")
     
+    async def load_extensions(self):
+        """Register the cogs"""
+        for extension in EXTENSIONS:
+            await self.load_extension(extension)
+    
     async def on_ready(self):
         """Called when the bot is ready"""
-        logger.info(f"Logged in as {self.user.name} ({self.user.id})")
+        self.startup.end("ready")
+        logger.info("Logged in as %s (%s)", self.user.name, self.user.id)
         
-        # Sync application commands with Discord
-        try:
-            synced = await self.tree.sync()
-            logger.info(f"Synced {len(synced)} application commands with Discord")
-        except Exception as e:
-            logger.error(f"Failed to sync application commands: {str(e)}")
+        # Sync application commands with Discord (commands are global, one partition is enough)
+        if self.partition.index != 0:
+            logger.info("Partition %s leaves command sync to partition 0", self.partition.index)
+        else:
+            try:
+                synced = await self.startup.measure("sync", self.tree.sync())
+                logger.info("Synced %d application commands with Discord", len(synced))
+            except Exception as e:
+                logger.error("Failed to sync application commands: %s", e)
         
         await self.change_presence(activity=discord.Game(name="⚡ Sunshine Solar Sim"))
+        self.startup.report()
+    
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        """Log every finished slash command (sampled, see config.LOG_SAMPLE_RATES)"""
+        fields = command_log_fields(interaction)
+        logger.info("/%s for %s took %sms", fields["command"], fields["user_id"], fields["latency_ms"],
+                    extra=dict(fields, event="command"))
+    
+    async def close(self):
+        """Write pending saves and finish the command recording, if any, before shutting down"""
+        if self.coordinator is not None:
+            await self.coordinator.close()
+        if self.tick_leader is not None:
+            self.renew_tick_lease.cancel()
+            await self.tick_leader.release()
+        if self.notifier is not None:
+            await self.notifier.close()
+        if self._storage is not None:
+            await self.flush_data()
+            await self._storage.close()
+        if self.recorder is not None:
+            self.recorder.close(self.user_data)
+            self.recorder = None
+        await super().close()
         
-    def load_data(self):
-        """Load user data from JSON file"""
-        # Define the path to user data
-        users_file_path = "data/users.json"
-        default_file_path = "data/default_users.json"
-        
-        try:
-            # Try to load existing user data
-            with open(users_file_path, "r") as f:
-                self.user_data = json.load(f)
-            logger.info(f"Loaded data for {len(self.user_data)} users")
-        except FileNotFoundError:
-            # If the main file is not found, try to use the default file
-            logger.warning(f"User data file {users_file_path} not found")
+    @property
+    def storage(self) -> UserStore:
+        """Storage backend, opened on first use so subclasses can change the paths first"""
+        if self._storage is None:
+            self._storage = self.open_storage()
+        return self._storage
+    
+    def open_storage(self) -> UserStore:
+        """Create the configured storage backend"""
+        return open_storage(self.storage_backend, self.storage_url,
+                            self.users_file_path, self.default_file_path)
+    
+    async def load_data(self):
+        """Load user data from storage"""
+        # Keep only the farms this partition owns (splits users.json on first start)
+        owns = self.partition.owns if self.partition.enabled else None
+        self.user_data = await self.storage.load_all(owns)
+        # Records saved with float balances are converted once and written back
+        migrated = [user_id for user_id, data in self.user_data.items()
+                    if rules.migrate_record(data, self.game_config)]
+        if migrated:
+            logger.info("Converted %d users to integer balances", len(migrated))
+            await self.save_migrated(*migrated)
+        self.fleet.rebuild(self.user_data)
+    
+    async def save_migrated(self, *user_ids: str):
+        """Write converted records back without overwriting another instance's writes"""
+        if not self.storage.shared:
+            self.save_data(*user_ids)
+            return
+        for user_id in user_ids:
+            version = self.storage.version(user_id)
+            if not await self.storage.put_if_version(user_id, self.user_data[user_id], version):
+                # Another instance converted or changed it first; re-read its copy
+                self.storage.invalidate([user_id])
+    
+    def save_data(self, *user_ids: str):
+        """Mark users for saving (all users when none are given) and schedule a batched write"""
+        self._dirty.update(user_ids or self.user_data)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush_data())
+    
+    async def flush_data(self):
+        """Write every user marked by save_data to storage"""
+        while self._dirty:
+            user_ids, self._dirty = self._dirty, set()
+            records = {user_id: self.user_data[user_id] for user_id in user_ids if user_id in self.user_data}
             try:
-                with open(default_file_path, "r") as f:
-                    self.user_data = json.load(f)
-                logger.info(f"Loaded default data template")
-            except (FileNotFoundError, json.JSONDecodeError):
-                # If no default file or it's invalid, start with empty data
-                logger.warning("No default user data found. Starting with empty data.")
-                self.user_data = {}
-            
-            # Create the users.json file
-            self.save_data()
-        except json.JSONDecodeError:
-            logger.error("Error decoding user data. Creating a new data file.")
-            self.user_data = {}
-            self.save_data()
+                await self.storage.put_many(records)
+                logger.debug("Saved %d users", len(records))
+            except (OSError, StorageError) as e:
+                # Keep them marked; the next save retries
+                logger.error("Failed to save user data: %s", e)
+                self._dirty.update(user_ids)
+                return
     
-    def save_data(self):
-        """Save user data to JSON file"""
-        users_file_path = "data/users.json"
+    async def fetch_farm(self, user_id: str):
+        """A user's record from the local cache, read through to storage when
+        missing or changed by another instance; None if the user has no farm"""
+        data = self.user_data.get(user_id)
+        if not self.storage.shared:
+            return data
+        await self.storage.poll()
+        if data is not None and not self.storage.is_stale(user_id):
+            return data
+        data = await self.storage.get(user_id)
+        self._cache_records({user_id: data})
+        return data
+    
+    async def refresh_stale(self) -> bool:
+        """Re-read every cached record another instance has changed; False,
+        with those records still marked stale, if storage could not be read"""
+        if not self.storage.shared:
+            return True
+        stale = []
+        try:
+            await self.storage.poll()
+            stale = [user_id for user_id in self.storage.take_stale()
+                     if not self.partition.enabled or self.partition.owns(user_id)]
+            if stale:
+                self._cache_records(await self.storage.get_many(stale))
+        except (OSError, StorageError) as e:
+            logger.error("Failed to re-read %d changed users: %s", len(stale), e)
+            self.storage.invalidate(stale)
+            return False
+        return True
+    
+    def farm_lock(self, user_id: str) -> asyncio.Lock:
+        """Lock serializing this instance's transactions on one farm; dropped once unused"""
+        lock = self._farm_locks.get(user_id)
+        if lock is None:
+            lock = self._farm_locks[user_id] = asyncio.Lock()
+        return lock
+    
+    async def update_farm(self, user_id: str, mutate):
+        """Run `mutate` as a transaction on a user's farm and return its result
+        with the record as committed.
         
-        # Make sure the directory exists
-        os.makedirs(os.path.dirname(users_file_path), exist_ok=True)
+        `mutate` gets a private copy of the record (None if the user has no farm)
+        and changes it in place without awaiting; raising rules.RuleError aborts
+        without writing. The copy replaces the record only if nothing else wrote
+        it in the meantime, otherwise `mutate` runs again on a fresh copy. Only
+        commands on the same farm wait for each other.
+        """
+        async with self.farm_lock(user_id):
+            for _ in range(config.FARM_TRANSACTION_ATTEMPTS):
+                current = await self.fetch_farm(user_id)
+                version = self.storage.version(user_id)
+                data = copy.deepcopy(current)
+                result = mutate(data)
+                if data is None or await self._commit_farm(user_id, data, current, version):
+                    return result, data
+                logger.debug("Transaction on farm %s lost a race, retrying", user_id,
+                             extra={"user_id": user_id, "event": "transaction_retry"})
+        raise rules.RuleError("Your solar farm is busy right now. Please try again in a moment.")
+    
+    async def create_farm(self, user_id: str, data) -> bool:
+        """Store a new farm unless the user already has one; True if it was created"""
+        async with self.farm_lock(user_id):
+            if await self.fetch_farm(user_id) is not None:
+                return False
+            return await self._commit_farm(user_id, data, None, None)
+    
+    async def _commit_farm(self, user_id: str, data, current, version) -> bool:
+        """Replace the record read as `current` (at storage `version`, None for a
+        new farm) with `data`; False if it changed since it was read"""
+        if self.storage.shared:
+            if not await self.storage.put_if_version(user_id, data, version):
+                # Re-read on the next attempt
+                self.storage.invalidate([user_id])
+                return False
+        elif self.user_data.get(user_id) is not current:
+            return False
+        self._cache_records({user_id: data})
+        if not self.storage.shared:
+            self.save_data(user_id)
+        return True
+    
+    async def commit_deltas(self, deltas, rule):
+        """Persist a tick's changes, already applied to user_data.
         
-        try:
-            with open(users_file_path, "w") as f:
-                json.dump(self.user_data, f, indent=4)
-            logger.debug("User data saved successfully")
-        except Exception as e:
-            logger.error(f"Failed to save user data: {str(e)}")
-            # In a production environment, you might want to implement a backup mechanism here
+        Shared backends get increments rather than whole records, so a command
+        committed by another instance during the tick is never overwritten.
+        The increments only land on records still at the version the tick
+        read; the others are re-read and `rule(data)`, the tick for one
+        record, is worked out again on what is stored.
+        """
+        if not self.storage.shared:
+            self.save_data()
+            return
+        for _ in range(config.FARM_TRANSACTION_ATTEMPTS):
+            if not deltas:
+                return
+            records = {user_id: self.user_data[user_id] for user_id in deltas}
+            expected = {user_id: self.storage.version(user_id) for user_id in deltas}
+            # Until the increments land, these cached records are ahead of storage;
+            # a transaction in the meantime must re-read rather than commit them
+            self.storage.forget(deltas)
+            try:
+                versions = await self.storage.apply_deltas(deltas, expected)
+            except (OSError, StorageError) as e:
+                logger.error("Failed to save tick results for %d users: %s", len(deltas), e)
+                return
+            moved = []
+            for user_id, version in versions.items():
+                if version is None:
+                    moved.append(user_id)
+                # A record nobody replaced here meanwhile is exactly what storage holds now
+                elif self.user_data.get(user_id) is records[user_id]:
+                    self.storage.confirm(user_id, version)
+                else:
+                    self.storage.invalidate([user_id])
+            if not moved:
+                return
+            
+            # Redo the tick for the records written elsewhere since it read them
+            try:
+                fresh = await self.storage.get_many(moved)
+            except (OSError, StorageError) as e:
+                logger.error("Failed to re-read %d users for the tick: %s", len(moved), e)
+                return
+            self._cache_records(fresh)
+            deltas = {}
+            for user_id, data in fresh.items():
+                if data is None:
+                    continue
+                before = {field: data.get(field, 0) for field in TICK_FIELDS}
+                rule(data)
+                changes = {field: data.get(field, 0) - before[field] for field in TICK_FIELDS
+                           if data.get(field, 0) != before[field]}
+                if changes:
+                    deltas[user_id] = changes
+        if deltas:
+            # The last redo is only in user_data; read those records again next time
+            self.storage.forget(deltas)
+            logger.warning("Gave up on tick results for %d users changed on every attempt", len(deltas))
+    
+    def _cache_records(self, records):
+        """Put freshly read records into user_data and the production matrix"""
+        for user_id, data in records.items():
+            if data is None:
+                if self.user_data.pop(user_id, None) is not None:
+                    self.fleet.rebuild(self.user_data)
+            else:
+                self.user_data[user_id] = data
+                self.fleet.update(user_id, data.get("generators", {}))
+    
+    def clock(self) -> float:
+        """Current Unix time; the production model is keyed on it"""
+        return time.time()
+    
+    def runs_ticks(self) -> bool:
+        """True when this instance should run the tick and maintenance"""
+        return self.tick_leader is None or self.tick_leader.is_leader()
+    
+    def sync_fleet(self):
+        """Rebuild the production matrix if it has lost track of user_data"""
+        if len(self.fleet.user_ids) != len(self.user_data):
+            logger.warning("Production matrix out of step with user data, rebuilding")
+            self.fleet.rebuild(self.user_data)
     
     @tasks.loop(minutes=1.0)
     async def generate_energy(self):
         """Background task to generate energy for all users every minute"""
-        for user_id, data in self.user_data.items():
-            # Calculate energy generated by each type of generator
-            solar_energy = data.get("generators", {}).get("solar_panel", 0) * self.generation_rates["solar_panel"]
-            wind_energy = data.get("generators", {}).get("wind_turbine", 0) * self.generation_rates["wind_turbine"]
-            
-            # Gas generators require money for fuel
-            gas_generators = data.get("generators", {}).get("gas_generator", 0)
-            gas_energy = 0
-            if gas_generators > 0:
-                gas_cost_total = gas_generators * self.gas_cost
-                if data["money"] >= gas_cost_total:
-                    # User can afford to run gas generators
-                    data["money"] -= gas_cost_total
-                    gas_energy = gas_generators * self.generation_rates["gas_generator"]
-            
-            # Calculate total energy generated
-            energy_generated = solar_energy + wind_energy + gas_energy
-            
-            # Add energy to storage, respecting battery capacity
-            battery_tier = data.get("battery_tier", 1)
-            max_capacity = self.battery_capacities[battery_tier]
-            data["energy"] = min(data["energy"] + energy_generated, max_capacity)
+        # Standby instances serve commands but leave the tick to the lease holder
+        if not self.runs_ticks():
+            return
+        
+        now = self.clock()
+        if self.recorder is not None:
+            self.recorder.record_tick("generate_energy", now)
+        
+        # Skip the tick rather than work it out on records known to be out of date
+        if not await self.refresh_stale():
+            return
+        balance = self.balance
+        capacities = balance.battery_capacities
+        self.sync_fleet()
+        
+        # One lookup per generator type scales the rates for this minute's sun
+        # and wind, then one matrix product gives every user's output and fuel.
+        # Auto-sell policies run in the same pass, instead of players spamming /sell
+        totals = self.fleet.product(balance.tick_matrix_at(int(now // 60)))
+        shared = self.storage.shared
+        notifier = self.notifier
+        deltas = {}
+        for user_id, (free_output, fueled_output, fuel) in zip(self.fleet.user_ids, totals):
+            data = self.user_data[user_id]
+            energy, money, fraction = data["energy"], data["money"], data.get("energy_fraction", 0)
+            capacity = capacities[data.get("battery_tier", 1)]
+            rules.apply_generation(data, free_output, fueled_output, fuel, capacity, balance.config)
+            # Shared storage is sent what changed, not the records
+            if shared and (data["energy"] != energy or data["money"] != money
+                           or data["energy_fraction"] != fraction):
+                deltas[user_id] = {"energy": data["energy"] - energy, "money": data["money"] - money,
+                                   "energy_fraction": data["energy_fraction"] - fraction}
+            # Queue a notice when the battery has just filled or the gas generators just stopped
+            if notifier is not None:
+                if energy < capacity <= data["energy"]:
+                    notifier.notify(user_id, "battery_full", capacity=capacity)
+                if fuel > 0 and money < fuel:
+                    if user_id not in self._out_of_fuel:
+                        self._out_of_fuel.add(user_id)
+                        notifier.notify(user_id, "fuel_stopped", fuel=round(fuel))
+                else:
+                    self._out_of_fuel.discard(user_id)
         
         # Save the updated data
-        self.save_data()
+        minute = int(now // 60)
+        await self.commit_deltas(deltas, lambda data: rules.generate_tick(data, balance.config, minute))
     
     @generate_energy.before_loop
     async def before_generate_energy(self):
         """Wait until the bot is ready before starting the task"""
         await self.wait_until_ready()
     
-    @tasks.loop(hours=24.0)
+    # A fixed time of day, so every instance agrees when maintenance is due
+    # and a restart does not charge it again
+    @tasks.loop(time=datetime.time(hour=0, tzinfo=datetime.timezone.utc))
     async def apply_maintenance_costs(self):
         """Apply daily maintenance costs to generators"""
-        for user_id, data in self.user_data.items():
-            total_maintenance = 0
-            
-            # Calculate maintenance costs for each type of generator
-            for generator_type, count in data.get("generators", {}).items():
-                maintenance_cost = self.maintenance_costs.get(generator_type, 0) * count
-                total_maintenance += maintenance_cost
-            
-            # Apply maintenance costs
-            if total_maintenance > 0:
-                data["money"] = max(0, data["money"] - total_maintenance)
+        if not self.runs_ticks():
+            return
+        
+        if self.recorder is not None:
+            self.recorder.record_tick("apply_maintenance_costs")
+        
+        # Skip the tick rather than work it out on records known to be out of date
+        if not await self.refresh_stale():
+            return
+        self.sync_fleet()
+        totals = self.fleet.product(self.balance.maintenance_matrix)
+        deltas = {}
+        for user_id, (total_maintenance,) in zip(self.fleet.user_ids, totals):
+            data = self.user_data[user_id]
+            money = data["money"]
+            rules.charge_maintenance(data, total_maintenance)
+            if data["money"] != money:
+                deltas[user_id] = {"money": data["money"] - money}
+                if self.notifier is not None:
+                    self.notifier.notify(user_id, "maintenance", cost=money - data["money"], days=1)
         
         # Save the updated data
-        self.save_data()
+        game_config = self.game_config
+        await self.commit_deltas(deltas, lambda data: rules.apply_maintenance(data, game_config))
     
     @apply_maintenance_costs.before_loop
     async def before_apply_maintenance_costs(self):
         """Wait until the bot is ready before starting the task"""
         await self.wait_until_ready()
+    
+    @tasks.loop(seconds=config.BALANCE_RELOAD_SECONDS)
+    async def watch_balance(self):
+        """Reload the balance tables when the balance file changes"""
+        try:
+            mtime = os.path.getmtime(config.BALANCE_FILE)
+        except OSError as e:
+            logger.warning("Cannot check balance file: %s", e)
+            return
+        if mtime != self._balance_mtime:
+            # Remember the change even if it fails to load, so a broken file is reported once
+            self._balance_mtime = mtime
+            self.reload_balance()
+    
+    @tasks.loop(seconds=config.TICK_LEASE_RENEW_SECONDS)
+    async def renew_tick_lease(self):
+        """Take or extend the tick lease"""
+        await self.tick_leader.step()
+
+class ShardedSunshineSolarBot(SunshineSolarBot, commands.AutoShardedBot):
+    """SunshineSolarBot running several gateway shards in one process.
+
+    Takes the shard_count and shard_ids options of discord.AutoShardedClient.
+    """
@@ -5,6 +5,7 @@ Provides usage statistics and bot status information.
 import discord
 import logging
 import datetime
+import time
 from discord import app_commands
 from discord.ext import commands
 
@@ -65,12 +66,72 @@ class Analytics(commands.Cog):
                 inline=True
             )
         
+        # Add rate limiting counters so limits can be tuned under real traffic
+        if hasattr(self.bot, 'rate_limiter'):
+            limiter_stats = self.bot.rate_limiter.stats()
+            rejected = sum(counts["rejected"] for counts in limiter_stats.values())
+            allowed = sum(counts["allowed"] for counts in limiter_stats.values())
+            busiest = sorted(limiter_stats.items(), key=lambda item: item[1]["rejected"], reverse=True)[:3]
+            limiter_text = f"{rejected:,} rejected / {allowed:,} allowed"
+            for command, counts in busiest:
+                if counts["rejected"]:
+                    limiter_text += f"\n`/{command}`: {counts['rejected']:,} rejected"
+            limiter_text += f"\n{self.bot.coalescer.coalesced:,} reads coalesced"
+            embed.add_field(name="🚦 Rate Limiting", value=limiter_text, inline=False)
+        
+        # Add partition traffic when user state is split across processes
+        coordinator = getattr(self.bot, 'coordinator', None)
+        if coordinator is not None:
+            partition = coordinator.partition
+            embed.add_field(
+                name="🧩 Partition",
+                value=(f"{partition.index + 1} of {partition.count}\n"
+                       f"{coordinator.forwarded:,} commands forwarded, {coordinator.served:,} served\n"
+                       f"{coordinator.failures:,} peer failures"),
+                inline=False
+            )
+        shard_ids = getattr(self.bot, 'shard_ids', None)
+        if shard_ids:
+            embed.add_field(name="🛰️ Shards", value=f"{len(shard_ids)} of {self.bot.shard_count} in this process", inline=True)
+        
+        # Add tick lease metrics when instances elect a tick leader
+        tick_leader = getattr(self.bot, 'tick_leader', None)
+        if tick_leader is not None:
+            if tick_leader.is_leader():
+                held = datetime.timedelta(seconds=int(time.time() - tick_leader.leader_since))
+                role = f"👑 Running the ticks (for {held})"
+            else:
+                role = "⏸️ Standby"
+            renewed = (f"{time.time() - tick_leader.last_renewal:.0f}s ago"
+                       if tick_leader.last_renewal is not None else "never")
+            embed.add_field(
+                name="🗳️ Tick Lease",
+                value=(f"{role}\n"
+                       f"{tick_leader.lease.kind} lease, {tick_leader.ttl:.0f}s TTL, last renewed {renewed}\n"
+                       f"{tick_leader.acquisitions:,} acquired, {tick_leader.losses:,} lost, "
+                       f"{tick_leader.failures:,} renewal errors"),
+                inline=False
+            )
+        
+        # Add notification delivery counters when DMs are enabled
+        notifier = getattr(self.bot, 'notifier', None)
+        if notifier is not None:
+            stats = notifier.stats()
+            embed.add_field(
+                name="📬 Notifications",
+                value=(f"{stats['sent']:,} sent for {stats['events']:,} events ({stats['coalesced']:,} coalesced)\n"
+                       f"{stats['pending'] + stats['queued']:,} waiting, {stats['rate_limited']:,} rate limited, "
+                       f"{stats['failed']:,} failed, {stats['unreachable']:,} users unreachable"),
+                inline=False
+            )
+        
         # Set footer with bot version
         embed.set_footer(text=f"Sunshine Solar Sim v1.0.0 | Developed by Lawrence Industries")
         
         # Send the analytics embed
         await interaction.response.send_message(embed=embed, ephemeral=False)
-        logger.info(f"Analytics command used by {interaction.user.name} ({interaction.user.id})")
+        logger.info("Analytics command used by %s (%s)", interaction.user.name, interaction.user.id,
+                    extra={"user_id": str(interaction.user.id), "command": "analytics", "event": "command"})
 
 async def setup(bot):
     # Initialize the start_time attribute if this is the first load
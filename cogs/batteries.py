@@ -7,6 +7,9 @@ from discord.ext import commands
 from discord import app_commands
 import logging
 
+import rules
+from helpers import format_money
+
 logger = logging.getLogger(__name__)
 
 class Batteries(commands.Cog):
@@ -18,48 +21,43 @@ class Batteries(commands.Cog):
         """Upgrade the user's battery to the next tier"""
         user_id = str(interaction.user.id)
         
-        # Check if user exists
-        if user_id not in self.bot.user_data:
-            await interaction.response.send_message(
-                "You don't have a solar farm yet! Use `/start` to begin your adventure.",
-                ephemeral=True
-            )
-            return
-        
-        # Get user data
-        user_data = self.bot.user_data[user_id]
-        current_tier = user_data.get("battery_tier", 1)
-        
-        # Check if already at max tier
-        if current_tier >= 5:  # Assuming tier 5 is the maximum
-            await interaction.response.send_message(
-                "Your battery is already at the maximum tier (Tier 5)!",
-                ephemeral=True
-            )
-            return
-        
-        # Calculate next tier and price
-        next_tier = current_tier + 1
-        upgrade_price = self.bot.battery_prices[next_tier]
+        def upgrade(user_data):
+            # Check if user exists
+            if user_data is None:
+                raise rules.RuleError("You don't have a solar farm yet! Use `/start` to begin your adventure.")
+            
+            current_tier = user_data.get("battery_tier", 1)
+            
+            # Check if already at max tier
+            max_tier = rules.max_battery_tier(self.bot.game_config)
+            if current_tier >= max_tier:
+                raise rules.RuleError(f"Your battery is already at the maximum tier (Tier {max_tier})!")
+            
+            # Calculate next tier and price
+            next_tier = current_tier + 1
+            upgrade_price = self.bot.battery_prices[next_tier]
+            
+            # Check if user has enough money
+            if user_data["money"] < upgrade_price:
+                raise rules.RuleError(
+                    f"You don't have enough money for this upgrade! You need {format_money(upgrade_price)} "
+                    f"but only have {format_money(user_data['money'])}."
+                )
+            
+            # Process the upgrade
+            rules.upgrade_battery(user_data, self.bot.game_config)
+            return current_tier, next_tier, upgrade_price
         
-        # Check if user has enough money
-        if user_data["money"] < upgrade_price:
-            await interaction.response.send_message(
-                f"You don't have enough money for this upgrade! You need ${upgrade_price} but only have ${user_data['money']:.2f}.",
-                ephemeral=True
-            )
+        # Pay and upgrade as one transaction
+        try:
+            (current_tier, next_tier, upgrade_price), user_data = await self.bot.update_farm(user_id, upgrade)
+        except rules.RuleError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
             return
         
-        # Process the upgrade
         old_capacity = self.bot.battery_capacities[current_tier]
         new_capacity = self.bot.battery_capacities[next_tier]
         
-        user_data["money"] -= upgrade_price
-        user_data["battery_tier"] = next_tier
-        
-        # Save user data
-        self.bot.save_data()
-        
         # Create an embed for the upgrade
         embed = discord.Embed(
             title="🔋 Battery Upgraded!",
@@ -67,8 +65,8 @@ class Batteries(commands.Cog):
             color=0x9B59B6  # Purple color
         )
         
-        embed.add_field(name="Cost", value=f"${upgrade_price:.2f}", inline=True)
-        embed.add_field(name="Remaining Balance", value=f"${user_data['money']:.2f}", inline=True)
+        embed.add_field(name="Cost", value=format_money(upgrade_price), inline=True)
+        embed.add_field(name="Remaining Balance", value=format_money(user_data['money']), inline=True)
         embed.add_field(
             name="New Capacity", 
             value=f"{old_capacity} → {new_capacity} units", 
@@ -76,7 +74,8 @@ class Batteries(commands.Cog):
         )
         
         await interaction.response.send_message(embed=embed)
-        logger.info(f"User {user_id} upgraded battery to tier {next_tier} for ${upgrade_price:.2f}")
+        logger.info("User %s upgraded battery to tier %s for %d cents", user_id, next_tier, upgrade_price,
+                    extra={"user_id": user_id, "command": "upgrade_battery", "event": "command"})
 
 async def setup(bot):
     await bot.add_cog(Batteries(bot))
@@ -7,6 +7,9 @@ from discord.ext import commands
 from discord import app_commands
 import logging
 
+import rules
+from helpers import describe_auto_sell, format_energy, format_money
+
 logger = logging.getLogger(__name__)
 
 class Economy(commands.Cog):
@@ -21,81 +24,119 @@ class Economy(commands.Cog):
         """Sell stored energy for money"""
         user_id = str(interaction.user.id)
         
-        # Check if user exists
-        if user_id not in self.bot.user_data:
-            await interaction.response.send_message(
-                "You don't have a solar farm yet! Use `/start` to begin your adventure.",
-                ephemeral=True
-            )
-            return
-        
-        # Get user data
-        user_data = self.bot.user_data[user_id]
+        def sell_energy(user_data):
+            # Check if user exists
+            if user_data is None:
+                raise rules.RuleError("You don't have a solar farm yet! Use `/start` to begin your adventure.")
+            
+            # Check if user has any energy
+            if user_data["energy"] <= 0:
+                raise rules.RuleError("You don't have any energy to sell! Wait for your generators to produce some.")
+            
+            # Determine how much energy to sell
+            energy_to_sell = 0
+            if amount.lower() == "all":
+                energy_to_sell = user_data["energy"]
+            else:
+                try:
+                    energy_to_sell = int(amount)
+                except ValueError:
+                    raise rules.RuleError("Please enter a whole number of units or 'all'.")
+            
+            # Validate amount
+            if energy_to_sell <= 0:
+                raise rules.RuleError("Please enter a positive amount of energy to sell.")
+            
+            if energy_to_sell > user_data["energy"]:
+                raise rules.RuleError(f"You only have {format_energy(user_data['energy'])} units of energy to sell.")
+            
+            # Update user data
+            return energy_to_sell, rules.sell_energy(user_data, energy_to_sell, self.bot.game_config)
         
-        # Check if user has any energy
-        if user_data["energy"] <= 0:
-            await interaction.response.send_message(
-                "You don't have any energy to sell! Wait for your generators to produce some.",
-                ephemeral=True
-            )
+        # Sell and save as one transaction, so a concurrent tick or command is never lost
+        try:
+            (energy_to_sell, earnings), user_data = await self.bot.update_farm(user_id, sell_energy)
+        except rules.RuleError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
             return
         
-        # Determine how much energy to sell
-        energy_to_sell = 0
-        if amount.lower() == "all":
-            energy_to_sell = user_data["energy"]
-        else:
-            try:
-                energy_to_sell = float(amount)
-            except ValueError:
-                await interaction.response.send_message(
-                    "Please enter a valid amount or 'all'.",
-                    ephemeral=True
-                )
-                return
-        
-        # Validate amount
-        if energy_to_sell <= 0:
-            await interaction.response.send_message(
-                "Please enter a positive amount of energy to sell.",
-                ephemeral=True
-            )
-            return
-        
-        if energy_to_sell > user_data["energy"]:
-            await interaction.response.send_message(
-                f"You only have {user_data['energy']:.0f} units of energy to sell.",
-                ephemeral=True
-            )
-            return
-        
-        # Calculate earnings
-        earnings = energy_to_sell * self.bot.energy_price
-        
-        # Update user data
-        user_data["energy"] -= energy_to_sell
-        user_data["money"] += earnings
-        
-        # Save user data
-        self.bot.save_data()
-        
         # Create an embed for the sale
         embed = discord.Embed(
             title="💸 Energy Sold!",
-            description=f"You sold {energy_to_sell:.0f} units of energy for ${earnings:.2f}!",
+            description=f"You sold {format_energy(energy_to_sell)} units of energy for {format_money(earnings)}!",
             color=0xE74C3C  # Red color
         )
         
-        embed.add_field(name="Price per Unit", value=f"${self.bot.energy_price}", inline=True)
-        embed.add_field(name="New Balance", value=f"${user_data['money']:.2f}", inline=True)
+        embed.add_field(name="Price per Unit", value=format_money(self.bot.energy_price), inline=True)
+        embed.add_field(name="New Balance", value=format_money(user_data['money']), inline=True)
         embed.add_field(
             name="Remaining Energy", 
-            value=f"{user_data['energy']:.0f}/{self.bot.battery_capacities[user_data['battery_tier']]}",
+            value=f"{format_energy(user_data['energy'])}/{format_energy(self.bot.battery_capacities[user_data['battery_tier']])}",
             inline=False
         )
         
         await interaction.response.send_message(embed=embed)
-        logger.info(f"User {user_id} sold {energy_to_sell:.0f} energy for ${earnings:.2f}")
+        logger.info("User %s sold %d energy for %d cents", user_id, energy_to_sell, earnings,
+                    extra={"user_id": user_id, "command": "sell", "event": "command"})
+
+    @app_commands.command(name="autosell", description="Sell energy automatically every minute")
+    @app_commands.describe(
+        mode="When to sell automatically",
+        amount="Energy to keep (reserve) or to sell at (threshold)"
+    )
+    @app_commands.choices(mode=[
+        app_commands.Choice(name="Sell everything when the battery is full", value="full"),
+        app_commands.Choice(name="Keep a reserve, sell the rest", value="reserve"),
+        app_commands.Choice(name="Sell everything at a threshold", value="threshold"),
+        app_commands.Choice(name="Off", value="off")
+    ])
+    async def autosell(self, interaction: discord.Interaction, mode: str, amount: int = 0):
+        """Set or clear the user's auto-sell policy, applied by the energy tick"""
+        user_id = str(interaction.user.id)
+        
+        def set_policy(user_data):
+            # Check if user exists
+            if user_data is None:
+                raise rules.RuleError("You don't have a solar farm yet! Use `/start` to begin your adventure.")
+            
+            if mode == "off":
+                user_data.pop("auto_sell", None)
+                return None
+            
+            # Validate the policy
+            if mode not in rules.AUTO_SELL_MODES:
+                raise rules.RuleError(f"Unknown auto-sell mode: {mode}")
+            if amount < 0 or (mode == "threshold" and amount <= 0):
+                raise rules.RuleError("Please enter a positive amount of energy.")
+            
+            user_data["auto_sell"] = {"mode": mode, "amount": 0 if mode == "full" else amount}
+            return user_data["auto_sell"]
+        
+        try:
+            policy, user_data = await self.bot.update_farm(user_id, set_policy)
+        except rules.RuleError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        
+        # Create an embed for the new policy
+        embed = discord.Embed(
+            title="🤖 Auto-Sell Updated",
+            description=describe_auto_sell(policy) if policy else "Auto-sell is off. Remember to `/sell` before your battery fills!",
+            color=0xE74C3C  # Red color
+        )
+        
+        capacity = self.bot.battery_capacities[user_data["battery_tier"]]
+        if policy and not rules.auto_sell_prevents_waste(policy, capacity):
+            embed.add_field(
+                name="⚠️ Battery Too Small",
+                value=f"Your battery holds {format_energy(capacity)} units, so production above that is still wasted.",
+                inline=False
+            )
+        embed.add_field(name="Price per Unit", value=format_money(self.bot.energy_price), inline=True)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        logger.info("User %s set auto-sell to %s (amount %s)", user_id, mode, amount,
+                    extra={"user_id": user_id, "command": "autosell", "event": "command"})
 
 async def setup(bot):
     await bot.add_cog(Economy(bot))
@@ -0,0 +1,124 @@
+"""
+Forecast Cog
+Projects when a user's battery fills and when upgrades become affordable.
+"""
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+
+import rules
+from helpers import describe_auto_sell, format_duration, format_money
+
+logger = logging.getLogger(__name__)
+
+class Forecast(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # user_id -> (state version, forecast fields)
+        self._cache = {}
+
+    def state_version(self, data: dict) -> tuple:
+        """Fingerprint of everything a forecast depends on"""
+        return (
+            self.bot.balance.version,
+            data["money"],
+            data["energy"],
+            data.get("battery_tier", 1),
+            tuple(sorted(data.get("generators", {}).items())),
+            tuple(sorted((data.get("auto_sell") or {}).items()))
+        )
+
+    @commands.Cog.listener()
+    async def on_balance_reload(self, balance):
+        """Cached forecasts were computed with the old tables; drop them"""
+        self._cache.clear()
+
+    def compute_forecast(self, user_id: str, data: dict) -> list:
+        """Return the forecast as (name, value) pairs, cached per user state version"""
+        version = self.state_version(data)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        config = self.bot.game_config
+        projection = rules.Projection(data, config)
+
+        def eta(price: float) -> str:
+            ticks = projection.ticks_until_worth(price)
+            if ticks is None:
+                return "never at current rates"
+            if ticks == 0:
+                return "affordable now"
+            return f"in {format_duration(ticks)}"
+
+        fields = []
+
+        # Battery fill time
+        policy = data.get("auto_sell")
+        if policy and projection.full_ticks == float("inf"):
+            battery_text = f"Never overflows: auto-sell {describe_auto_sell(policy).lower()}"
+        elif projection.full_ticks == 0:
+            battery_text = "Full now, sell some energy!"
+        elif projection.full_ticks == float("inf"):
+            battery_text = "Never at current rates"
+        else:
+            battery_text = f"Full in {format_duration(projection.full_ticks)}"
+        fields.append(("🔋 Battery", battery_text))
+
+        # Next battery tier
+        current_tier = data.get("battery_tier", 1)
+        next_tier = current_tier + 1
+        if next_tier in config["battery_prices"]:
+            price = config["battery_prices"][next_tier]
+            fields.append((f"⬆️ Tier {next_tier} Battery ({format_money(price)})", eta(price)))
+        else:
+            fields.append(("⬆️ Battery Upgrade", "Already at the maximum tier"))
+
+        # Generators
+        generator_text = "\n".join(
+            f"{spec['emoji']} {spec['name']} ({format_money(spec['price'])}): {eta(spec['price'])}"
+            for spec in config["generators"].values()
+        )
+        fields.append(("🛒 Generators", generator_text))
+
+        # Net income
+        net_income = rules.daily_net_income(data, config)
+        sign = "-" if net_income < 0 else ""
+        fields.append(("💸 Net Income", f"{sign}{format_money(abs(net_income))}/day after fuel and maintenance"))
+
+        self._cache[user_id] = (version, fields)
+        return fields
+
+    @app_commands.command(name="forecast", description="See when you can afford your next upgrade")
+    async def forecast(self, interaction: discord.Interaction):
+        """Show time-to-goal projections for the user's farm"""
+        # Increment command counter
+        self.bot.command_count += 1
+
+        user_id = str(interaction.user.id)
+
+        # Check if user exists
+        user_data = await self.bot.fetch_farm(user_id)
+        if user_data is None:
+            await interaction.response.send_message(
+                "You don't have a solar farm yet! Use `/start` to begin your adventure.",
+                ephemeral=True
+            )
+            return
+
+        fields = self.compute_forecast(user_id, user_data)
+
+        embed = discord.Embed(
+            title=f"🔮 {interaction.user.name}'s Forecast",
+            description="Times assume average weather, that you keep generating and then sell all stored energy.",
+            color=0x1ABC9C  # Teal color
+        )
+        for name, value in fields:
+            embed.add_field(name=name, value=value, inline=False)
+        embed.set_footer(text="Daily maintenance is not included in the times above")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Forecast(bot))
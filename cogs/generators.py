@@ -7,6 +7,9 @@ from discord.ext import commands
 from discord import app_commands
 import logging
 
+import rules
+from helpers import format_money
+
 logger = logging.getLogger(__name__)
 
 class Generators(commands.Cog):
@@ -18,13 +21,6 @@ class Generators(commands.Cog):
         generator_type="The type of generator to buy",
         amount="How many generators to buy (default: 1)"
     )
-    @app_commands.choices(
-        generator_type=[
-            app_commands.Choice(name="Solar Panel", value="solar_panel"),
-            app_commands.Choice(name="Wind Turbine", value="wind_turbine"),
-            app_commands.Choice(name="Gas Generator", value="gas_generator")
-        ]
-    )
     async def buy(
         self, 
         interaction: discord.Interaction, 
@@ -34,57 +30,42 @@ class Generators(commands.Cog):
         """Buy generators for energy production"""
         user_id = str(interaction.user.id)
         
-        # Check if user exists
-        if user_id not in self.bot.user_data:
-            await interaction.response.send_message(
-                "You don't have a solar farm yet! Use `/start` to begin your adventure.",
-                ephemeral=True
-            )
-            return
-        
-        # Validate amount
-        if amount <= 0:
-            await interaction.response.send_message(
-                "Please enter a positive number of generators to buy.",
-                ephemeral=True
-            )
-            return
-        
-        # Get price for the selected generator
-        if generator_type not in self.bot.generator_prices:
-            await interaction.response.send_message(
-                f"Unknown generator type: {generator_type}",
-                ephemeral=True
-            )
-            return
+        def buy_generators(user_data):
+            # Check if user exists
+            if user_data is None:
+                raise rules.RuleError("You don't have a solar farm yet! Use `/start` to begin your adventure.")
+            
+            # Validate amount
+            if amount <= 0:
+                raise rules.RuleError("Please enter a positive number of generators to buy.")
+            
+            # Get price for the selected generator
+            if generator_type not in self.bot.generator_prices:
+                raise rules.RuleError(f"Unknown generator type: {generator_type}")
+            
+            unit_price = self.bot.generator_prices[generator_type]
+            total_price = unit_price * amount
+            
+            # Check if user has enough money
+            if user_data["money"] < total_price:
+                raise rules.RuleError(
+                    f"You don't have enough money! You need {format_money(total_price)} "
+                    f"but only have {format_money(user_data['money'])}."
+                )
+            
+            # Process the purchase
+            return rules.buy_generators(user_data, generator_type, amount, self.bot.game_config)
         
-        unit_price = self.bot.generator_prices[generator_type]
-        total_price = unit_price * amount
-        
-        # Check if user has enough money
-        user_data = self.bot.user_data[user_id]
-        if user_data["money"] < total_price:
-            await interaction.response.send_message(
-                f"You don't have enough money! You need ${total_price} but only have ${user_data['money']:.2f}.",
-                ephemeral=True
-            )
+        # Pay and add the generators as one transaction (which also updates the production matrix)
+        try:
+            total_price, user_data = await self.bot.update_farm(user_id, buy_generators)
+        except rules.RuleError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
             return
         
-        # Process the purchase
-        user_data["money"] -= total_price
-        user_data["generators"][generator_type] = user_data["generators"].get(generator_type, 0) + amount
-        
-        # Save user data
-        self.bot.save_data()
-        
         # Prepare response message
-        generator_names = {
-            "solar_panel": "Solar Panel(s)",
-            "wind_turbine": "Wind Turbine(s)",
-            "gas_generator": "Gas Generator(s)"
-        }
-        
-        generator_name = generator_names.get(generator_type, generator_type)
+        generator = self.bot.balance.generators[generator_type]
+        generator_name = f"{generator['name']}(s)"
         
         # Creation an embed for the purchase
         embed = discord.Embed(
@@ -93,8 +74,8 @@ class Generators(commands.Cog):
             color=0x2ECC71  # Green color
         )
         
-        embed.add_field(name="Cost", value=f"${total_price:.2f}", inline=True)
-        embed.add_field(name="Remaining Balance", value=f"${user_data['money']:.2f}", inline=True)
+        embed.add_field(name="Cost", value=format_money(total_price), inline=True)
+        embed.add_field(name="Remaining Balance", value=format_money(user_data['money']), inline=True)
         
         # Add generation information
         generation_rate = amount * self.bot.generation_rates[generator_type]
@@ -108,20 +89,31 @@ class Generators(commands.Cog):
         maintenance_cost = amount * self.bot.maintenance_costs[generator_type]
         embed.add_field(
             name="Daily Maintenance", 
-            value=f"${maintenance_cost:.2f}/day", 
+            value=f"{format_money(maintenance_cost)}/day", 
             inline=True
         )
         
-        if generator_type == "gas_generator":
-            fuel_cost = amount * self.bot.gas_cost * 60  # hourly cost
+        if generator["fuel"] > 0:
+            fuel_cost = amount * generator["fuel"] * 60  # hourly cost
             embed.add_field(
                 name="Fuel Cost", 
-                value=f"${fuel_cost:.2f}/hour", 
+                value=f"{format_money(fuel_cost)}/hour", 
                 inline=True
             )
         
         await interaction.response.send_message(embed=embed)
-        logger.info(f"User {user_id} purchased {amount}x {generator_type} for ${total_price:.2f}")
+        logger.info("User %s purchased %sx %s for %d cents", user_id, amount, generator_type, total_price,
+                    extra={"user_id": user_id, "command": "buy", "event": "command"})
+
+    @buy.autocomplete("generator_type")
+    async def generator_type_autocomplete(self, interaction: discord.Interaction, current: str):
+        """Offer the generator catalog, so new types need no code change"""
+        current = current.lower()
+        return [
+            app_commands.Choice(name=f"{spec['name']} ({format_money(spec['price'])})", value=generator_id)
+            for generator_id, spec in self.bot.balance.generators.items()
+            if current in generator_id or current in spec["name"].lower()
+        ][:25]
 
 async def setup(bot):
     await bot.add_cog(Generators(bot))
@@ -0,0 +1,52 @@
+"""
+Leaderboard Cog
+Ranks the richest solar farms across every partition.
+"""
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+
+import rules
+from helpers import format_money
+
+logger = logging.getLogger(__name__)
+
+# Number of farms shown
+LEADERBOARD_SIZE = 10
+
+class Leaderboard(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="leaderboard", description="See the richest solar farms")
+    async def leaderboard(self, interaction: discord.Interaction):
+        """Show the top farms by net worth"""
+        # Increment command counter
+        self.bot.command_count += 1
+
+        # Farms are spread over the partitions; ask every one for its top entries
+        missing = 0
+        if self.bot.coordinator is not None:
+            entries, missing = await self.bot.coordinator.leaderboard(LEADERBOARD_SIZE)
+        else:
+            entries = rules.top_farms(self.bot.user_data, self.bot.game_config, LEADERBOARD_SIZE)
+
+        embed = discord.Embed(
+            title="🏆 Sunshine Solar Sim - Leaderboard",
+            description="Net worth is money plus the sale value of stored energy.",
+            color=0xF1C40F  # Gold color
+        )
+        if entries:
+            lines = [f"**{rank}.** {name} — {format_money(worth)}"
+                     for rank, (worth, _, name) in enumerate(entries, start=1)]
+            embed.add_field(name="Top Farms", value="\n".join(lines), inline=False)
+        else:
+            embed.add_field(name="Top Farms", value="No solar farms yet! Use `/start` to be the first.", inline=False)
+        if missing:
+            embed.set_footer(text=f"{missing} partition(s) did not respond; some farms may be missing")
+
+        await interaction.response.send_message(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(Leaderboard(bot))
@@ -7,6 +7,9 @@ from discord.ext import commands
 from discord import app_commands
 import logging
 
+import rules
+from helpers import create_status_embed, format_money
+
 logger = logging.getLogger(__name__)
 
 class UserManagement(commands.Cog):
@@ -21,37 +24,23 @@ class UserManagement(commands.Cog):
         
         user_id = str(interaction.user.id)
         
-        # Check if user already exists
-        if user_id in self.bot.user_data:
+        # Initialize new user data, unless the user already has a farm
+        # (possibly registered through another instance)
+        user_data = rules.new_user(interaction.user.name)
+        if not await self.bot.create_farm(user_id, user_data):
             await interaction.response.send_message(
                 "You already have a solar farm! Use `/status` to view your progress.",
                 ephemeral=True
             )
             return
         
-        # Initialize new user data
-        self.bot.user_data[user_id] = {
-            "name": interaction.user.name,
-            "money": 1000,  # Starting money - just enough for one solar panel
-            "energy": 0,    # Starting energy
-            "battery_tier": 1,  # Starting battery tier
-            "generators": {
-                "solar_panel": 1,  # Start with one solar panel
-                "wind_turbine": 0,
-                "gas_generator": 0
-            }
-        }
-        
-        # Save user data
-        self.bot.save_data()
-        
         # Send welcome message
         embed = discord.Embed(
             title="🌞 Welcome to Sunshine Solar Sim! 🌞",
             description="You've started your own solar farm adventure!",
             color=0xF1C40F  # Sunny yellow color
         )
-        embed.add_field(name="Starting Balance", value=f"${self.bot.user_data[user_id]['money']}", inline=True)
+        embed.add_field(name="Starting Balance", value=format_money(user_data['money']), inline=True)
         embed.add_field(name="Equipment", value="1x Solar Panel", inline=True)
         embed.add_field(name="Battery", value=f"Tier 1 ({self.bot.battery_capacities[1]} capacity)", inline=True)
         embed.add_field(
@@ -66,7 +55,8 @@ class UserManagement(commands.Cog):
         )
         
         await interaction.response.send_message(embed=embed)
-        logger.info(f"New user registered: {interaction.user.name} ({user_id})")
+        logger.info("New user registered: %s (%s)", interaction.user.name, user_id,
+                    extra={"user_id": user_id, "command": "start", "event": "command"})
     
     @app_commands.command(name="status", description="Check your solar farm status")
     async def status(self, interaction: discord.Interaction):
@@ -76,77 +66,17 @@ class UserManagement(commands.Cog):
         
         user_id = str(interaction.user.id)
         
-        # Check if user exists
-        if user_id not in self.bot.user_data:
+        # Check if user exists; /status calls still waiting on storage for this user share one read
+        user_data = await self.bot.coalescer.run(("farm", user_id), lambda: self.bot.fetch_farm(user_id))
+        if user_data is None:
             await interaction.response.send_message(
                 "You don't have a solar farm yet! Use `/start` to begin your adventure.",
                 ephemeral=True
             )
             return
         
-        # Get user data
-        data = self.bot.user_data[user_id]
-        
-        # Calculate total generation rate per minute
-        solar_gen = data["generators"]["solar_panel"] * self.bot.generation_rates["solar_panel"]
-        wind_gen = data["generators"]["wind_turbine"] * self.bot.generation_rates["wind_turbine"]
-        gas_gen = data["generators"]["gas_generator"] * self.bot.generation_rates["gas_generator"]
-        total_gen = solar_gen + wind_gen + gas_gen
-        
-        # Create status embed
-        embed = discord.Embed(
-            title=f"☀️ {interaction.user.name}'s Solar Farm",
-            color=0x3498DB  # Blue color
-        )
-        
-        # Add financial information
-        embed.add_field(name="💰 Money", value=f"${data['money']:.2f}", inline=True)
-        embed.add_field(
-            name="⚡ Energy Storage", 
-            value=f"{data['energy']:.0f}/{self.bot.battery_capacities[data['battery_tier']]}",
-            inline=True
-        )
-        embed.add_field(
-            name="⚡ Generation Rate", 
-            value=f"{total_gen:.0f} units/min",
-            inline=True
-        )
-        
-        # Add generator information
-        generators_text = ""
-        if data["generators"]["solar_panel"] > 0:
-            generators_text += f"🌞 Solar Panels: {data['generators']['solar_panel']} " + \
-                             f"({solar_gen:.0f} units/min)\n"
-        if data["generators"]["wind_turbine"] > 0:
-            generators_text += f"🌀 Wind Turbines: {data['generators']['wind_turbine']} " + \
-                             f"({wind_gen:.0f} units/min)\n"
-        if data["generators"]["gas_generator"] > 0:
-            generators_text += f"⛽ Gas Generators: {data['generators']['gas_generator']} " + \
-                             f"({gas_gen:.0f} units/min)\n"
-        
-        embed.add_field(name="🔋 Generators", value=generators_text or "None", inline=False)
-        
-        # Add battery information
-        embed.add_field(
-            name="🔋 Battery", 
-            value=f"Tier {data['battery_tier']} ({self.bot.battery_capacities[data['battery_tier']]} capacity)",
-            inline=False
-        )
-        
-        # Add maintenance costs information
-        solar_maint = data["generators"]["solar_panel"] * self.bot.maintenance_costs["solar_panel"]
-        wind_maint = data["generators"]["wind_turbine"] * self.bot.maintenance_costs["wind_turbine"]
-        gas_maint = data["generators"]["gas_generator"] * self.bot.maintenance_costs["gas_generator"]
-        total_maint = solar_maint + wind_maint + gas_maint
-        
-        gas_fuel_cost = data["generators"]["gas_generator"] * self.bot.gas_cost * 60 * 24  # daily fuel cost
-        
-        maintenance_text = f"Daily Maintenance: ${total_maint:.2f}\n"
-        if gas_fuel_cost > 0:
-            maintenance_text += f"Daily Fuel Cost (if running 24/7): ${gas_fuel_cost:.2f}\n"
-        
-        embed.add_field(name="💸 Operating Costs", value=maintenance_text, inline=False)
-        
+        embed = create_status_embed(interaction.user.name, user_data, self.bot.game_config,
+                                    int(self.bot.clock() // 60))
         await interaction.response.send_message(embed=embed)
     
     @app_commands.command(name="help", description="Get help with Sunshine Solar Sim commands")
@@ -166,6 +96,7 @@ class UserManagement(commands.Cog):
             "`/start` - Start your solar farm adventure\n"
             "`/status` - Check your solar farm status\n"
             "`/help` - Show this help message\n"
+            "`/leaderboard` - See the richest solar farms\n"
             "`/analytics` - View bot statistics"
         )
         embed.add_field(name="📋 Basic Commands", value=basic_commands, inline=False)
@@ -173,14 +104,16 @@ class UserManagement(commands.Cog):
         # Generator commands
         generator_commands = (
             "`/buy [generator] [amount]` - Buy generators\n"
-            "Available generators: solar_panel, wind_turbine, gas_generator"
+            "Available generators: " + ", ".join(self.bot.balance.generator_types)
         )
         embed.add_field(name="🔋 Generator Commands", value=generator_commands, inline=False)
         
         # Economy commands
         economy_commands = (
             "`/sell [amount]` - Sell energy for money\n"
-            "`/upgrade_battery` - Upgrade your battery storage capacity"
+            "`/autosell [mode] [amount]` - Sell energy automatically every minute\n"
+            "`/upgrade_battery` - Upgrade your battery storage capacity\n"
+            "`/forecast` - See when you can afford your next upgrade"
         )
         embed.add_field(name="💰 Economy Commands", value=economy_commands, inline=False)
         
@@ -188,6 +121,7 @@ class UserManagement(commands.Cog):
         game_info = (
             "• Energy is generated automatically every minute\n"
             "• Solar panels and wind turbines generate energy for free\n"
+            "• Solar panels only produce in daylight and both depend on the weather\n"
             "• Gas generators are more powerful but require fuel costs\n"
             "• All generators have daily maintenance costs\n"
             "• Upgrade your battery to store more energy\n"
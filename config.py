@@ -1,10 +1,21 @@
 """
 Configuration Utilities
 Provides configuration settings for the Sunshine Solar Sim bot.
+
+Balance numbers (the generator catalog with rates, prices, maintenance,
+fuel and production profiles, the weather settings and the battery tiers)
+live in balance.json and are compiled here into
+BalanceTables.
+
+balance.json gives money in dollars; the compiled tables hold whole cents,
+the unit of every balance in the game (see rules.py).
 """
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple
 
-# Default starting money for new users
-DEFAULT_STARTING_MONEY = 5000
+from weather import ProductionModel
 
 # Default starting generators
 DEFAULT_STARTING_GENERATORS = {
@@ -13,46 +24,183 @@ DEFAULT_STARTING_GENERATORS = {
     "gas_generator": 0
 }
 
-# Energy generation rates (per minute)
-ENERGY_GENERATION_RATES = {
-    "solar_panel": 15,   # 15 energy per minute per panel
-    "wind_turbine": 25,  # 25 energy per minute per turbine
-    "gas_generator": 40  # 40 energy per minute per generator
-}
+# Balance tables file, checked for changes every BALANCE_RELOAD_SECONDS
+BALANCE_FILE = os.getenv("BALANCE_FILE", str(Path(__file__).with_name("balance.json")))
+BALANCE_RELOAD_SECONDS = 30
 
-# Generator prices
-GENERATOR_PRICES = {
-    "solar_panel": 1000,
-    "wind_turbine": 2500,
-    "gas_generator": 5000
-}
+# Where user records are kept: "json" (the users file), "sqlite" or "redis"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+# Database file for sqlite, redis://host:port/db for redis; unused by json
+STORAGE_URL = os.getenv("STORAGE_URL", {
+    "sqlite": "data/users.db",
+    "redis": "redis://127.0.0.1:6379/0"
+}.get(STORAGE_BACKEND, ""))
 
-# Generator maintenance costs (per day)
-MAINTENANCE_COSTS = {
-    "solar_panel": 20,
-    "wind_turbine": 75,
-    "gas_generator": 200
-}
+# Which instance runs the ticks when several share storage: "none" (this one
+# always does), "file" (lock on TICK_LEASE_FILE) or "storage" (sqlite/redis lease); see leader.py
+TICK_LEASE = os.getenv("TICK_LEASE", "none")
+TICK_LEASE_FILE = os.getenv("TICK_LEASE_FILE", "data/tick.lock")
+# Lease lifetime and renewal period; their sum bounds failover time and must stay under a minute
+TICK_LEASE_SECONDS = 20
+TICK_LEASE_RENEW_SECONDS = 5
 
-# Gas cost per minute of operation
-GAS_COST_PER_MINUTE = 5
+# Tries at a farm transaction that keeps losing races with other writers
+# before the command gives up (see SunshineSolarBot.update_farm)
+FARM_TRANSACTION_ATTEMPTS = 5
 
-# Battery capacities and prices
-BATTERY_CAPACITIES = {
-    1: 1000,    # Tier 1: 1000 energy
-    2: 3000,    # Tier 2: 3000 energy
-    3: 10000,   # Tier 3: 10000 energy
-    4: 50000,   # Tier 4: 50000 energy
-    5: 250000   # Tier 5: 250000 energy
+# Log output: "json" (one JSON object per line) or "text"; see logs.py
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Fraction of each high-volume log event kept (warnings and errors are always kept)
+LOG_SAMPLE_RATES = {
+    "command": float(os.getenv("LOG_COMMAND_SAMPLE_RATE", "0.1")),
+    "transaction_retry": 0.1
 }
 
-BATTERY_PRICES = {
-    1: 2000,     # Starting tier
-    2: 7500,     # Tier 2 upgrade price
-    3: 25000,    # Tier 3 upgrade price
-    4: 100000,   # Tier 4 upgrade price
-    5: 500000    # Tier 5 upgrade price
+# Direct-message notifications about farm events (see notifications.py), off unless NOTIFICATIONS=on
+NOTIFICATIONS = os.getenv("NOTIFICATIONS", "off") == "on"
+# Events are coalesced per user for this long, then sent by a few workers
+NOTIFY_FLUSH_SECONDS = 60
+NOTIFY_WORKERS = 4
+NOTIFY_QUEUE_SIZE = 1000
+# Requests per second for notifications, leaving the rest of Discord's 50 to the bot
+NOTIFY_GLOBAL_RATE = 25
+
+# Per-user command rate limits: command name -> (uses, per seconds)
+COMMAND_RATE_LIMITS = {
+    "status": (5, 10),
+    "sell": (3, 10),
+    "autosell": (3, 30),
+    "buy": (5, 10),
+    "upgrade_battery": (3, 10),
+    "start": (2, 30),
+    "help": (3, 30),
+    "analytics": (3, 30),
+    "leaderboard": (3, 30)
 }
 
-# Energy selling price (per unit)
-ENERGY_PRICE = 0.1  # $0.1 per energy unit
+# Rate limit for commands not listed above
+DEFAULT_COMMAND_RATE_LIMIT = (5, 10)
+
+class BalanceTables:
+    """Balance file compiled into lookup tables keyed by generator type and battery tier.
+
+    Generators are a data-driven catalog: adding an entry to balance.json is
+    all it takes to add a type to the shop, the tick and every embed.
+
+    Instances are never mutated: a reload compiles a new instance and swaps
+    it in with a single assignment, so readers always see a consistent set.
+    `version` increases with every reload and can key derived caches.
+    """
+
+    def __init__(self, raw: Dict[str, Any], version: int = 1):
+        self.version = version
+
+        # Generator catalog, in display order
+        self.generators = {}
+        for spec in raw["generators"]:
+            generator_id = spec["id"]
+            if generator_id in self.generators:
+                raise ValueError(f"generator '{generator_id}' is defined twice")
+            self.generators[generator_id] = {
+                "id": generator_id,
+                "name": spec.get("name", generator_id.replace("_", " ").title()),
+                "emoji": spec.get("emoji", "⚙️"),
+                "rate": _number(spec, "rate", generator_id),
+                "price": _cents(spec, "price", generator_id),
+                "maintenance": _cents(spec, "maintenance", generator_id),
+                "fuel": _cents(spec, "fuel", generator_id) if "fuel" in spec else 0,
+                "profile": spec.get("profile", "constant")
+            }
+        if not self.generators:
+            raise ValueError("balance file defines no generators")
+        self.generator_types = tuple(self.generators)
+        self.generation_rates = {name: spec["rate"] for name, spec in self.generators.items()}
+        self.generator_prices = {name: spec["price"] for name, spec in self.generators.items()}
+        self.maintenance_costs = {name: spec["maintenance"] for name, spec in self.generators.items()}
+        self.fuel_costs = {name: spec["fuel"] for name, spec in self.generators.items()}
+
+        # Per-type columns for ProductionMatrix: each generator type is a row of
+        # (output of unfuelled types, output of fuelled types, fuel per minute in cents)
+        self.tick_matrix = tuple(
+            (0, spec["rate"], spec["fuel"]) if spec["fuel"] > 0 else (spec["rate"], 0, 0)
+            for spec in self.generators.values()
+        )
+        self.maintenance_matrix = tuple((spec["maintenance"],) for spec in self.generators.values())
+
+        # Time-of-day and weather multipliers, one profile per generator type
+        self.production_model = ProductionModel(
+            raw.get("production", {}),
+            [spec["profile"] for spec in self.generators.values()]
+        )
+
+        batteries = sorted(raw["batteries"], key=lambda battery: battery["tier"])
+        tiers = [battery["tier"] for battery in batteries]
+        if tiers != list(range(1, len(batteries) + 1)):
+            raise ValueError(f"battery tiers must run 1..N without gaps, got {tiers}")
+        self.battery_capacities = {b["tier"]: _whole(b, "capacity", f"tier {b['tier']}") for b in batteries}
+        self.battery_prices = {b["tier"]: _cents(b, "price", f"tier {b['tier']}") for b in batteries}
+        self.max_battery_tier = len(batteries)
+
+        # Cents per unit, so a sale of whole units earns whole cents
+        self.energy_price = _cents(raw, "energy_price", "balance")
+
+        # The dict layout consumed by rules.py and helpers.py, built once per version
+        self.config = {
+            "generators": self.generators,
+            "generator_types": self.generator_types,
+            "generation_rates": self.generation_rates,
+            "generator_prices": self.generator_prices,
+            "maintenance_costs": self.maintenance_costs,
+            "fuel_costs": self.fuel_costs,
+            "battery_capacities": self.battery_capacities,
+            "battery_prices": self.battery_prices,
+            "max_battery_tier": self.max_battery_tier,
+            "energy_price": self.energy_price,
+            "production_model": self.production_model
+        }
+
+    def tick_matrix_at(self, minute: int) -> Tuple[Tuple[float, float, float], ...]:
+        """tick_matrix with each type's output scaled by its multiplier for `minute`"""
+        return tuple(
+            (free_output * multiplier, fueled_output * multiplier, fuel)
+            for (free_output, fueled_output, fuel), multiplier
+            in zip(self.tick_matrix, self.production_model.multipliers(minute))
+        )
+
+def _number(spec: Dict[str, Any], key: str, where: str) -> float:
+    """Fetch a non-negative number from a balance entry"""
+    value = spec.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{where}: '{key}' must be a non-negative number, got {value!r}")
+    return value
+
+def _whole(spec: Dict[str, Any], key: str, where: str) -> int:
+    """Fetch a non-negative whole number from a balance entry"""
+    value = _number(spec, key, where)
+    if value != int(value):
+        raise ValueError(f"{where}: '{key}' must be a whole number, got {value!r}")
+    return int(value)
+
+def _cents(spec: Dict[str, Any], key: str, where: str) -> int:
+    """Fetch a non-negative dollar amount from a balance entry as whole cents"""
+    cents = round(_number(spec, key, where) * 100)
+    if abs(spec[key] * 100 - cents) > 1e-6:
+        raise ValueError(f"{where}: '{key}' must be a whole number of cents, got {spec[key]!r}")
+    return cents
+
+def load_balance(path: str = BALANCE_FILE, version: int = 1) -> BalanceTables:
+    """Read and compile a balance file; raises ValueError/OSError if it is unusable"""
+    with open(path, "r") as f:
+        try:
+            raw = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from e
+    try:
+        return BalanceTables(raw, version)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{path} is missing or has a malformed entry: {e!r}") from e
+
+def game_config(path: str = BALANCE_FILE) -> Dict[str, Any]:
+    """Balance tables in the dict layout used by helpers and rules"""
+    return load_balance(path).config
@@ -0,0 +1,142 @@
+"""
+Fake Discord REST Server
+An in-process HTTP stand-in for the two Discord REST routes the
+notification dispatcher uses, with Discord-style rate limits, so delivery
+can be exercised locally without a bot token:
+
+    POST /api/v10/users/@me/channels                open a DM channel
+    POST /api/v10/channels/{channel_id}/messages     send a message
+
+Each route (per channel for messages) allows `limit` requests per `window`
+seconds and reports its state in X-RateLimit-* headers. Going over a route
+limit, or over `global_limit` requests per second in total, gets a 429
+with `retry_after`. Users in `closed_dms` reject messages with a 403, as
+users who turned off direct messages do.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import socket
+import time
+from typing import Dict, List, Set, Tuple
+
+from aiohttp import web
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+class FakeDiscord:
+    """Records the DMs it is sent and enforces per-route and global rate limits"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 limits: Dict[str, Tuple[int, float]] = None, global_limit: int = 50):
+        self.host = host
+        self.port = port
+        # Route -> (requests, per seconds), mirroring Discord's published defaults
+        self.limits = {"dm": (5, 1.0), "messages": (5, 5.0)}
+        self.limits.update(limits or {})
+        self.global_limit = global_limit
+
+        self.channels: Dict[str, str] = {}
+        self.recipients: Dict[str, str] = {}
+        self.messages: Dict[str, List[str]] = {}
+        self.closed_dms: Set[str] = set()
+        self.requests = 0
+        self.rejected = 0
+
+        # Bucket key -> (window end, requests used)
+        self._windows: Dict[str, Tuple[float, int]] = {}
+        self._global_window = (0.0, 0)
+        self._ids = itertools.count(900000000000000000)
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/api/v10/users/@me/channels", self._open_dm)
+        self.app.router.add_post("/api/v10/channels/{channel_id}/messages", self._send_message)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v10"
+
+    async def start(self):
+        """Start listening; with port 0 a free port is picked and stored in `port`"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.SockSite(self._runner, sock).start()
+        logger.info("Fake Discord REST server listening on %s", self.url)
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def messages_for(self, user_id: str) -> List[str]:
+        """Every DM a user has been sent"""
+        channel_id = self.channels.get(user_id)
+        return self.messages.get(channel_id, []) if channel_id else []
+
+    def _limit(self, kind: str, key: str):
+        """Count one request against the global and route limits; a 429 response if over"""
+        self.requests += 1
+        now = time.monotonic()
+
+        # Global limit: a fixed one-second window across every route
+        ends, used = self._global_window
+        if now >= ends:
+            ends, used = now + 1.0, 0
+        if used >= self.global_limit:
+            self.rejected += 1
+            body = {"message": "You are being rate limited.", "retry_after": ends - now, "global": True}
+            return web.json_response(body, status=429, headers={"X-RateLimit-Global": "true",
+                                                                "Retry-After": f"{ends - now:.3f}"}), None
+        self._global_window = (ends, used + 1)
+
+        limit, window = self.limits[kind]
+        ends, used = self._windows.get(key, (0.0, 0))
+        if now >= ends:
+            ends, used = now + window, 0
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Reset-After": f"{ends - now:.3f}",
+            "X-RateLimit-Bucket": kind,
+        }
+        if used >= limit:
+            self.rejected += 1
+            headers["X-RateLimit-Remaining"] = "0"
+            body = {"message": "You are being rate limited.", "retry_after": ends - now, "global": False}
+            return web.json_response(body, status=429, headers=headers), None
+        self._windows[key] = (ends, used + 1)
+        headers["X-RateLimit-Remaining"] = str(limit - used - 1)
+        return None, headers
+
+    async def _open_dm(self, request: web.Request) -> web.Response:
+        rejected, headers = self._limit("dm", "dm")
+        if rejected is not None:
+            return rejected
+        payload = json.loads(await request.text())
+        user_id = str(payload["recipient_id"])
+        if user_id not in self.channels:
+            channel_id = str(next(self._ids))
+            self.channels[user_id] = channel_id
+            self.recipients[channel_id] = user_id
+        return web.json_response({"id": self.channels[user_id], "type": 1}, headers=headers)
+
+    async def _send_message(self, request: web.Request) -> web.Response:
+        channel_id = request.match_info["channel_id"]
+        rejected, headers = self._limit("messages", f"messages:{channel_id}")
+        if rejected is not None:
+            return rejected
+        if channel_id not in self.recipients:
+            return web.json_response({"message": "Unknown Channel", "code": 10003}, status=404, headers=headers)
+        if self.recipients[channel_id] in self.closed_dms:
+            return web.json_response({"message": "Cannot send messages to this user", "code": 50007},
+                                     status=403, headers=headers)
+        payload = json.loads(await request.text())
+        self.messages.setdefault(channel_id, []).append(payload["content"])
+        # Yield like a real round trip would
+        await asyncio.sleep(0)
+        return web.json_response({"id": str(next(self._ids)), "channel_id": channel_id}, headers=headers)
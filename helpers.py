@@ -3,23 +3,40 @@ Helper Utilities
 Provides helper functions for the Sunshine Solar Sim bot.
 """
 import discord
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 
-def format_money(amount: float) -> str:
-    """Format money amount with commas and two decimal places"""
-    return f"${amount:,.2f}"
+def format_money(cents: int) -> str:
+    """Format an amount of cents as dollars with commas and two decimal places"""
+    return f"${cents / 100:,.2f}"
 
 def format_energy(amount: float) -> str:
     """Format energy amount with commas and no decimal places"""
     return f"{amount:,.0f}"
 
-def create_status_embed(user_name: str, user_data: Dict[str, Any], config: Dict[str, Any]) -> discord.Embed:
-    """Create a status embed for displaying a user's farm information"""
+def describe_auto_sell(policy: Optional[Dict[str, Any]]) -> str:
+    """Describe a user's auto-sell policy in a sentence fragment"""
+    if not policy:
+        return "Off"
+    if policy["mode"] == "full":
+        return "Sells everything when the battery is full"
+    if policy["mode"] == "reserve":
+        return f"Keeps {format_energy(policy['amount'])} units, sells the rest every minute"
+    return f"Sells everything once {format_energy(policy['amount'])} units are stored"
+
+def create_status_embed(user_name: str, user_data: Dict[str, Any], config: Dict[str, Any],
+                        minute: Optional[int] = None) -> discord.Embed:
+    """Create a status embed for displaying a user's farm information.
+
+    With `minute` (Unix time // 60) the embed also shows that minute's weather.
+    """
+    generators = user_data["generators"]
+    capacity = config["battery_capacities"][user_data["battery_tier"]]
+    
     # Calculate total generation rate per minute
-    solar_gen = user_data["generators"]["solar_panel"] * config["generation_rates"]["solar_panel"]
-    wind_gen = user_data["generators"]["wind_turbine"] * config["generation_rates"]["wind_turbine"]
-    gas_gen = user_data["generators"]["gas_generator"] * config["generation_rates"]["gas_generator"]
-    total_gen = solar_gen + wind_gen + gas_gen
+    total_gen = sum(
+        count * config["generation_rates"].get(generator_type, 0)
+        for generator_type, count in generators.items()
+    )
     
     # Create the embed
     embed = discord.Embed(
@@ -31,7 +48,7 @@ def create_status_embed(user_name: str, user_data: Dict[str, Any], config: Dict[
     embed.add_field(name="💰 Money", value=format_money(user_data['money']), inline=True)
     embed.add_field(
         name="⚡ Energy Storage", 
-        value=f"{format_energy(user_data['energy'])}/{format_energy(config['battery_capacities'][user_data['battery_tier']])}",
+        value=f"{format_energy(user_data['energy'])}/{format_energy(capacity)}",
         inline=True
     )
     embed.add_field(
@@ -40,38 +57,71 @@ def create_status_embed(user_name: str, user_data: Dict[str, Any], config: Dict[
         inline=True
     )
     
-    # Add generator information
+    # Add generator information, in catalog order
     generators_text = ""
-    if user_data["generators"]["solar_panel"] > 0:
-        generators_text += f"🌞 Solar Panels: {user_data['generators']['solar_panel']} " + \
-                         f"({format_energy(solar_gen)} units/min)\n"
-    if user_data["generators"]["wind_turbine"] > 0:
-        generators_text += f"🌀 Wind Turbines: {user_data['generators']['wind_turbine']} " + \
-                         f"({format_energy(wind_gen)} units/min)\n"
-    if user_data["generators"]["gas_generator"] > 0:
-        generators_text += f"⛽ Gas Generators: {user_data['generators']['gas_generator']} " + \
-                         f"({format_energy(gas_gen)} units/min)\n"
+    for generator_type, spec in config["generators"].items():
+        count = generators.get(generator_type, 0)
+        if count > 0:
+            generators_text += f"{spec['emoji']} {spec['name']}s: {count} " + \
+                             f"({format_energy(count * spec['rate'])} units/min)\n"
     
     embed.add_field(name="🔋 Generators", value=generators_text or "None", inline=False)
     
+    # Add current conditions for the weather-dependent generators the user owns
+    if minute is not None and "production_model" in config:
+        multipliers = dict(zip(config["generator_types"], config["production_model"].multipliers(minute)))
+        conditions = [
+            f"{spec['emoji']} {multipliers[generator_type]:.0%}"
+            for generator_type, spec in config["generators"].items()
+            if spec["profile"] != "constant" and generators.get(generator_type, 0) > 0
+        ]
+        if conditions:
+            embed.add_field(name="🌤️ Current Output", value=" · ".join(conditions), inline=False)
+    
     # Add battery information
     embed.add_field(
         name="🔋 Battery", 
-        value=f"Tier {user_data['battery_tier']} ({format_energy(config['battery_capacities'][user_data['battery_tier']])} capacity)",
+        value=f"Tier {user_data['battery_tier']} ({format_energy(capacity)} capacity)",
         inline=False
     )
     
+    # Add maintenance costs information
+    total_maint = calculate_maintenance_costs(user_data, config)
+    fuel_cost = calculate_daily_fuel_costs(user_data, config)
+    
+    maintenance_text = f"Daily Maintenance: {format_money(total_maint)}\n"
+    if fuel_cost > 0:
+        maintenance_text += f"Daily Fuel Cost (if running 24/7): {format_money(fuel_cost)}\n"
+    
+    embed.add_field(name="💸 Operating Costs", value=maintenance_text, inline=False)
+    
+    # Add auto-sell information
+    embed.add_field(name="🤖 Auto-Sell", value=describe_auto_sell(user_data.get("auto_sell")), inline=False)
+    
     return embed
 
-def calculate_maintenance_costs(user_data: Dict[str, Any], config: Dict[str, Any]) -> float:
-    """Calculate the total daily maintenance costs for a user's generators"""
+def calculate_maintenance_costs(user_data: Dict[str, Any], config: Dict[str, Any]) -> int:
+    """Calculate the total daily maintenance costs for a user's generators, in cents"""
     total_maintenance = 0
     for generator_type, count in user_data["generators"].items():
         maintenance_cost = config["maintenance_costs"].get(generator_type, 0) * count
         total_maintenance += maintenance_cost
     return total_maintenance
 
-def calculate_daily_fuel_costs(user_data: Dict[str, Any], config: Dict[str, Any]) -> float:
-    """Calculate the daily fuel costs if all gas generators run continuously"""
-    gas_generators = user_data["generators"].get("gas_generator", 0)
-    return gas_generators * config["gas_cost"] * 60 * 24  # cost per minute * minutes per day
+def calculate_daily_fuel_costs(user_data: Dict[str, Any], config: Dict[str, Any]) -> int:
+    """Calculate the daily fuel costs in cents if all fuelled generators run continuously"""
+    fuel_per_minute = sum(
+        count * config["fuel_costs"].get(generator_type, 0)
+        for generator_type, count in user_data["generators"].items()
+    )
+    return fuel_per_minute * 60 * 24  # cost per minute * minutes per day
+
+def format_duration(minutes: float) -> str:
+    """Format a number of minutes as days, hours and minutes"""
+    days, remainder = divmod(int(minutes), 60 * 24)
+    hours, mins = divmod(remainder, 60)
+    if days:
+        return f"{days}d {hours}h {mins}m"
+    if hours:
+        return f"{hours}h {mins}m"
+    return f"{mins}m"
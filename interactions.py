@@ -0,0 +1,53 @@
+"""
+Offline Interactions
+Minimal stand-ins for discord.Interaction that let cog command callbacks run
+outside a gateway connection (replays, forwarded cross-shard commands) and
+capture what they would have sent.
+"""
+from typing import Any, Dict, Optional
+
+import discord
+
+class OfflineUser:
+    """Minimal stand-in for discord.User"""
+    def __init__(self, user_id: str, name: str):
+        self.id = int(user_id)
+        self.name = name
+        self.display_name = name
+
+class OfflineResponse:
+    """Stand-in for discord.InteractionResponse that keeps the first reply"""
+    def __init__(self):
+        self.reply: Optional[Dict[str, Any]] = None
+
+    def is_done(self) -> bool:
+        return self.reply is not None
+
+    async def send_message(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+                           ephemeral: bool = False, **kwargs):
+        self.reply = {"content": content, "embed": embed, "ephemeral": ephemeral}
+
+    async def defer(self, *args, **kwargs):
+        self.reply = {"content": None, "embed": None, "ephemeral": kwargs.get("ephemeral", False)}
+
+class OfflineInteraction:
+    """Stand-in for discord.Interaction carrying just what the cogs use"""
+    def __init__(self, user_id: str, name: str):
+        self.user = OfflineUser(user_id, name)
+        self.response = OfflineResponse()
+
+def serialize_reply(reply: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Turn a captured reply into JSON-safe send_message keyword arguments"""
+    if reply is None:
+        return {"content": "Something went wrong, please try again.", "ephemeral": True}
+    result = {"content": reply["content"], "ephemeral": reply["ephemeral"]}
+    if reply["embed"] is not None:
+        result["embed"] = reply["embed"].to_dict()
+    return result
+
+def deserialize_reply(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of serialize_reply, ready for interaction.response.send_message"""
+    kwargs = {"content": payload.get("content"), "ephemeral": payload.get("ephemeral", False)}
+    if payload.get("embed") is not None:
+        kwargs["embed"] = discord.Embed.from_dict(payload["embed"])
+    return kwargs
@@ -0,0 +1,244 @@
+"""
+Tick Leader Election
+When several bot instances share storage, every instance serves commands
+but only one may run the energy tick and the daily maintenance, or users
+would be paid and charged once per instance. Instances compete for a lease
+and only the current holder runs the ticks.
+
+Lease kinds (config.TICK_LEASE):
+    none     no election, this instance always ticks (single instance)
+    file     an exclusive lock on a local file, for instances on one host;
+             the OS drops the lock the moment its holder dies
+    storage  a lease record with an expiry in the sqlite or redis backend
+
+A holder renews every TICK_LEASE_RENEW_SECONDS; a crashed holder's lease
+runs out after TICK_LEASE_SECONDS, and a standby takes over at its next
+renewal attempt. Keeping both well below the one minute tick interval means
+at most one tick is missed on failover.
+"""
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+from storage import RedisStore, SqliteStore, StorageError
+from storage.resp import RespConnection
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+class Lease:
+    """A named lease that at most one holder has at a time"""
+
+    kind = "none"
+
+    def __init__(self, holder: str):
+        self.holder = holder
+
+    async def acquire_or_renew(self, ttl: float) -> bool:
+        """Take the lease if it is free, extend it if we hold it; True while we hold it"""
+        raise NotImplementedError
+
+    async def release(self):
+        """Give the lease up so a standby can take over at once"""
+
+class FileLease(Lease):
+    """Exclusive flock on a local file, held for as long as the file stays open"""
+
+    kind = "file"
+
+    def __init__(self, holder: str, path: str):
+        if fcntl is None:
+            raise ValueError("the file tick lease needs fcntl (Unix); use TICK_LEASE=storage instead")
+        super().__init__(holder)
+        self.path = path
+        self._file = None
+
+    async def acquire_or_renew(self, ttl: float) -> bool:
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # Record the holder for anyone inspecting the file
+        lock_file.truncate(0)
+        lock_file.write(f"{self.holder} pid {os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    async def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+class RedisLease(Lease):
+    """SET NX PX lease, renewed with a WATCH/MULTI compare-and-extend"""
+
+    kind = "redis"
+
+    def __init__(self, holder: str, host: str, port: int, database: int, key: str):
+        super().__init__(holder)
+        self.key = key
+        # WATCH state is per connection, so the lease never shares one with the store
+        self.connection = RespConnection(host, port, database)
+
+    async def acquire_or_renew(self, ttl: float) -> bool:
+        ttl_ms = int(ttl * 1000)
+        if await self.connection.execute("SET", self.key, self.holder, "NX", "PX", ttl_ms) is not None:
+            return True
+        _, current = await self.connection.pipeline([("WATCH", self.key), ("GET", self.key)])
+        if current != self.holder:
+            await self.connection.execute("UNWATCH")
+            return False
+        # EXEC returns nil if the key changed hands between GET and here
+        replies = await self.connection.pipeline([("MULTI",), ("PEXPIRE", self.key, ttl_ms), ("EXEC",)])
+        return replies[-1] is not None and replies[-1][0] == 1
+
+    async def release(self):
+        try:
+            _, current = await self.connection.pipeline([("WATCH", self.key), ("GET", self.key)])
+            if current == self.holder:
+                await self.connection.pipeline([("MULTI",), ("DEL", self.key), ("EXEC",)])
+            else:
+                await self.connection.execute("UNWATCH")
+        finally:
+            await self.connection.close()
+
+class SqliteLease(Lease):
+    """Lease row with an expiry time in the shared SQLite database"""
+
+    kind = "sqlite"
+
+    def __init__(self, holder: str, path: str, name: str = "tick"):
+        super().__init__(holder)
+        self.path = path
+        self.name = name
+
+    def _acquire(self, ttl: float) -> bool:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS leases "
+                               "(name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL)")
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = connection.execute("SELECT holder, expires FROM leases WHERE name = ?", (self.name,)).fetchone()
+            held = row is None or row[0] == self.holder or row[1] <= now
+            if held:
+                connection.execute("INSERT OR REPLACE INTO leases (name, holder, expires) VALUES (?, ?, ?)",
+                                   (self.name, self.holder, now + ttl))
+            connection.execute("COMMIT")
+            return held
+        finally:
+            connection.close()
+
+    def _release(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                connection.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        finally:
+            connection.close()
+
+    async def acquire_or_renew(self, ttl: float) -> bool:
+        try:
+            return await asyncio.to_thread(self._acquire, ttl)
+        except sqlite3.Error as e:
+            raise StorageError(f"SQLite lease error on {self.path}: {str(e)}") from e
+
+    async def release(self):
+        try:
+            await asyncio.to_thread(self._release)
+        except sqlite3.Error as e:
+            raise StorageError(f"SQLite lease error on {self.path}: {str(e)}") from e
+
+def create_lease(kind: str, bot, name: str, lock_path: str) -> Optional[Lease]:
+    """Lease for config.TICK_LEASE, or None when every instance ticks.
+
+    `name` tells leases apart (one per partition); `lock_path` is the file
+    locked by the file lease.
+    """
+    holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if kind == "none":
+        return None
+    if kind == "file":
+        return FileLease(holder, lock_path)
+    if kind == "storage":
+        store = bot.storage
+        if isinstance(store, RedisStore):
+            return RedisLease(holder, store.host, store.port, store.database, f"{store.namespace}:lease:{name}")
+        if isinstance(store, SqliteStore):
+            return SqliteLease(holder, store.path, name)
+        raise ValueError("TICK_LEASE=storage needs the sqlite or redis storage backend")
+    raise ValueError(f"unknown tick lease '{kind}', expected none, file or storage")
+
+class TickLeader:
+    """Tracks whether this instance holds the tick lease, with metrics for /analytics"""
+
+    def __init__(self, lease: Lease, ttl: float):
+        self.lease = lease
+        self.ttl = ttl
+        # Leadership is trusted until shortly before the lease could expire elsewhere
+        self.margin = min(2.0, ttl / 4)
+        self._valid_until = 0.0
+
+        self.leader_since: Optional[float] = None
+        self.last_renewal: Optional[float] = None
+        self.acquisitions = 0
+        self.losses = 0
+        self.renewals = 0
+        self.failures = 0
+
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    async def step(self):
+        """Try to take or extend the lease once"""
+        started = time.monotonic()
+        try:
+            held = await self.lease.acquire_or_renew(self.ttl)
+        except (OSError, StorageError) as e:
+            self.failures += 1
+            logger.warning("Tick lease renewal failed: %s", e)
+            # Keep leading until the lease we last renewed could have run out
+            if self.is_leader():
+                return
+            held = False
+
+        if held:
+            self._valid_until = started + self.ttl - self.margin
+            self.last_renewal = time.time()
+            self.renewals += 1
+            if self.leader_since is None:
+                self.acquisitions += 1
+                self.leader_since = time.time()
+                logger.info("Acquired the tick lease (%s) as %s", self.lease.kind, self.lease.holder)
+        else:
+            self._valid_until = 0.0
+            if self.leader_since is not None:
+                self.losses += 1
+                self.leader_since = None
+                logger.warning("Lost the tick lease (%s); another instance runs the ticks", self.lease.kind)
+
+    async def release(self):
+        """Give up leadership on shutdown"""
+        self._valid_until = 0.0
+        self.leader_since = None
+        try:
+            await self.lease.release()
+        except (OSError, StorageError) as e:
+            logger.warning("Could not release the tick lease: %s", e)
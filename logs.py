@@ -0,0 +1,117 @@
+"""
+Structured Logging
+Routes every log record through a queue to a background writer thread, so
+coroutines never wait on console I/O. Records are written as JSON lines
+(or the classic text format) with optional user id, command and latency
+fields, and high-volume events can be sampled.
+
+Records are formatted on the writer thread, not where they are logged:
+pass values as lazy %-style arguments (logger.info("Sold %s", amount)),
+never as f-strings, and never pass objects that are mutated afterwards.
+Structured fields go in `extra`:
+
+    logger.info("Sold %d energy", amount, extra={"user_id": user_id, "command": "sell"})
+
+An `event` field names a high-volume event; config.LOG_SAMPLE_RATES keeps
+only that fraction of its records below WARNING and stamps the rate on
+the ones kept, so counts can be scaled back up.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from typing import Dict, Optional
+
+# Structured fields copied from a record into its JSON line when present
+FIELDS = ("event", "user_id", "command", "latency_ms", "phases", "sample_rate")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records of each sampled event"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats the message before enqueueing it so the record
+    can cross a process boundary; this queue never leaves the process.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class LogListener(logging.handlers.QueueListener):
+    """QueueListener whose stop may be called more than once"""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+def parse_level(name: str) -> Optional[int]:
+    """Numeric level for a name such as "debug" or "20"; None when logging has no such level"""
+    name = name.strip().upper()
+    if name.isdigit():
+        return int(name)
+    # getLevelName returns "Level NAME" for names it does not know
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else None
+
+def setup_logging(level: int = logging.INFO, fmt: str = "json",
+                  sample_rates: Optional[Dict[str, float]] = None) -> LogListener:
+    """Send root logging through a queue to a stderr writer thread.
+
+    `fmt` is "json" for JSON lines or "text" for the human-readable format.
+    Returns the started listener, which flushes the queue at interpreter exit.
+    """
+    writer = logging.StreamHandler()
+    writer.setFormatter(JsonLinesFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    # Drop sampled-out records before they are queued
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = LogListener(records, writer, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -2,22 +2,41 @@
 Sunshine Solar Sim - Main Bot Launcher
 An idle solar energy simulation game as a Discord bot.
 """
+import time
+STARTED = time.perf_counter()
+
 import logging
 import os
-from bot import SunshineSolarBot
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
-# Load .env for local development only
+# Load .env for local development only; config reads the environment when
+# it is imported, so this has to come first
 try:
     from dotenv import load_dotenv
     load_dotenv()
-    logging.info("Loaded environment from .env file")
+    DOTENV = True
 except ImportError:
+    DOTENV = False
+
+import config
+from bot import ShardedSunshineSolarBot, SunshineSolarBot
+from logs import parse_level, setup_logging
+from sharding import shard_options_from_env
+
+# Time spent importing discord.py, numpy and the game modules
+IMPORTED = time.perf_counter()
+
+# Configure logging: records are queued and written by a background thread (see logs.py)
+LOG_LEVEL = parse_level(config.LOG_LEVEL)
+setup_logging(
+    level=logging.INFO if LOG_LEVEL is None else LOG_LEVEL,
+    fmt=config.LOG_FORMAT,
+    sample_rates=config.LOG_SAMPLE_RATES
+)
+if LOG_LEVEL is None:
+    logging.warning("Unknown LOG_LEVEL %r, logging at INFO", config.LOG_LEVEL)
+if DOTENV:
+    logging.info("Loaded environment from .env file")
+else:
     logging.warning("python-dotenv not installed, using environment variables directly")
 
 def get_token():
@@ -34,11 +53,20 @@ if __name__ == "__main__":
     token = get_token()
     app_id = get_application_id()
     
-    logging.info(f"Token loaded successfully (length: {len(token)})")
-    logging.info(f"Application ID: {app_id}")
+    logging.info("Token loaded successfully (length: %d)", len(token))
+    logging.info("Application ID: %s", app_id)
 
     # Optional: pass app_id to bot class instead of setting env
     os.environ["APPLICATION_ID"] = app_id
 
-    bot = SunshineSolarBot()
-    bot.run(token)
+    # SHARD_COUNT opts into AutoShardedBot; see sharding.py for partitioned state
+    shard_options = shard_options_from_env()
+    if shard_options is not None:
+        logging.info("Sharded mode: %s", shard_options)
+        bot = ShardedSunshineSolarBot(**shard_options)
+    else:
+        bot = SunshineSolarBot()
+    bot.startup.started = STARTED
+    bot.startup.record("import", IMPORTED - STARTED)
+    # log_handler=None keeps discord.py's records on the queue instead of its own handler
+    bot.run(token, log_handler=None)
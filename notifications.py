@@ -0,0 +1,406 @@
+"""
+Farm Notifications
+Direct messages telling players what happened to their farm while they were
+away: the battery filled up, the gas generators stopped for lack of money,
+the daily maintenance was charged.
+
+The tick never talks to Discord. It calls `notify`, which only records a
+compact event; events for the same user are deduplicated and coalesced
+until the next flush, then sent as one message. A few workers deliver the
+messages, each waiting on Discord's per-route rate-limit buckets (learned
+from the X-RateLimit-* headers and 429 replies) and on a global budget
+left below Discord's 50 requests per second so the bot's own replies keep
+working.
+
+    python notifications.py --users 100 --ticks 20
+
+runs the dispatcher against fake_discord.FakeDiscord and checks that every
+event reached its user, without a bot token.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, Mapping, Optional, Set, Tuple
+
+import aiohttp
+
+from helpers import format_energy, format_money
+from ratelimit import TokenBucket
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+DISCORD_API = "https://discord.com/api/v10"
+
+Event = Dict[str, Any]
+
+# How a new event merges into a pending one of the same kind for the same user
+MERGERS: Dict[str, Callable[[Event, Event], Event]] = {
+    "battery_full": lambda pending, event: event,
+    "fuel_stopped": lambda pending, event: event,
+    "maintenance": lambda pending, event: {"cost": pending["cost"] + event["cost"],
+                                           "days": pending["days"] + event["days"]},
+}
+
+def render(events: Dict[str, Event]) -> str:
+    """One message for a user's coalesced events"""
+    lines = ["☀️ **Sunshine Solar Sim update**"]
+    if "battery_full" in events:
+        capacity = events["battery_full"]["capacity"]
+        lines.append(f"🔋 Your battery is full ({format_energy(capacity)} units), so new energy is being wasted. "
+                     f"Use `/sell`, or `/autosell` to sell automatically.")
+    if "fuel_stopped" in events:
+        fuel = events["fuel_stopped"]["fuel"]
+        lines.append(f"⛽ Your gas generators stopped: their fuel costs {format_money(fuel)} a minute "
+                     f"and you are out of money.")
+    if "maintenance" in events:
+        event = events["maintenance"]
+        days = f" for {event['days']} days" if event["days"] > 1 else ""
+        lines.append(f"🔧 Generator maintenance of {format_money(event['cost'])} was charged{days}.")
+    return "\n".join(lines)
+
+class RestTransport:
+    """Discord REST calls over aiohttp; `base_url` can point at a fake server"""
+
+    def __init__(self, token: str, base_url: str = DISCORD_API, timeout: float = 10.0):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def request(self, method: str, path: str, payload: Dict[str, Any]) -> Tuple[int, Mapping[str, str], Any]:
+        """Send one request; returns the status, headers and decoded JSON body"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bot {self.token}", "User-Agent": "DiscordBot (sunshine-solar-sim, 1.0)"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        async with self._session.request(method, self.base_url + path, json=payload) as response:
+            text = await response.text()
+            body = json.loads(text) if text and response.content_type == "application/json" else None
+            return response.status, response.headers, body
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+class RouteBucket:
+    """What the last response said about one rate-limit bucket"""
+    __slots__ = ("remaining", "reset_at", "lock", "probe")
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.lock = asyncio.Lock()
+        # Set once the request sent to learn a new window has its response
+        self.probe: Optional[asyncio.Event] = None
+
+class RouteLimits:
+    """Per-route buckets learned from Discord's headers, plus a global budget.
+
+    Routes are keyed by method, path template and major parameter, e.g.
+    "POST /channels/123/messages", which is how Discord buckets them. Before
+    a bucket's first response, and once its window has passed, a single
+    request goes out to learn the new window while the others wait for it.
+    """
+
+    # Longest wait for a probe whose response never came
+    probe_timeout = 10.0
+
+    def __init__(self, global_rate: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._buckets: Dict[str, RouteBucket] = {}
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._global_until = 0.0
+
+    async def acquire(self, route: str):
+        """Wait until one request on `route` fits both its bucket and the global budget"""
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            bucket = self._buckets[route] = RouteBucket()
+        # Requests on one route queue here instead of all hitting an empty bucket
+        async with bucket.lock:
+            while True:
+                now = self.clock()
+                wait = max(0.0, self._global_until - now)
+                if bucket.reset_at <= now:
+                    if bucket.probe is not None and not bucket.probe.is_set():
+                        try:
+                            await asyncio.wait_for(bucket.probe.wait(), self.probe_timeout)
+                        except asyncio.TimeoutError:
+                            bucket.probe = None
+                        continue
+                elif bucket.remaining == 0:
+                    wait = max(wait, bucket.reset_at - now)
+                if not wait:
+                    wait = self._global.consume(now)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            if bucket.reset_at <= now:
+                bucket.probe = asyncio.Event()
+            elif bucket.remaining:
+                bucket.remaining -= 1
+
+    def settle(self, route: str):
+        """The request on `route` has its response, or never will; release the waiters"""
+        bucket = self._buckets.get(route)
+        if bucket is not None and bucket.probe is not None:
+            bucket.probe.set()
+
+    def update(self, route: str, status: int, headers: Mapping[str, str], body: Any) -> float:
+        """Record a response's rate-limit state; returns the retry delay of a 429, else 0"""
+        now = self.clock()
+        bucket = self._buckets.get(route)
+        if status == 429:
+            retry_after = float((body or {}).get("retry_after") or headers.get("Retry-After") or 1.0)
+            if (body or {}).get("global") or headers.get("X-RateLimit-Global"):
+                self._global_until = max(self._global_until, now + retry_after)
+            elif bucket is not None:
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+            self.settle(route)
+            return retry_after
+
+        remaining, reset_after = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset-After")
+        if bucket is not None and remaining is not None and reset_after is not None:
+            reset_at = now + float(reset_after)
+            # Responses can arrive out of order; within one window trust the lowest count
+            if bucket.remaining is None or reset_at > bucket.reset_at + 0.05:
+                bucket.remaining = int(remaining)
+            else:
+                bucket.remaining = min(bucket.remaining, int(remaining))
+            bucket.reset_at = reset_at
+        self.settle(route)
+        return 0.0
+
+    def prune(self):
+        """Forget buckets whose window has passed"""
+        now = self.clock()
+        for route in [route for route, bucket in self._buckets.items()
+                      if bucket.reset_at <= now and not bucket.lock.locked()]:
+            del self._buckets[route]
+
+class NotificationDispatcher:
+    """Coalesces farm events per user and delivers them as rate-limited DMs"""
+
+    def __init__(self, transport, workers: int = 4, flush_seconds: float = 10.0,
+                 queue_size: int = 1000, global_rate: float = 25.0, attempts: int = 5):
+        self.transport = transport
+        self.workers = workers
+        self.flush_seconds = flush_seconds
+        self.attempts = attempts
+        self.limits = RouteLimits(global_rate)
+
+        # User -> kind -> merged event, waiting for the next flush
+        self.pending: Dict[str, Dict[str, Event]] = {}
+        # Flushed messages waiting for a worker; when full, users stay pending
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._channels: Dict[str, str] = {}
+        # Users who do not accept DMs; Discord counts repeated 403s against the bot
+        self.unreachable: Set[str] = set()
+        self._tasks = []
+
+        self.events = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def notify(self, user_id: str, kind: str, **event):
+        """Record an event for a user; cheap enough to call from the tick"""
+        if user_id in self.unreachable:
+            return
+        self.events += 1
+        events = self.pending.get(user_id)
+        if events is None:
+            self.pending[user_id] = {kind: event}
+        elif kind in events:
+            events[kind] = MERGERS[kind](events[kind], event)
+            self.coalesced += 1
+        else:
+            events[kind] = event
+
+    def _requeue(self, user_id: str, events: Dict[str, Event]):
+        """Merge undelivered events back into pending for the next flush"""
+        for kind, event in events.items():
+            pending = self.pending.setdefault(user_id, {})
+            pending[kind] = MERGERS[kind](event, pending[kind]) if kind in pending else event
+
+    def flush(self) -> int:
+        """Hand pending users to the workers; returns how many were queued"""
+        queued = 0
+        for user_id in list(self.pending):
+            if self.queue.full():
+                break
+            self.queue.put_nowait((user_id, self.pending.pop(user_id)))
+            queued += 1
+        return queued
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+
+    async def close(self, timeout: float = 5.0):
+        """Deliver what can be delivered within `timeout`, then stop"""
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                self.flush()
+                await asyncio.wait_for(self.queue.join(), max(0.0, deadline - time.monotonic()))
+                if not self.pending:
+                    break
+        except asyncio.TimeoutError:
+            logger.warning("Dropping notifications for %d users on shutdown", self.queue.qsize() + len(self.pending))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.transport.close()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            self.flush()
+            self.limits.prune()
+
+    async def _worker(self):
+        while True:
+            user_id, events = await self.queue.get()
+            try:
+                await self._deliver(user_id, events)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                self.failed += 1
+                logger.warning("Notification for %s failed, retrying at the next flush: %s", user_id, e,
+                               extra={"user_id": user_id})
+                self._requeue(user_id, events)
+            finally:
+                self.queue.task_done()
+
+    async def _call(self, route: str, path: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        """POST with rate-limit waits and retries on 429 and server errors"""
+        status, body = 0, None
+        for attempt in range(self.attempts):
+            await self.limits.acquire(route)
+            try:
+                status, headers, body = await self.transport.request("POST", path, payload)
+            except BaseException:
+                self.limits.settle(route)
+                raise
+            self.limits.update(route, status, headers, body)
+            if status == 429:
+                self.rate_limited += 1
+                continue
+            if status >= 500:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            break
+        return status, body
+
+    async def _deliver(self, user_id: str, events: Dict[str, Event]):
+        channel_id = self._channels.get(user_id)
+        if channel_id is None:
+            status, body = await self._call("POST /users/@me/channels", "/users/@me/channels", {"recipient_id": user_id})
+            if status == 200:
+                channel_id = self._channels[user_id] = body["id"]
+            elif status in (400, 403, 404):
+                self.unreachable.add(user_id)
+                return
+            else:
+                raise OSError(f"opening a DM channel returned {status}")
+
+        route = f"POST /channels/{channel_id}/messages"
+        status, _ = await self._call(route, f"/channels/{channel_id}/messages", {"content": render(events)})
+        if status == 200:
+            self.sent += 1
+        elif status in (400, 403, 404):
+            # DMs closed or the channel is gone
+            self.unreachable.add(user_id)
+            self._channels.pop(user_id, None)
+            logger.debug("User %s does not accept notifications (%s)", user_id, status, extra={"user_id": user_id})
+        else:
+            raise OSError(f"sending a DM returned {status}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "events": self.events,
+            "coalesced": self.coalesced,
+            "pending": len(self.pending),
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "unreachable": len(self.unreachable),
+        }
+
+async def simulate(users: int, ticks: int, workers: int, closed: float, seed: int) -> bool:
+    """Fire random tick events at a fake Discord and check they were all delivered"""
+    from fake_discord import FakeDiscord
+    rng = random.Random(seed)
+    server = FakeDiscord()
+    await server.start()
+    dispatcher = NotificationDispatcher(RestTransport("fake-token", server.url), workers=workers,
+                                        flush_seconds=3600, global_rate=40.0)
+    await dispatcher.start()
+
+    user_ids = [str(100000 + index) for index in range(users)]
+    server.closed_dms.update(user_id for user_id in user_ids if rng.random() < closed)
+    expected: Dict[str, Set[str]] = {}
+    began = time.perf_counter()
+    for tick in range(ticks):
+        for user_id in rng.sample(user_ids, max(1, users // 4)):
+            kind = rng.choice(list(MERGERS))
+            event = {"battery_full": {"capacity": 1000},
+                     "fuel_stopped": {"fuel": 250},
+                     "maintenance": {"cost": 1200, "days": 1}}[kind]
+            dispatcher.notify(user_id, kind, **event)
+            expected.setdefault(user_id, set()).add(kind)
+        # Several ticks land in one flush window
+        if tick % 5 == 4:
+            dispatcher.flush()
+    await dispatcher.close(timeout=600)
+    elapsed = time.perf_counter() - began
+    await server.close()
+
+    markers = {"battery_full": "🔋", "fuel_stopped": "⛽", "maintenance": "🔧"}
+    ok = True
+    for user_id, kinds in expected.items():
+        received = "\n".join(server.messages_for(user_id))
+        if user_id in server.closed_dms:
+            if received or user_id not in dispatcher.unreachable:
+                print(f"user {user_id} has DMs closed but was not marked unreachable")
+                ok = False
+            continue
+        missing = [kind for kind in kinds if markers[kind] not in received]
+        if missing:
+            print(f"user {user_id} never heard about {', '.join(missing)}")
+            ok = False
+    messages = sum(len(sent) for sent in server.messages.values())
+    stats = dispatcher.stats()
+    print(f"{stats['events']} events for {len(expected)} users, {stats['coalesced']} coalesced, "
+          f"{messages} messages in {elapsed:.2f}s, {server.requests} requests, "
+          f"{server.rejected} rate limited, {stats['unreachable']} unreachable: {'ok' if ok else 'LOST EVENTS'}")
+    return ok
+
+def main():
+    """Parse arguments and run the simulation"""
+    parser = argparse.ArgumentParser(description="Deliver simulated farm notifications to a fake Discord")
+    parser.add_argument("--users", type=int, default=100, help="Number of farms")
+    parser.add_argument("--ticks", type=int, default=20, help="Number of ticks producing events")
+    parser.add_argument("--workers", type=int, default=4, help="Delivery workers")
+    parser.add_argument("--closed", type=float, default=0.05, help="Fraction of users with DMs closed")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ok = asyncio.run(simulate(args.users, args.ticks, args.workers, args.closed, args.seed))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Production Matrix
+Holds every user's generator counts as a row vector aligned with the
+generator catalog, so production, fuel and maintenance for all users come
+from a single count-matrix x rate-matrix product.
+
+numpy is used when installed; otherwise the product falls back to plain
+Python with the same results.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class ProductionMatrix:
+    """Users x generator types count matrix kept in step with user_data.
+
+    Rows are appended for new users and updated in place when counts change;
+    call `update` after anything that changes a user's generators and
+    `rebuild` after replacing user_data or changing the catalog.
+    """
+
+    def __init__(self, generator_types: Sequence[str]):
+        self.generator_types: Tuple[str, ...] = tuple(generator_types)
+        self.user_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._counts: List[List[int]] = []
+        self._array = None
+
+    def _vector(self, generators: Dict[str, int]) -> List[int]:
+        # Counts for types no longer in the catalog are ignored
+        return [generators.get(generator_type, 0) for generator_type in self.generator_types]
+
+    def rebuild(self, user_data: Dict[str, Dict[str, Any]], generator_types: Iterable[str] = None):
+        """Recreate every row from user_data, optionally for a new catalog"""
+        if generator_types is not None:
+            self.generator_types = tuple(generator_types)
+        self.user_ids = list(user_data)
+        self.rows = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self._counts = [self._vector(data.get("generators", {})) for data in user_data.values()]
+        self._array = None
+
+    def update(self, user_id: str, generators: Dict[str, int]):
+        """Store the current counts of one user, adding a row if needed"""
+        vector = self._vector(generators)
+        row = self.rows.get(user_id)
+        if row is None:
+            self.rows[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self._counts.append(vector)
+            # Appending to a numpy array copies it; rebuild lazily instead
+            self._array = None
+        else:
+            self._counts[row] = vector
+            if self._array is not None:
+                self._array[row] = vector
+
+    def product(self, matrix: Sequence[Sequence[float]]) -> List[Tuple[float, ...]]:
+        """Return counts @ matrix as one tuple per row, in `user_ids` order.
+
+        `matrix` has one row per generator type and one column per quantity.
+        """
+        if not self._counts:
+            return []
+        if np is not None:
+            if self._array is None:
+                self._array = np.array(self._counts, dtype=np.int64)
+            result = self._array @ np.asarray(matrix)
+            return [tuple(row) for row in result.tolist()]
+
+        columns = list(zip(*matrix))
+        return [
+            tuple(sum(count * weight for count, weight in zip(counts, column) if count) for column in columns)
+            for counts in self._counts
+        ]
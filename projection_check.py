@@ -0,0 +1,88 @@
+"""
+Sunshine Solar Sim - Projection Check
+Compares the closed-form forecasts of rules.Projection with the energy tick
+itself: for random farms (with and without fuelled generators and auto-sell
+policies) and random worth targets, ticks_until_worth must agree with
+running rules.generate_tick until the target is reached, to within one tick.
+
+Usage:
+    python projection_check.py --farms 400 --seed 1
+"""
+import argparse
+import collections
+import copy
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import config
+import rules
+
+def worth(data: Dict[str, Any], game_config: Dict[str, Any]) -> float:
+    """Money plus the value of the stored energy, carried fraction included"""
+    energy = data["energy"] + data.get("energy_fraction", 0) / rules.ENERGY_FRACTION_SCALE
+    return data["money"] + energy * game_config["energy_price"]
+
+def random_farm(rng: random.Random, game_config: Dict[str, Any]) -> Dict[str, Any]:
+    """A farm of any tier and fleet, half of them nearly broke, most with auto-sell"""
+    data = rules.new_user("check")
+    data["battery_tier"] = rng.randint(1, rules.max_battery_tier(game_config))
+    capacity = game_config["battery_capacities"][data["battery_tier"]]
+    data["money"] = rng.randint(0, 5000) if rng.random() < 0.5 else rng.randint(0, 2_000_000)
+    data["energy"] = rng.randint(0, capacity)
+    data["generators"] = {generator_type: rng.randint(0, 3) for generator_type in game_config["generator_types"]}
+    if rng.random() < 0.6:
+        data["auto_sell"] = {"mode": rng.choice(rules.AUTO_SELL_MODES), "amount": rng.randint(0, capacity)}
+    return data
+
+def simulated_ticks(data: Dict[str, Any], target: float, game_config: Dict[str, Any], limit: int) -> Optional[int]:
+    """Ticks until the farm is worth `target`, by running the tick; None past `limit`"""
+    data = copy.deepcopy(data)
+    for ticks in range(limit + 1):
+        if worth(data, game_config) >= target:
+            return ticks
+        rules.generate_tick(data, game_config)
+    return None
+
+def check(farms: int, limit: int, seed: int, balance: str) -> bool:
+    """Compare projected and simulated times to random targets"""
+    game_config = config.game_config(balance)
+    rng = random.Random(seed)
+    counts = collections.Counter()
+    wrong = collections.Counter()
+    began = time.perf_counter()
+    for _ in range(farms):
+        data = random_farm(rng, game_config)
+        target = worth(data, game_config) + rng.randint(0, 1_000_000)
+        kind = ("auto-sell" if data.get("auto_sell") else "manual") + \
+               (" with fuel" if rules.production_totals(data["generators"], game_config)[2] else "")
+        counts[kind] += 1
+
+        projected = rules.Projection(data, game_config).ticks_until_worth(target)
+        simulated = simulated_ticks(data, target, game_config, limit)
+        if simulated is None and (projected is None or projected > limit):
+            continue
+        if projected is None or simulated is None or abs(projected - simulated) > 1:
+            wrong[kind] += 1
+            print(f"{kind} farm: projected {projected}, ticked {simulated} ticks to {target:,.0f} cents "
+                  f"from {data!r}")
+    elapsed = time.perf_counter() - began
+
+    summary = ", ".join(f"{kind} {counts[kind] - wrong[kind]}/{counts[kind]}" for kind in sorted(counts))
+    print(f"{farms} farms in {elapsed:.2f}s, projections within a tick: {summary}: "
+          f"{'ok' if not wrong else 'WRONG FORECASTS'}")
+    return not wrong
+
+def main():
+    """Parse arguments and run the check"""
+    parser = argparse.ArgumentParser(description="Check forecast projections against the energy tick")
+    parser.add_argument("--farms", type=int, default=400, help="Number of random farms")
+    parser.add_argument("--limit", type=int, default=20000, help="Most ticks to run per farm")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--balance", default=config.BALANCE_FILE, help="Balance file to check")
+    args = parser.parse_args()
+    return 0 if check(args.farms, args.limit, args.seed, args.balance) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
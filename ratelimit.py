@@ -0,0 +1,110 @@
+"""
+Rate Limiting Utilities
+Per-user token buckets for slash commands and coalescing of identical
+in-flight reads.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now: float) -> float:
+        """Take one token; return 0 on success or the seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """Whether the bucket would be back at capacity by `now`"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class CommandRateLimiter:
+    """Per-user, per-command token buckets with shed-load counters"""
+
+    # Idle buckets are dropped once this many exist (or twice as many as the
+    # last prune kept, so a burst of distinct users costs amortized O(1))
+    prune_threshold = 10000
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]], default: Tuple[int, float]):
+        self.limits = dict(limits)
+        self.default = default
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._prune_at = self.prune_threshold
+        self.allowed: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+
+    def check(self, user_id: str, command: str, now: Optional[float] = None) -> float:
+        """Charge one use of `command` to `user_id`.
+
+        Returns 0 if the command may run, otherwise the seconds to wait.
+        """
+        if now is None:
+            now = time.monotonic()
+        key = (user_id, command)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_at:
+                self.prune(now)
+            uses, per = self.limits.get(command, self.default)
+            bucket = self._buckets[key] = TokenBucket(uses / per, uses, now)
+
+        retry_after = bucket.consume(now)
+        counters = self.rejected if retry_after else self.allowed
+        counters[command] = counters.get(command, 0) + 1
+        return retry_after
+
+    def prune(self, now: float):
+        """Forget buckets that have refilled, they are equivalent to new ones"""
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if not bucket.is_full(now)}
+        self._prune_at = max(self.prune_threshold, 2 * len(self._buckets))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Allowed and rejected counts per command"""
+        return {
+            command: {"allowed": self.allowed.get(command, 0), "rejected": self.rejected.get(command, 0)}
+            for command in sorted(set(self.allowed) | set(self.rejected))
+        }
+
+class RequestCoalescer:
+    """Runs at most one computation per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `factory()`, or the identical call already in flight for `key`"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
@@ -0,0 +1,77 @@
+"""
+Command Recorder
+Records slash-command invocations and tick boundaries so production traffic
+can be replayed offline (see replay.py).
+"""
+import gzip
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the event layout changes (2: integer cents and energy units)
+RECORDING_VERSION = 2
+
+def open_recording(path: str, mode: str = "r"):
+    """Open a recording file, transparently handling gzip compression"""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the events stored in a recording, one per line"""
+    with open_recording(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+class CommandRecorder:
+    """Writes a compact JSON lines log of commands and ticks.
+
+    Event kinds ("k"):
+      start - initial user state snapshot
+      cmd   - slash command with user id ("u"), name ("n"), command ("c") and arguments ("a")
+      tick  - boundary of a background task run ("task")
+      end   - final user state snapshot, written on shutdown
+    """
+
+    def __init__(self, path: str, user_data: Dict[str, Any]):
+        self.path = path
+        self._file = open_recording(path, "w")
+        self._write({"k": "start", "v": RECORDING_VERSION, "t": time.time(), "state": user_data})
+        self._file.flush()
+
+    def _write(self, event: Dict[str, Any]):
+        self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def record_command(self, user_id: str, user_name: str, command: str, args: Dict[str, Any]):
+        """Record a slash command invocation"""
+        self._write({
+            "k": "cmd",
+            "t": round(time.time(), 3),
+            "u": user_id,
+            "n": user_name,
+            "c": command,
+            "a": args
+        })
+
+    def record_tick(self, task: str, now: float = None):
+        """Record the start of a background task run and flush the buffer.
+
+        `now` is stored unrounded so a replay lands on the same production minute.
+        """
+        self._write({"k": "tick", "t": time.time() if now is None else now, "task": task})
+        # Flushing once per tick bounds the loss on a crash to one minute of traffic
+        self._file.flush()
+
+    def close(self, user_data: Dict[str, Any]):
+        """Write the final state snapshot and close the file"""
+        try:
+            self._write({"k": "end", "t": time.time(), "state": user_data})
+        finally:
+            self._file.close()
+        logger.info("Command recording saved to %s", self.path)
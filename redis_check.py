@@ -0,0 +1,146 @@
+"""
+Sunshine Solar Sim - Redis Backend Check
+Runs two RedisStore instances against the in-memory stand-in server
+(storage/resp_server.py) and checks what the bot relies on: records read
+back as written, writes and increments only landing at the expected
+version, the other instance hearing about every write (also across a
+dropped invalidation connection), and bulk calls split over several
+MULTI/EXEC blocks behaving like one.
+
+Usage:
+    python redis_check.py --users 50 --batch-size 7
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from typing import Iterable, List
+
+from storage.redis_store import RedisStore
+from storage.resp_server import RespServer
+
+async def heard(store: RedisStore, user_ids: Iterable[str], seconds: float = 2.0) -> bool:
+    """Wait briefly for a store's listener to invalidate every given user"""
+    user_ids = list(user_ids)
+    for _ in range(int(seconds * 100)):
+        await store.poll()
+        if all(store.is_stale(user_id) for user_id in user_ids):
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+async def check(users: int, batch_size: int, seed: int) -> bool:
+    """Run two stores against a stand-in server and check reads, conditional
+    writes, increments, invalidation and writes spanning several batches"""
+    rng = random.Random(seed)
+    server = RespServer()
+    await server.start()
+    first, second = RedisStore(server.url), RedisStore(server.url)
+    # Small batches, so every bulk call is split over several MULTI blocks
+    first.batch_size = second.batch_size = batch_size
+    failures: List[str] = []
+
+    def expect(condition: bool, message: str):
+        if not condition:
+            failures.append(message)
+
+    records = {str(100000 + index): {
+        "money": rng.randint(0, 10_000_000),
+        "energy": rng.randint(0, 5000),
+        "battery_tier": rng.randint(1, 5),
+        "generators": {"solar_panel": rng.randint(0, 20), "wind_turbine": rng.randint(0, 5)},
+        "auto_sell": {"mode": "off", "amount": 0},
+        "name": f"Farm {index} ☀",
+    } for index in range(users)}
+    user_ids = list(records)
+    began = time.perf_counter()
+    try:
+        # The second store listens before the first one writes
+        expect(await second.load_all() == {}, "a fresh server already holds records")
+
+        await first.put_many(records)
+        expect(await second.get_many(user_ids) == records, "records read back differ from those written")
+        expect(await second.load_all() == records, "load_all does not return every written record")
+        expect(all(first.version(user_id) == second.version(user_id) == 1 for user_id in user_ids),
+               "versions after the first write are not all 1")
+        expect(await heard(second, user_ids), "the other store never heard about the batch write")
+        expect(not any(first.is_stale(user_id) for user_id in user_ids), "a store invalidated its own writes")
+        second.take_stale()
+
+        # Conditional writes: only the holder of the latest version wins
+        user_id = user_ids[0]
+        changed = dict(records[user_id], money=1)
+        expect(await second.put_if_version(user_id, changed, second.version(user_id)),
+               "a write at the current version was refused")
+        expect(not await first.put_if_version(user_id, records[user_id], first.version(user_id)),
+               "a write at an old version was accepted")
+        expect(await heard(first, [user_id]), "the other store never heard about a conditional write")
+        expect(await first.get(user_id) == changed, "a refused write changed the record")
+        expect(await first.put_if_version("new", changed, None), "creating a new user was refused")
+        expect(not await second.put_if_version("new", changed, None), "creating an existing user was accepted")
+        records[user_id] = changed
+
+        # Increments: one user has moved on since the versions were read and gets none
+        await second.get_many(user_ids)
+        expected = {user_id: second.version(user_id) for user_id in user_ids}
+        moved = user_ids[-1]
+        expected[moved] -= 1
+        deltas = {user_id: {"money": 250, "energy": -rng.randint(0, 10)} for user_id in user_ids}
+        versions = await second.apply_deltas(deltas, expected)
+        # As the bot does once its cached copies have the increments too
+        for user_id, version in versions.items():
+            if version is not None:
+                second.confirm(user_id, version)
+        expect(versions[moved] is None, "increments landed on a record at another version")
+        expect(all(versions[user_id] == expected[user_id] + 1 for user_id in user_ids if user_id != moved),
+               "increments did not bump each record's version once")
+        stored = await first.get_many(user_ids)
+        for user_id in user_ids:
+            want = dict(records[user_id])
+            if user_id != moved:
+                for field, delta in deltas[user_id].items():
+                    want[field] += delta
+            expect(stored[user_id] == want, f"user {user_id} holds {stored[user_id]!r}, expected {want!r}")
+        expect(await heard(first, [user_id for user_id in user_ids if user_id != moved]),
+               "the other store never heard about the increments")
+        second.take_stale()
+
+        # Writes made while the listener is disconnected are found when it reconnects
+        for state in list(server._clients):
+            if state.channels:
+                state.writer.close()
+        await asyncio.sleep(0.1)
+        await first.put_many({user_ids[1]: records[user_ids[1]], "latecomer": changed})
+        expect(await heard(second, [user_ids[1], "latecomer"], seconds=5.0),
+               "writes made while the listener was disconnected were never noticed")
+        expect(not any(second.is_stale(user_id) for user_id in user_ids[2:-1]),
+               "reconnecting invalidated records nobody wrote")
+    finally:
+        await first.close()
+        await second.close()
+        await server.close()
+    elapsed = time.perf_counter() - began
+
+    for failure in failures:
+        print(failure)
+    print(f"redis: {users} records in batches of {batch_size} against the stand-in server "
+          f"in {elapsed:.2f}s: {'FAILED' if failures else 'ok'}")
+    return not failures
+
+def main():
+    """Parse arguments and run the check"""
+    parser = argparse.ArgumentParser(description="Check the Redis backend against the stand-in server")
+    parser.add_argument("--users", type=int, default=50, help="Number of records")
+    parser.add_argument("--batch-size", type=int, default=7, help="Users per MULTI/EXEC block")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ok = asyncio.run(check(args.users, args.batch_size, args.seed))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Sunshine Solar Sim - Offline Replay
+Replays a command recording (see recorder.py) against the real cog handlers
+and tick logic without connecting to Discord, as fast as possible.
+
+Usage:
+    python replay.py data/recording.jsonl.gz [--repeat 5]
+"""
+import argparse
+import asyncio
+import copy
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import rules
+from bot import EXTENSIONS, SunshineSolarBot
+from interactions import OfflineInteraction
+from recorder import RECORDING_VERSION, read_recording
+
+logger = logging.getLogger("replay")
+
+class ReplayBot(SunshineSolarBot):
+    """Bot that persists to a scratch directory and never logs in"""
+    storage_backend = "json"
+
+    def __init__(self, data_dir: str):
+        super().__init__()
+        self.users_file_path = str(Path(data_dir) / "users.json")
+        self.default_file_path = str(Path(data_dir) / "default_users.json")
+        self.replay_time = 0.0
+
+    def clock(self) -> float:
+        # Ticks see the recorded time, so weather multipliers match production
+        return self.replay_time
+
+def diff_states(expected: Dict[str, Any], actual: Dict[str, Any], path: str = "") -> List[str]:
+    """Return a readable list of differences between two user tables"""
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        where = f"{path}.{key}" if path else key
+        if key not in actual:
+            differences.append(f"{where}: missing after replay")
+        elif key not in expected:
+            differences.append(f"{where}: unexpected after replay")
+        elif isinstance(expected[key], dict) and isinstance(actual[key], dict):
+            differences.extend(diff_states(expected[key], actual[key], where))
+        elif expected[key] != actual[key]:
+            differences.append(f"{where}: recorded {expected[key]!r}, replayed {actual[key]!r}")
+    return differences
+
+async def replay(events: List[Dict[str, Any]], data_dir: str) -> Dict[str, Any]:
+    """Drive the cog handlers and ticks through one recording"""
+    bot = ReplayBot(data_dir)
+    for extension in EXTENSIONS:
+        await bot.load_extension(extension)
+
+    start = next(event for event in events if event["k"] == "start")
+    bot.user_data = copy.deepcopy(start["state"])
+    # Older recordings hold float balances, which the current rules no longer produce
+    converted = start.get("v", 1) < RECORDING_VERSION
+    for data in bot.user_data.values():
+        rules.migrate_record(data, bot.game_config)
+    bot.fleet.rebuild(bot.user_data)
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    ticks = 0
+
+    began = time.perf_counter()
+    for event in events:
+        if event["k"] == "cmd":
+            command = bot.tree.get_command(event["c"])
+            if command is None:
+                errors[event["c"]] = errors.get(event["c"], 0) + 1
+                continue
+            interaction = OfflineInteraction(event["u"], event.get("n", event["u"]))
+            call_start = time.perf_counter()
+            try:
+                await command.callback(command.binding, interaction, **event.get("a", {}))
+            except Exception:
+                logger.debug("Replayed /%s raised", event["c"], exc_info=True)
+                errors[event["c"]] = errors.get(event["c"], 0) + 1
+            latencies.setdefault(event["c"], []).append(time.perf_counter() - call_start)
+        elif event["k"] == "tick":
+            bot.replay_time = event["t"]
+            await getattr(bot, event["task"])()
+            ticks += 1
+    elapsed = time.perf_counter() - began
+
+    end = next((event for event in events if event["k"] == "end"), None)
+    differences = diff_states(end["state"], bot.user_data) if end is not None and not converted else None
+
+    await bot.close()
+    return {
+        "elapsed": elapsed,
+        "ticks": ticks,
+        "latencies": latencies,
+        "errors": errors,
+        "differences": differences
+    }
+
+def print_report(result: Dict[str, Any], show_diff: int):
+    """Print throughput, per-command latency and the state comparison"""
+    commands_run = sum(len(samples) for samples in result["latencies"].values())
+    elapsed = result["elapsed"]
+    print(f"Replayed {commands_run} commands and {result['ticks']} ticks in {elapsed:.3f}s "
+          f"({(commands_run + result['ticks']) / elapsed if elapsed else 0:,.0f} events/s)")
+
+    print(f"{'command':<18}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, samples in sorted(result["latencies"].items()):
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{name:<18}{len(ordered):>8}{statistics.fmean(ordered) * 1000:>10.3f}"
+              f"{statistics.median(ordered) * 1000:>10.3f}{p95 * 1000:>10.3f}"
+              f"{ordered[-1] * 1000:>10.3f}{result['errors'].get(name, 0):>8}")
+
+    differences = result["differences"]
+    if differences is None:
+        print("Recording has no final snapshot or predates integer balances; state comparison skipped")
+    elif not differences:
+        print("Final state matches the recording")
+    else:
+        print(f"Final state differs from the recording in {len(differences)} place(s):")
+        for line in differences[:show_diff]:
+            print(f"  {line}")
+
+def main():
+    """Parse arguments and run the replay"""
+    parser = argparse.ArgumentParser(description="Replay a Sunshine Solar Sim command recording offline")
+    parser.add_argument("recording", help="Recording file written with RECORD_COMMANDS (.jsonl or .jsonl.gz)")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times to replay the recording")
+    parser.add_argument("--show-diff", type=int, default=20, help="Maximum number of state differences to print")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    events = list(read_recording(args.recording))
+    if not events or events[0]["k"] != "start":
+        logger.error("Recording does not start with a state snapshot")
+        return 1
+
+    matched = True
+    for run in range(args.repeat):
+        with tempfile.TemporaryDirectory() as data_dir:
+            result = asyncio.run(replay(events, data_dir))
+        if args.repeat > 1:
+            print(f"--- run {run + 1}/{args.repeat}")
+        print_report(result, args.show_diff)
+        matched = matched and not result["differences"]
+    return 0 if matched else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,487 @@
+"""
+Game Rules
+Pure functions implementing the Sunshine Solar Sim game rules, shared by the
+bot's background tasks, the cogs and the offline tools.
+
+`config` is the dict layout also used by helpers.py (see
+config.BalanceTables.config): generators (the catalog), generator_types,
+generation_rates, generator_prices, maintenance_costs, fuel_costs,
+battery_capacities, battery_prices, max_battery_tier and energy_price.
+
+Balances are integers: money in cents (prices, fuel, maintenance and the
+energy price per unit too) and energy in whole units, so sums are exact and
+records diff cleanly. Production arrives in fractions of a unit, which are
+carried between ticks in `energy_fraction` until they add up to whole units.
+Dollars only appear when a number is formatted for display (helpers.py).
+"""
+import heapq
+import math
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# `energy_fraction` counts millionths of a unit
+ENERGY_FRACTION_SCALE = 1_000_000
+
+# Record layout; records without "schema" hold float dollars and energy (see migrate_record)
+SCHEMA_VERSION = 2
+
+class RuleError(Exception):
+    """A command broke a game rule; the message is shown to the user"""
+
+def new_user(name: str) -> Dict[str, Any]:
+    """Starting record for a newly registered user"""
+    return {
+        "name": name,
+        "schema": SCHEMA_VERSION,
+        "money": 100000,  # Starting money in cents ($1,000) - just enough for one solar panel
+        "energy": 0,    # Starting energy
+        "energy_fraction": 0,  # Produced energy short of a whole unit
+        "battery_tier": 1,  # Starting battery tier
+        "generators": {
+            "solar_panel": 1,  # Start with one solar panel
+            "wind_turbine": 0,
+            "gas_generator": 0
+        }
+    }
+
+def split_energy(amount: float) -> Tuple[int, int]:
+    """Whole units and carried millionths of a non-negative energy amount"""
+    return divmod(round(amount * ENERGY_FRACTION_SCALE), ENERGY_FRACTION_SCALE)
+
+def migrate_record(data: Dict[str, Any], config: Dict[str, Any]) -> bool:
+    """Convert a record from float dollars and energy to the integer layout in place.
+
+    Nothing is lost: money keeps its whole cents, and the sub-cent part
+    joins the carried energy at the current energy price, so net worth is
+    unchanged to a millionth of a unit. Returns False if already converted.
+    """
+    if data.get("schema", 1) >= SCHEMA_VERSION:
+        return False
+    # Tolerate float noise such as 1234.5599999 for $1,234.56
+    exact_cents = data.get("money", 0) * 100
+    cents = math.floor(exact_cents + 1e-6)
+    leftover = max(0.0, exact_cents - cents) / config["energy_price"] if config["energy_price"] else 0.0
+    data["money"] = cents
+    data["energy"], data["energy_fraction"] = split_energy(data.get("energy", 0) + leftover)
+    policy = data.get("auto_sell")
+    if policy:
+        policy["amount"] = round(policy.get("amount", 0))
+    data["schema"] = SCHEMA_VERSION
+    return True
+
+def _is_whole(value: Any, low: int = 0) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= low
+
+def validate_record(data: Any, config: Dict[str, Any]) -> List[str]:
+    """Problems that would stop the bot from using a record; empty when it is valid.
+
+    Checks the layout new_user creates (auto_sell and name are optional).
+    Records from before SCHEMA_VERSION must go through migrate_record first.
+    """
+    if not isinstance(data, dict):
+        return ["record is not an object"]
+    problems = [f"missing '{field}'" for field in ("money", "energy", "battery_tier", "generators")
+                if field not in data]
+    if data.get("schema", 1) != SCHEMA_VERSION:
+        problems.append(f"schema is not {SCHEMA_VERSION}")
+    if "name" in data and not isinstance(data["name"], str):
+        problems.append("name is not a string")
+    if not _is_whole(data.get("money", 0)):
+        problems.append("money is not a non-negative whole number of cents")
+    if not _is_whole(data.get("energy", 0)):
+        problems.append("energy is not a non-negative whole number")
+    fraction = data.get("energy_fraction", 0)
+    if not _is_whole(fraction) or fraction >= ENERGY_FRACTION_SCALE:
+        problems.append("energy_fraction is not below one unit")
+    tier = data.get("battery_tier", 1)
+    if not _is_whole(tier, 1) or tier > config["max_battery_tier"]:
+        problems.append("battery_tier is not a known tier")
+    generators = data.get("generators", {})
+    if not isinstance(generators, dict):
+        problems.append("generators is not an object")
+    elif not all(_is_whole(count) for count in generators.values()):
+        problems.append("generator counts are not non-negative whole numbers")
+    policy = data.get("auto_sell")
+    if policy is not None and (not isinstance(policy, dict) or policy.get("mode") not in AUTO_SELL_MODES
+                               or not _is_whole(policy.get("amount"))):
+        problems.append("auto_sell is not a valid policy")
+    return problems
+
+def catalog_problems(data: Dict[str, Any], config: Dict[str, Any]) -> List[str]:
+    """Parts of a valid record the balance tables have no entry for; empty
+    when the tick and every command can use the record with these tables"""
+    problems = []
+    if data.get("battery_tier", 1) not in config["battery_capacities"]:
+        problems.append(f"battery tier {data.get('battery_tier', 1)} has no capacity")
+    owned = sorted(generator_type for generator_type, count in data.get("generators", {}).items()
+                   if count and generator_type not in config["generator_types"])
+    if owned:
+        problems.append(f"owns unknown generator types {', '.join(owned)}")
+    return problems
+
+def max_battery_tier(config: Dict[str, Any]) -> int:
+    """Highest battery tier available"""
+    return config["max_battery_tier"]
+
+def sell_energy(data: Dict[str, Any], amount: int, config: Dict[str, Any]) -> int:
+    """Sell `amount` whole units of stored energy and return the earnings in cents"""
+    earnings = amount * config["energy_price"]
+    data["energy"] -= amount
+    data["money"] += earnings
+    return earnings
+
+def buy_generators(data: Dict[str, Any], generator_type: str, amount: int, config: Dict[str, Any]) -> int:
+    """Buy `amount` generators of a type and return the total price in cents"""
+    total_price = config["generator_prices"][generator_type] * amount
+    data["money"] -= total_price
+    data["generators"][generator_type] = data["generators"].get(generator_type, 0) + amount
+    return total_price
+
+def upgrade_battery(data: Dict[str, Any], config: Dict[str, Any]) -> int:
+    """Move the battery up one tier and return the price paid in cents"""
+    next_tier = data.get("battery_tier", 1) + 1
+    upgrade_price = config["battery_prices"][next_tier]
+    data["money"] -= upgrade_price
+    data["battery_tier"] = next_tier
+    return upgrade_price
+
+# Auto-sell policy modes: sell everything once the battery is full, keep a
+# reserve and sell the rest every tick, or sell everything at a threshold
+AUTO_SELL_MODES = ("full", "reserve", "threshold")
+
+def auto_sell_amount(policy: Dict[str, Any], energy: int, max_capacity: int) -> int:
+    """Energy an auto-sell policy sells from `energy` stored before the battery cap"""
+    mode = policy["mode"]
+    if mode == "full":
+        return energy if energy >= max_capacity else 0
+    if mode == "reserve":
+        return max(0, energy - policy["amount"])
+    if mode == "threshold":
+        return energy if energy >= policy["amount"] else 0
+    return 0
+
+def auto_sell_prevents_waste(policy: Dict[str, Any], max_capacity: int) -> bool:
+    """True when a policy always sells before the battery cap would discard production"""
+    return policy["mode"] == "full" or policy["amount"] <= max_capacity
+
+def net_worth(data: Dict[str, Any], config: Dict[str, Any]) -> int:
+    """Money plus the sale value of all stored energy, in cents"""
+    return data["money"] + data["energy"] * config["energy_price"]
+
+def top_farms(user_data: Dict[str, Dict[str, Any]], config: Dict[str, Any],
+              limit: int) -> List[Tuple[int, str, str]]:
+    """The `limit` richest farms as (net worth, user id, name), richest first"""
+    return heapq.nlargest(
+        limit,
+        ((net_worth(data, config), user_id, data.get("name", user_id)) for user_id, data in user_data.items())
+    )
+
+def production_totals(generators: Dict[str, int], config: Dict[str, Any],
+                      multipliers: Optional[Dict[str, float]] = None) -> Tuple[float, float, int]:
+    """Per-minute (unfuelled output, fuelled output, fuel cost in cents) of a generator fleet.
+
+    `multipliers` scales each type's output (time of day and weather); rated
+    output is used when it is omitted.
+    """
+    rates = config["generation_rates"]
+    fuel_costs = config["fuel_costs"]
+    free_output = fueled_output = fuel = 0
+    for generator_type, count in generators.items():
+        if not count or generator_type not in rates:
+            continue
+        output = count * rates[generator_type]
+        if multipliers is not None:
+            output *= multipliers[generator_type]
+        if fuel_costs[generator_type] > 0:
+            fueled_output += output
+            fuel += count * fuel_costs[generator_type]
+        else:
+            free_output += output
+    return free_output, fueled_output, fuel
+
+def multipliers_at(config: Dict[str, Any], minute: int) -> Dict[str, float]:
+    """Production multiplier of each generator type for an absolute game minute"""
+    return dict(zip(config["generator_types"], config["production_model"].multipliers(minute)))
+
+def maintenance_total(generators: Dict[str, int], config: Dict[str, Any]) -> int:
+    """Daily maintenance cost of a generator fleet, in cents"""
+    total_maintenance = 0
+    for generator_type, count in generators.items():
+        total_maintenance += config["maintenance_costs"].get(generator_type, 0) * count
+    return total_maintenance
+
+def charge_maintenance(data: Dict[str, Any], total_maintenance: float) -> int:
+    """Charge a day of maintenance (money never drops below zero) and return the cost"""
+    # Fleet totals arrive as floats from the matrix product; their values are whole cents
+    total_maintenance = round(total_maintenance)
+    if total_maintenance > 0:
+        data["money"] = max(0, data["money"] - total_maintenance)
+    return total_maintenance
+
+def apply_maintenance(data: Dict[str, Any], config: Dict[str, Any]) -> int:
+    """Charge a day of maintenance for a user's generators and return the cost"""
+    return charge_maintenance(data, maintenance_total(data.get("generators", {}), config))
+
+def apply_generation(data: Dict[str, Any], free_output: float, fueled_output: float, fuel: float,
+                     max_capacity: int, config: Optional[Dict[str, Any]] = None) -> float:
+    """Apply one minute of generation from precomputed fleet totals and return the energy produced.
+
+    With `config`, the user's auto-sell policy (if any) sells at the current energy price.
+    """
+    # Fuelled generators only run if the user can pay for all of their fuel
+    fuel = round(fuel)
+    energy_generated = free_output
+    if fuel > 0 and data["money"] >= fuel:
+        data["money"] -= fuel
+        energy_generated += fueled_output
+
+    # Whole units reach the battery; the rest is carried to the next tick
+    produced, data["energy_fraction"] = divmod(
+        data.get("energy_fraction", 0) + round(energy_generated * ENERGY_FRACTION_SCALE), ENERGY_FRACTION_SCALE
+    )
+
+    # Auto-sell before the battery cap, so production that would overflow is sold, not wasted
+    energy = data["energy"] + produced
+    policy = data.get("auto_sell")
+    if policy and config is not None:
+        amount = auto_sell_amount(policy, energy, max_capacity)
+        if amount > 0:
+            data["energy"] = energy
+            sell_energy(data, amount, config)
+            energy = data["energy"]
+
+    # Add energy to storage, respecting battery capacity; a full battery
+    # discards the carried fraction along with the overflow
+    if energy >= max_capacity:
+        energy = max_capacity
+        data["energy_fraction"] = 0
+    data["energy"] = energy
+    return energy_generated
+
+def generate_tick(data: Dict[str, Any], config: Dict[str, Any], minute: Optional[int] = None) -> float:
+    """Apply one minute of generation to a user and return the energy produced.
+
+    `minute` (Unix time // 60) applies that minute's weather; rated output is used without it.
+    """
+    multipliers = multipliers_at(config, minute) if minute is not None else None
+    free_output, fueled_output, fuel = production_totals(data.get("generators", {}), config, multipliers)
+    max_capacity = config["battery_capacities"][data.get("battery_tier", 1)]
+    return apply_generation(data, free_output, fueled_output, fuel, max_capacity, config)
+
+class Projection:
+    """Closed-form model of a user's balances over future generation ticks.
+
+    Without auto-sell, `generate_tick` only lowers money (fuel) and only
+    raises energy until the battery caps, so after n ticks:
+
+        money(n)  = money - fuel * min(n, fuel_ticks)
+        energy(n) = min(capacity, energy + free_rate * n + fueled_rate * min(n, fuel_ticks))
+
+    Both are piecewise linear with breakpoints at `fuel_ticks` and `full_ticks`,
+    which lets every question be answered without simulating minute by minute.
+
+    With a `start_minute`, `at` replaces the rated outputs with the weather's
+    accrued multipliers from that minute on, which stays exact because the
+    battery clamp only ever applies to a running total of non-negative
+    increments. `full_ticks` and `ticks_until_worth` always use rated
+    (average weather) output. Maintenance is not included.
+
+    An auto-sell policy that sells before the battery fills only turns energy
+    into money at the sale price, so the model drops the cap for such farms:
+    `at` then counts sold energy as still stored. With fuelled generators the
+    sales also pay the fuel, so whether the generators run depends on when the
+    policy sells. Those farms are stepped from sale to sale at rated output
+    (see `_auto_sell_stretches`) until every sale cycle pays its own fuel,
+    after which worth grows linearly by the output's value less the fuel.
+
+    The model works in real numbers: its energy includes the carried
+    fraction, so it can differ from the integer ticks by less than a unit.
+    Money is in cents, like the records.
+    """
+
+    # Sales and fuel cut-offs followed one by one before assuming the farm has settled
+    MAX_STRETCHES = 1000
+
+    def __init__(self, data: Dict[str, Any], config: Dict[str, Any], start_minute: Optional[int] = None):
+        generators = data.get("generators", {})
+        self.money = data["money"]
+        self.energy = data["energy"] + data.get("energy_fraction", 0) / ENERGY_FRACTION_SCALE
+        self.capacity = config["battery_capacities"][data.get("battery_tier", 1)]
+        policy = data.get("auto_sell")
+        self.policy = None
+        if policy and auto_sell_prevents_waste(policy, self.capacity):
+            # The energy level that triggers a sale
+            self.policy = (policy["mode"], self.capacity if policy["mode"] == "full" else policy["amount"])
+            self.capacity = math.inf
+        self.energy_price = config["energy_price"]
+        self.free_rate, self.fueled_rate, self.fuel = production_totals(generators, config)
+
+        self.start_minute = start_minute
+        if start_minute is not None:
+            self.model = config["production_model"]
+            # Rated output per type, split by whether it needs fuel
+            self.free_weights = []
+            self.fueled_weights = []
+            for generator_type in config["generator_types"]:
+                output = generators.get(generator_type, 0) * config["generation_rates"][generator_type]
+                fueled = config["fuel_costs"][generator_type] > 0
+                self.free_weights.append(0 if fueled else output)
+                self.fueled_weights.append(output if fueled else 0)
+
+        # Number of ticks the fuelled generators can still be paid for
+        if self.fuel > 0:
+            self.fuel_ticks = int(self.money // self.fuel) if self.money >= self.fuel else 0
+        else:
+            self.fuel_ticks = 0
+        self.full_ticks = self._ticks_until_full()
+
+    def _ticks_until_full(self) -> float:
+        if self.capacity == math.inf:
+            return math.inf
+        if self.energy >= self.capacity:
+            return 0
+        running_rate = self.free_rate + self.fueled_rate
+        if running_rate > 0:
+            ticks = math.ceil((self.capacity - self.energy) / running_rate)
+            if ticks <= self.fuel_ticks:
+                return ticks
+        if self.free_rate <= 0:
+            return math.inf
+        energy_after_fuel = self.energy + running_rate * self.fuel_ticks
+        return self.fuel_ticks + math.ceil((self.capacity - energy_after_fuel) / self.free_rate)
+
+    @property
+    def sells_for_fuel(self) -> bool:
+        """True when auto-sell income decides whether the fuelled generators run"""
+        return self.policy is not None and self.fuel > 0
+
+    def _auto_sell_stretches(self) -> Iterator[Tuple[float, float, float, float, float]]:
+        """Stretches of ticks between an auto-sell farm's sales and fuel cut-offs, as
+        (ticks, money, energy, money per tick, energy per tick) at their start.
+
+        A stretch ends at a sale (which leaves worth unchanged) or when the money
+        left cannot pay the fuel. The last stretch is endless: either every sale
+        cycle from then on pays its own fuel, or (when running the fuelled
+        generators loses money) money hovers around one tick of fuel and worth
+        stops growing.
+        """
+        mode, level = self.policy
+        fuel, price = self.fuel, self.energy_price
+        net = (self.free_rate + self.fueled_rate) * price - fuel
+        money, energy = self.money, self.energy
+        for _ in range(self.MAX_STRETCHES):
+            running = money >= fuel
+            rate = self.free_rate + (self.fueled_rate if running else 0)
+            spent = fuel if running else 0
+            if mode == "reserve" and energy >= level + 1:
+                # The stored surplus is sold at the end of the next tick
+                yield 1, money, energy, -spent, rate
+                money -= spent
+                energy += rate
+                sold = math.floor(energy) - level
+                money += sold * price
+                energy -= sold
+                continue
+            if mode == "reserve" and energy >= level:
+                # Everything above the reserve is sold every tick
+                gain = rate * price - spent
+                if running and net >= 0:
+                    yield math.inf, money, energy, -fuel, rate
+                    return
+                if running:
+                    ticks = math.floor((money - fuel) / -gain) + 1
+                elif gain <= 0:
+                    break
+                else:
+                    ticks = math.ceil((fuel - money) / gain)
+                yield ticks, money, energy, gain, 0
+                money += gain * ticks
+                if not running and net < 0:
+                    break
+                continue
+            if rate <= 0:
+                break
+            # The tick whose output reaches the sale level, unless the fuel runs out first
+            ticks = max(1, math.ceil((level - energy) / rate))
+            sale = True
+            if running and money // fuel < ticks:
+                ticks, sale = int(money // fuel), False
+            yield ticks, money, energy, -spent, rate
+            money -= spent * ticks
+            energy += rate * ticks
+            if sale:
+                sold = math.floor(energy) - (level if mode == "reserve" else 0)
+                money += sold * price
+                energy -= sold
+                # From here every cycle pays all of its fuel and ends with more money
+                cycle = max(1, math.ceil((level - energy) / (self.free_rate + self.fueled_rate)))
+                if mode != "reserve" and net >= 0 and money >= fuel * cycle:
+                    yield math.inf, money, energy, -fuel, self.free_rate + self.fueled_rate
+                    return
+        # Settled into losing money on fuel, or too many cycles to follow one by one
+        if net >= 0:
+            yield math.inf, money, energy, -fuel, self.free_rate + self.fueled_rate
+        else:
+            yield math.inf, money, energy, 0, 0
+
+    def at(self, ticks: int) -> Tuple[float, float]:
+        """Money and energy after `ticks` generation ticks"""
+        if self.sells_for_fuel:
+            elapsed = 0
+            for length, money, energy, money_rate, energy_rate in self._auto_sell_stretches():
+                if ticks - elapsed <= length:
+                    return money + money_rate * (ticks - elapsed), energy + energy_rate * (ticks - elapsed)
+                elapsed += length
+        fuel_ticks = min(ticks, self.fuel_ticks)
+        money = self.money - self.fuel * fuel_ticks
+        if self.start_minute is None:
+            produced = self.free_rate * ticks + self.fueled_rate * fuel_ticks
+        else:
+            # Ticks 1..n use the multipliers of minutes start+1 .. start+n
+            first = self.start_minute + 1
+            free_accrued = self.model.accrued(first, first + ticks)
+            fueled_accrued = self.model.accrued(first, first + fuel_ticks)
+            produced = (sum(w * a for w, a in zip(self.free_weights, free_accrued))
+                        + sum(w * a for w, a in zip(self.fueled_weights, fueled_accrued)))
+        energy = min(self.capacity, self.energy + produced)
+        return money, energy
+
+    def worth(self, ticks: int) -> float:
+        """Money after `ticks` ticks if all stored energy were then sold"""
+        money, energy = self.at(ticks)
+        return money + energy * self.energy_price
+
+    def ticks_until_worth(self, target: float) -> Optional[int]:
+        """Fewest ticks until selling everything yields `target` money, or None if never"""
+        if self.sells_for_fuel:
+            elapsed = 0
+            for length, money, energy, money_rate, energy_rate in self._auto_sell_stretches():
+                worth = money + energy * self.energy_price
+                if worth >= target:
+                    return elapsed
+                slope = money_rate + energy_rate * self.energy_price
+                if slope > 0 and (target - worth) / slope <= length:
+                    return elapsed + math.ceil((target - worth) / slope)
+                elapsed += length
+            return None
+        breakpoints = sorted({0, *(b for b in (self.fuel_ticks, self.full_ticks) if b != math.inf)})
+        for index, start in enumerate(breakpoints):
+            worth = self.worth(start)
+            if worth >= target:
+                return start
+            slope = self.worth(start + 1) - worth
+            if slope <= 0:
+                continue
+            end = breakpoints[index + 1] if index + 1 < len(breakpoints) else math.inf
+            ticks = start + math.ceil((target - worth) / slope)
+            # Step one tick further if float rounding left us just below the target
+            for candidate in (ticks, ticks + 1):
+                if candidate <= end and self.worth(candidate) >= target:
+                    return candidate
+        return None
+
+def daily_net_income(data: Dict[str, Any], config: Dict[str, Any]) -> float:
+    """Income per day in cents from selling all production, after fuel and maintenance"""
+    generators = data.get("generators", {})
+    free_output, fueled_output, fuel = production_totals(generators, config)
+    production_value = (free_output + fueled_output) * config["energy_price"]
+    return (production_value - fuel) * 60 * 24 - maintenance_total(generators, config)
@@ -0,0 +1,353 @@
+"""
+Sharding
+Opt-in sharded mode for large deployments.
+
+Gateway shards are handled by discord.AutoShardedClient (see
+ShardedSunshineSolarBot in bot.py). Independently of that, user state can be
+partitioned across several bot processes: every farm is owned by exactly one
+process, chosen from the user id, and only its owner ticks and persists it.
+A command for a farm owned by another process is forwarded to the owner over
+a small local JSON lines protocol and the owner's reply is sent back through
+the original interaction. The same protocol answers cross-partition reads
+such as the leaderboard.
+
+Environment variables:
+    SHARD_COUNT      total gateway shards, or "auto"; unset runs unsharded
+    SHARD_IDS        gateway shards run by this process, e.g. "0-3" or "0,2"
+    PARTITION_PEERS  host:port of every bot process, in partition order
+    PARTITION_INDEX  position of this process in PARTITION_PEERS
+
+Run `python sharding.py --partitions 4` to exercise partitioning and
+forwarding locally with simulated processes, without connecting to Discord.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import rules
+from interactions import OfflineInteraction, serialize_reply
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Commands that never touch the caller's farm and always run locally
+LOCAL_COMMANDS = {"help", "analytics", "leaderboard"}
+
+def parse_shard_ids(text: str) -> List[int]:
+    """Parse a shard list such as "0-3,8" into [0, 1, 2, 3, 8]"""
+    shard_ids = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            shard_ids.extend(range(int(first), int(last) + 1))
+        else:
+            shard_ids.append(int(part))
+    return sorted(set(shard_ids))
+
+def shard_options_from_env() -> Optional[Dict[str, Any]]:
+    """AutoShardedBot keyword arguments from SHARD_COUNT/SHARD_IDS, or None when unsharded"""
+    shard_count = os.getenv("SHARD_COUNT")
+    if not shard_count:
+        return None
+    options = {"shard_count": None if shard_count == "auto" else int(shard_count)}
+    shard_ids = os.getenv("SHARD_IDS")
+    if shard_ids:
+        if options["shard_count"] is None:
+            raise ValueError("SHARD_IDS needs an explicit SHARD_COUNT")
+        options["shard_ids"] = parse_shard_ids(shard_ids)
+    return options
+
+def parse_peer(peer: str) -> Tuple[str, int]:
+    """Split "host:port" into its parts"""
+    host, _, port = peer.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+class Partition:
+    """Which bot process owns which farms.
+
+    Farms are assigned by the timestamp bits of the user's snowflake id, the
+    same spreading Discord uses to assign guilds to shards. With a single
+    partition (the default) this process owns everything.
+    """
+
+    def __init__(self, index: int = 0, peers: Sequence[str] = ()):
+        self.peers = tuple(peers)
+        self.count = max(1, len(self.peers))
+        if not 0 <= index < self.count:
+            raise ValueError(f"partition index {index} out of range for {self.count} partition(s)")
+        self.index = index
+
+    @classmethod
+    def from_env(cls) -> "Partition":
+        """Partition described by PARTITION_PEERS and PARTITION_INDEX"""
+        peers = [peer.strip() for peer in os.getenv("PARTITION_PEERS", "").split(",") if peer.strip()]
+        return cls(int(os.getenv("PARTITION_INDEX", "0")), peers)
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def owner_of(self, user_id: str) -> int:
+        """Index of the partition owning a user's farm"""
+        return (int(user_id) >> 22) % self.count
+
+    def owns(self, user_id: str) -> bool:
+        return self.owner_of(user_id) == self.index
+
+class PartitionCoordinator:
+    """Serves this partition to its peers and sends requests to theirs.
+
+    Each request is one JSON object per line with an "op"; each response is
+    one line with "ok" and either "result" or "error".
+    """
+
+    def __init__(self, bot, partition: Partition, timeout: float = 5.0):
+        self.bot = bot
+        self.partition = partition
+        self.timeout = timeout
+        self._server = None
+        self._connections: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # Connections accepted from peers, closed on shutdown
+        self._handlers: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+        # Counters shown by /analytics
+        self.forwarded = 0
+        self.served = 0
+        self.failures = 0
+
+    async def start(self):
+        """Start accepting requests from the other partitions"""
+        host, port = parse_peer(self.partition.peers[self.partition.index])
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("Partition %d/%d listening on %s:%s", self.partition.index, self.partition.count, host, port)
+
+    async def close(self):
+        """Stop serving and drop peer connections"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for _, writer in self._connections.values():
+            writer.close()
+        self._connections.clear()
+        # Closing the accepted connections ends their handlers at the next read
+        handlers = list(self._handlers.items())
+        for _, writer in handlers:
+            writer.close()
+        await asyncio.gather(*(task for task, _ in handlers), return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = {"ok": True, "result": await self._dispatch(json.loads(line))}
+                except Exception as e:
+                    logger.error("Partition request failed: %s", e, exc_info=True)
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(task, None)
+            writer.close()
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Any:
+        op = request.get("op")
+        if op == "command":
+            self.served += 1
+            return await self.run_command(request["user_id"], request["user_name"], request["command"],
+                                          request.get("args", {}))
+        if op == "leaderboard":
+            return rules.top_farms(self.bot.user_data, self.bot.game_config, request["limit"])
+        raise ValueError(f"unknown partition op '{op}'")
+
+    async def run_command(self, user_id: str, user_name: str, command_name: str,
+                          args: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a slash command for a farm owned here and return its reply"""
+        command = self.bot.tree.get_command(command_name)
+        if command is None:
+            return {"content": f"Unknown command `/{command_name}`.", "ephemeral": True}
+        if self.bot.recorder is not None:
+            self.bot.recorder.record_command(user_id, user_name, command_name, args)
+        interaction = OfflineInteraction(user_id, user_name)
+        await command.callback(command.binding, interaction, **args)
+        return serialize_reply(interaction.response.reply)
+
+    async def request(self, index: int, payload: Dict[str, Any]) -> Any:
+        """Send one request to another partition and return its result"""
+        lock = self._locks.setdefault(index, asyncio.Lock())
+        # Requests to one peer share its connection; give up rather than queue forever behind a stuck one
+        try:
+            await asyncio.wait_for(lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise ConnectionError(f"partition {index} busy") from None
+        try:
+            connection = self._connections.get(index)
+            if connection is None:
+                host, port = parse_peer(self.partition.peers[index])
+                connection = self._connections[index] = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), self.timeout
+                )
+            reader, writer = connection
+            writer.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError("connection closed")
+        except (OSError, asyncio.TimeoutError) as e:
+            # Drop the connection so the next request reconnects
+            self.failures += 1
+            connection = self._connections.pop(index, None)
+            if connection is not None:
+                connection[1].close()
+            raise ConnectionError(f"partition {index} unavailable: {str(e) or type(e).__name__}") from e
+        finally:
+            lock.release()
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def forward_command(self, user_id: str, user_name: str, command_name: str,
+                              args: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a command on the partition owning the user's farm"""
+        self.forwarded += 1
+        return await self.request(self.partition.owner_of(user_id), {
+            "op": "command",
+            "user_id": user_id,
+            "user_name": user_name,
+            "command": command_name,
+            "args": args
+        })
+
+    async def leaderboard(self, limit: int) -> Tuple[List[Tuple[int, str, str]], int]:
+        """Richest farms across all partitions, plus the number of partitions that did not answer"""
+        others = [index for index in range(self.partition.count) if index != self.partition.index]
+        results = await asyncio.gather(
+            *(self.request(index, {"op": "leaderboard", "limit": limit}) for index in others),
+            return_exceptions=True
+        )
+        entries = rules.top_farms(self.bot.user_data, self.bot.game_config, limit)
+        missing = 0
+        for index, result in zip(others, results):
+            if isinstance(result, Exception):
+                logger.warning("Leaderboard skipped partition %d: %s", index, result)
+                missing += 1
+            else:
+                entries.extend(tuple(entry) for entry in result)
+        entries.sort(reverse=True)
+        return entries[:limit], missing
+
+async def simulate(partitions: int, users: int, commands: int, base_port: int, seed: int) -> bool:
+    """Run several partitions in one event loop and check ownership end to end"""
+    # Imported here so the bot module is only needed by the simulation
+    from bot import EXTENSIONS, SunshineSolarBot
+
+    rng = random.Random(seed)
+    peers = [f"127.0.0.1:{base_port + index}" for index in range(partitions)]
+    # Snowflake-shaped ids: millisecond timestamp in the high bits
+    user_ids = [str(((1_600_000_000_000 + rng.randrange(10 ** 11)) << 22) | rng.randrange(1 << 22))
+                for _ in range(users)]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        bots = []
+        for index in range(partitions):
+            bot = SunshineSolarBot(partition=Partition(index, peers))
+            bot.storage_backend = "json"
+            bot.users_file_path = str(Path(data_dir) / f"users.{index}.json")
+            bot.default_file_path = str(Path(data_dir) / "users.json")
+            bots.append(bot)
+        for bot in bots:
+            for extension in EXTENSIONS:
+                await bot.load_extension(extension)
+            await bot.load_data()
+            await bot.coordinator.start()
+
+        async def invoke(user_id: str, command: str, args: Dict[str, Any]):
+            # The command arrives on whichever process runs the guild's shard
+            bot = rng.choice(bots)
+            if bot.partition.owns(user_id):
+                return await bot.coordinator.run_command(user_id, f"user{user_id[-4:]}", command, args)
+            return await bot.coordinator.forward_command(user_id, f"user{user_id[-4:]}", command, args)
+
+        began = time.perf_counter()
+        for user_id in user_ids:
+            await invoke(user_id, "start", {})
+        for _ in range(commands):
+            command, args = rng.choice([("status", {}), ("sell", {"amount": "all"}),
+                                        ("buy", {"generator_type": "solar_panel", "amount": 1})])
+            await invoke(rng.choice(user_ids), command, args)
+        for bot in bots:
+            await bot.generate_energy()
+            await bot.flush_data()
+        elapsed = time.perf_counter() - began
+
+        ok = True
+        for bot in bots:
+            owned = [user_id for user_id in bot.user_data if not bot.partition.owns(user_id)]
+            saved = json.loads(Path(bot.users_file_path).read_text())
+            print(f"partition {bot.partition.index}: {len(bot.user_data)} farms, "
+                  f"{bot.coordinator.forwarded} forwarded, {bot.coordinator.served} served")
+            if owned or set(saved) != set(bot.user_data):
+                print(f"  ownership violated: {len(owned)} foreign farms, saved file in sync: {set(saved) == set(bot.user_data)}")
+                ok = False
+        total = sum(len(bot.user_data) for bot in bots)
+        if total != len(set(user_ids)):
+            print(f"expected {len(set(user_ids))} farms across partitions, found {total}")
+            ok = False
+
+        merged = {}
+        for bot in bots:
+            merged.update(bot.user_data)
+        expected = rules.top_farms(merged, bots[0].game_config, 10)
+        leaderboard, missing = await bots[-1].coordinator.leaderboard(10)
+        if [entry[1] for entry in leaderboard] != [entry[1] for entry in expected] or missing:
+            print("leaderboard does not match the merged user tables")
+            ok = False
+
+        for bot in bots:
+            await bot.coordinator.close()
+            await bot.close()
+
+    print(f"{users} farms, {users + commands} commands over {partitions} partitions in {elapsed:.3f}s: "
+          f"{'ok' if ok else 'FAILED'}")
+    return ok
+
+def main():
+    """Parse arguments and run the local partition simulation"""
+    parser = argparse.ArgumentParser(description="Simulate partitioned Sunshine Solar Sim processes locally")
+    parser.add_argument("--partitions", type=int, default=4, help="Number of simulated bot processes")
+    parser.add_argument("--users", type=int, default=500, help="Number of farms to create")
+    parser.add_argument("--commands", type=int, default=2000, help="Number of random commands after /start")
+    parser.add_argument("--base-port", type=int, default=17700, help="First local port used by the partitions")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+    if args.partitions < 2:
+        parser.error("--partitions must be at least 2")
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ok = asyncio.run(simulate(args.partitions, args.users, args.commands, args.base_port, args.seed))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Sunshine Solar Sim - Strategy Simulator
+Monte-Carlo balance simulator that plays many player strategies over weeks of
+game time with the real game rules and reports aggregate progression curves.
+
+Generation between player actions is fast-forwarded with the closed-form
+rules.Projection over the production model's accrued weather, so a simulated
+month costs one step per player check-in rather than one per minute.
+
+Usage:
+    python simulate.py --weeks 4 --samples 20 --workers 8 --output curves.json
+    python simulate.py --balance balance-proposal.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import config
+import rules
+
+logger = logging.getLogger("simulate")
+
+MINUTES_PER_DAY = 60 * 24
+
+def player_turn(data: Dict[str, Any], strategy: Dict[str, Any], game_config: Dict[str, Any]):
+    """Let a simulated player sell, upgrade and buy according to their strategy"""
+    capacity = game_config["battery_capacities"][data["battery_tier"]]
+
+    # Sell everything once the battery passes the threshold
+    if data["energy"] > 0 and data["energy"] >= strategy["sell_threshold"] * capacity:
+        rules.sell_energy(data, data["energy"], game_config)
+
+    # Upgrade the battery when the price is covered with the requested margin
+    if data["battery_tier"] < rules.max_battery_tier(game_config):
+        price = game_config["battery_prices"][data["battery_tier"] + 1]
+        if data["money"] >= price * strategy["upgrade_margin"]:
+            rules.upgrade_battery(data, game_config)
+
+    # Spend what is left above the reserve, following the buy order
+    for generator_type in strategy["buy_order"]:
+        price = game_config["generator_prices"][generator_type]
+        amount = int((data["money"] - strategy["reserve"] * 100) // price)
+        if amount > 0:
+            rules.buy_generators(data, generator_type, amount, game_config)
+
+def advance(data: Dict[str, Any], minute: int, ticks: int, game_config: Dict[str, Any]):
+    """Apply the generation ticks after absolute `minute` in closed form, weather included"""
+    if ticks > 0:
+        money, energy = rules.Projection(data, game_config, start_minute=minute).at(ticks)
+        data["money"] = round(money)
+        data["energy"], data["energy_fraction"] = rules.split_energy(energy)
+
+def run_strategy(strategy: Dict[str, Any], minutes: int, seed: int, start_day: int,
+                 game_config: Dict[str, Any]) -> List[Dict[str, float]]:
+    """Play one strategy from a fresh account and return a daily progression curve"""
+    rng = random.Random(seed)
+    data = rules.new_user("simulated")
+    start_minute = start_day * MINUTES_PER_DAY
+    curve = []
+    now = 0
+    next_turn = 0
+    next_day = MINUTES_PER_DAY
+    while now < minutes:
+        if now >= next_turn:
+            player_turn(data, strategy, game_config)
+            # Players check in roughly every `check_interval` minutes
+            next_turn = now + max(1, round(rng.expovariate(1 / strategy["check_interval"])))
+
+        target = min(next_turn, next_day, minutes)
+        advance(data, start_minute + now, target - now, game_config)
+        now = target
+
+        if now == next_day:
+            # Maintenance runs right after the day's last generation tick
+            rules.apply_maintenance(data, game_config)
+            curve.append({
+                # In dollars, like the report
+                "worth": (data["money"] + data["energy"] * game_config["energy_price"]) / 100,
+                "rate": sum(
+                    count * game_config["generation_rates"][generator_type]
+                    for generator_type, count in data["generators"].items()
+                ),
+                "tier": data["battery_tier"]
+            })
+            next_day += MINUTES_PER_DAY
+    return curve
+
+def run_batch(batch: List[Tuple[int, Dict[str, Any]]], minutes: int, samples: int, base_seed: int,
+              game_config: Dict[str, Any]) -> List[Tuple[int, List[List[Dict[str, float]]]]]:
+    """Worker entry point: simulate every sample of a batch of strategies.
+
+    Sample k of every strategy starts on game day `base_seed + k`, so all
+    strategies face the same weather and differ only by their own choices.
+    """
+    # Keep every weather day this batch touches in memory
+    days = minutes // MINUTES_PER_DAY + samples + 2
+    game_config["production_model"].cache_days = max(game_config["production_model"].cache_days, days)
+    return [
+        (index, [run_strategy(strategy, minutes, base_seed + index * samples + sample, base_seed + sample, game_config)
+                 for sample in range(samples)])
+        for index, strategy in batch
+    ]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def summarize(curves: List[List[Dict[str, float]]]) -> Dict[str, List[float]]:
+    """Aggregate the sample curves of one strategy per day"""
+    summary = {"worth_mean": [], "worth_p10": [], "worth_p90": [], "rate_mean": [], "tier_mean": []}
+    for day in range(len(curves[0])):
+        worth = sorted(curve[day]["worth"] for curve in curves)
+        summary["worth_mean"].append(statistics.fmean(worth))
+        summary["worth_p10"].append(percentile(worth, 0.10))
+        summary["worth_p90"].append(percentile(worth, 0.90))
+        summary["rate_mean"].append(statistics.fmean(curve[day]["rate"] for curve in curves))
+        summary["tier_mean"].append(statistics.fmean(curve[day]["tier"] for curve in curves))
+    return summary
+
+def default_buy_orders(game_config: Dict[str, Any]) -> List[Tuple[str, ...]]:
+    """Each generator type alone, plus cheapest-first and best-value-first across the catalog"""
+    generator_types = game_config["generator_types"]
+    prices = game_config["generator_prices"]
+    rates = game_config["generation_rates"]
+    orders = [(generator_type,) for generator_type in generator_types]
+    orders.append(tuple(sorted(generator_types, key=lambda generator_type: prices[generator_type])))
+    orders.append(tuple(sorted(generator_types, key=lambda generator_type: -rates[generator_type] / max(prices[generator_type], 1))))
+    return list(dict.fromkeys(orders))
+
+def build_strategies(args, game_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of the swept strategy parameters"""
+    if args.buy_orders:
+        buy_orders = [tuple(order.split(",")) for order in args.buy_orders]
+        unknown = {t for order in buy_orders for t in order} - set(game_config["generator_types"])
+        if unknown:
+            raise ValueError(f"unknown generator types in --buy-orders: {', '.join(sorted(unknown))}")
+    else:
+        buy_orders = default_buy_orders(game_config)
+    return [
+        {
+            "buy_order": list(buy_order),
+            "sell_threshold": sell_threshold,
+            "upgrade_margin": upgrade_margin,
+            "reserve": reserve,
+            "check_interval": check_interval
+        }
+        for buy_order, sell_threshold, upgrade_margin, reserve, check_interval in itertools.product(
+            buy_orders, args.sell_thresholds, args.upgrade_margins, args.reserves, args.check_intervals
+        )
+    ]
+
+def main():
+    """Parse arguments, fan the strategies out over a process pool and report"""
+    parser = argparse.ArgumentParser(description="Simulate player strategies against the current balance tables")
+    parser.add_argument("--weeks", type=float, default=4, help="Game time to simulate per run")
+    parser.add_argument("--samples", type=int, default=20, help="Monte-Carlo runs per strategy")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--buy-orders", nargs="*", help="Comma separated generator priorities, e.g. wind_turbine,solar_panel")
+    parser.add_argument("--sell-thresholds", nargs="*", type=float, default=[0.0, 0.5, 0.9],
+                        help="Battery fill fraction at which the player sells everything")
+    parser.add_argument("--upgrade-margins", nargs="*", type=float, default=[1.0, 1.5, 3.0],
+                        help="Upgrade the battery once money covers price times this margin")
+    parser.add_argument("--reserves", nargs="*", type=float, default=[0, 500],
+                        help="Dollars kept back when buying generators")
+    parser.add_argument("--check-intervals", nargs="*", type=float, default=[15, 60, 240],
+                        help="Mean minutes between player check-ins")
+    parser.add_argument("--balance", default=config.BALANCE_FILE, help="Balance file to simulate")
+    parser.add_argument("--top", type=int, default=10, help="Number of best strategies to print")
+    parser.add_argument("--output", help="Write the aggregate curves as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    game_config = config.game_config(args.balance)
+    try:
+        strategies = build_strategies(args, game_config)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    minutes = int(args.weeks * 7 * MINUTES_PER_DAY)
+    if minutes < MINUTES_PER_DAY:
+        logger.error("Simulate at least one day of game time")
+        return 1
+
+    # A few batches per worker keeps them all busy without much pickling overhead
+    workers = max(1, args.workers or 1)
+    batch_size = max(1, len(strategies) // (workers * 4))
+    indexed = list(enumerate(strategies))
+    batches = [indexed[i:i + batch_size] for i in range(0, len(indexed), batch_size)]
+
+    logger.info("Simulating %d strategies x %d samples over %d days on %d workers",
+                len(strategies), args.samples, minutes // MINUTES_PER_DAY, workers)
+    started = time.perf_counter()
+    results: Dict[int, Dict[str, List[float]]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_batch, batch, minutes, args.samples, args.seed, game_config) for batch in batches]
+        for future in futures:
+            for index, curves in future.result():
+                results[index] = summarize(curves)
+    elapsed = time.perf_counter() - started
+    runs = len(strategies) * args.samples
+    logger.info("Finished %d runs in %.1fs (%.0f runs/s)", runs, elapsed, runs / elapsed)
+
+    ranking = sorted(results, key=lambda index: results[index]["worth_mean"][-1], reverse=True)
+    print(f"{'final worth':>14}{'p10':>14}{'p90':>14}{'rate/min':>10}{'tier':>6}  strategy")
+    for index in ranking[:args.top]:
+        summary = results[index]
+        strategy = strategies[index]
+        print(f"{summary['worth_mean'][-1]:>14,.0f}{summary['worth_p10'][-1]:>14,.0f}"
+              f"{summary['worth_p90'][-1]:>14,.0f}{summary['rate_mean'][-1]:>10,.0f}"
+              f"{summary['tier_mean'][-1]:>6.1f}  {json.dumps(strategy)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([{"strategy": strategies[index], "curves": results[index]} for index in ranking], f, indent=2)
+        logger.info("Wrote curves for %d strategies to %s", len(ranking), args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Startup Timing
+Measures the phases of a cold start so it can be tracked and driven down:
+
+    import  loading the bot's modules (discord.py, numpy, the game code)
+    load    reading user state from storage
+    cogs    loading the command cogs (runs alongside load)
+    login   logging in to Discord over HTTP
+    ready   connecting to the gateway until READY
+    sync    syncing application commands with Discord
+
+The report is logged once, at the first on_ready.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+PHASES = ("import", "load", "cogs", "login", "ready", "sync")
+
+class StartupTimer:
+    """Durations of the startup phases, in seconds"""
+
+    def __init__(self, started: Optional[float] = None):
+        # perf_counter() when the process started its imports; defaults to now
+        self.started = time.perf_counter() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self._begun: Dict[str, float] = {}
+        self.reported = False
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = seconds
+
+    def begin(self, phase: str):
+        """Start timing a phase that ends in another callback"""
+        self._begun[phase] = time.perf_counter()
+
+    def end(self, phase: str):
+        """Finish a phase started with begin; ignored if it never began"""
+        began = self._begun.pop(phase, None)
+        if began is not None:
+            self.record(phase, time.perf_counter() - began)
+
+    async def measure(self, phase: str, awaitable):
+        """Await something and record how long it took"""
+        began = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(phase, time.perf_counter() - began)
+
+    def report(self):
+        """Log the breakdown once; phases that did not run are left out"""
+        if self.reported:
+            return
+        self.reported = True
+        total = time.perf_counter() - self.started
+        phases = {phase: round(self.phases[phase] * 1000, 1) for phase in PHASES if phase in self.phases}
+        breakdown = ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in phases.items())
+        logger.info("Ready %.2fs after start: %s", total, breakdown,
+                    extra={"event": "startup", "latency_ms": round(total * 1000, 1), "phases": phases})
@@ -0,0 +1,27 @@
+"""
+Storage Backends
+Persistence of user records behind one async interface (storage.base.UserStore):
+
+    json    the whole table in one JSON file (default, single process)
+    sqlite  one row per user in an SQLite file, shareable by processes on one host
+    redis   one hash per user in a Redis-protocol server shared by every instance
+
+The backend is picked with the STORAGE_BACKEND and STORAGE_URL settings in
+config.py.
+"""
+from storage.base import Deltas, Record, StorageError, UserStore
+from storage.json_store import JsonStore
+from storage.redis_store import RedisStore
+from storage.sqlite_store import SqliteStore
+
+BACKENDS = ("json", "sqlite", "redis")
+
+def open_storage(backend: str, url: str, users_file_path: str, default_file_path: str = None) -> UserStore:
+    """Create the configured backend; the JSON backend uses the bot's file paths"""
+    if backend == "json":
+        return JsonStore(users_file_path, default_file_path)
+    if backend == "sqlite":
+        return SqliteStore(url)
+    if backend == "redis":
+        return RedisStore(url)
+    raise ValueError(f"unknown storage backend '{backend}', expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,103 @@
+"""
+Storage Base
+Interface shared by the user record backends.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+# A user record as produced by rules.new_user
+Record = Dict[str, Any]
+
+# Per-user changes to numeric fields, as applied by the tick
+Deltas = Dict[str, Dict[str, int]]
+
+class StorageError(Exception):
+    """Raised when a backend cannot read or write user records"""
+
+class UserStore:
+    """Async persistence of user records keyed by user id.
+
+    The bot keeps the records it has read in `bot.user_data`, which acts as
+    the local read-through cache. Backends that other processes can write
+    (`shared = True`) track which cached records have since changed
+    elsewhere; `poll` collects those invalidations and `take_stale` hands
+    them over to be re-read.
+
+    Shared backends also keep a version per record, bumped by every write.
+    `version` is the version of the copy last read or written here, and
+    `put_if_version` writes only if nobody has written the record since, so
+    concurrent read-modify-write cycles on different instances cannot lose
+    each other's updates. The tick never overwrites records in a shared
+    backend; it sends `apply_deltas` increments instead, conditional on the
+    version it read, and `confirm`s the cached copies it can prove still match.
+    """
+
+    # True when other processes may write the same records
+    shared = False
+
+    def __init__(self):
+        self._stale: Set[str] = set()
+        self._versions: Dict[str, int] = {}
+
+    async def load_all(self, owns: Optional[Callable[[str], bool]] = None) -> Dict[str, Record]:
+        """Every stored record, limited to the user ids accepted by `owns`"""
+        raise NotImplementedError
+
+    async def get(self, user_id: str) -> Optional[Record]:
+        """One record read from the backend, or None if the user is unknown"""
+        return (await self.get_many([user_id]))[user_id]
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Record]]:
+        """Several records read from the backend in one round trip"""
+        raise NotImplementedError
+
+    async def put_many(self, records: Dict[str, Record]):
+        """Insert or replace several records in one batch"""
+        raise NotImplementedError
+
+    def version(self, user_id: str) -> int:
+        """Version of the copy of a record last read or written here (0 before any write)"""
+        return self._versions.get(user_id, 0)
+
+    def confirm(self, user_id: str, version: int):
+        """Record that the cached copy of a record is the stored one at `version`"""
+        self._versions[user_id] = version
+        self._stale.discard(user_id)
+
+    async def put_if_version(self, user_id: str, record: Record, version: Optional[int]) -> bool:
+        """Write a record only if its stored version is still `version` (None: only
+        if the user does not exist yet); False when someone else got there first.
+        Shared backends only."""
+        raise NotImplementedError
+
+    async def apply_deltas(self, deltas: Deltas, expected: Dict[str, int]) -> Dict[str, Optional[int]]:
+        """Add numeric deltas to stored fields without replacing the records, but
+        only where the stored version is still `expected`; returns the version
+        each record reached, or None where it had moved on and nothing was added.
+        Shared backends only."""
+        raise NotImplementedError
+
+    async def poll(self):
+        """Collect invalidations written by other processes since the last poll"""
+
+    def is_stale(self, user_id: str) -> bool:
+        """True when the cached copy of a record is known to be out of date"""
+        return user_id in self._stale
+
+    def invalidate(self, user_ids: Iterable[str]):
+        """Mark cached records as out of date"""
+        self._stale.update(user_ids)
+
+    def forget(self, user_ids: Iterable[str]):
+        """Mark cached records as ahead of storage: out of date, and at a version
+        no stored record has, so put_if_version and apply_deltas on them fail"""
+        for user_id in user_ids:
+            self._versions[user_id] = -1
+        self.invalidate(user_ids)
+
+    def take_stale(self) -> Set[str]:
+        """Return and forget every invalidated user id"""
+        stale, self._stale = self._stale, set()
+        return stale
+
+    async def close(self):
+        """Release connections and files"""
@@ -0,0 +1,89 @@
+"""
+JSON Storage
+The original single-file backend: the whole user table in one JSON file,
+rewritten on every save. Only one process may use a file at a time.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterable, Optional
+
+from storage.base import Record, StorageError, UserStore
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+class JsonStore(UserStore):
+    """User table kept in memory and written to a JSON file"""
+
+    def __init__(self, path: str, default_path: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self.default_path = default_path
+        self._table: Dict[str, Record] = {}
+
+    async def load_all(self, owns: Optional[Callable[[str], bool]] = None) -> Dict[str, Record]:
+        # Reading and parsing a large file would stall the event loop
+        return await asyncio.to_thread(self._load, owns)
+
+    def _load(self, owns: Optional[Callable[[str], bool]]) -> Dict[str, Record]:
+        try:
+            # Try to load existing user data
+            with open(self.path, "r") as f:
+                self._table = json.load(f)
+            logger.info("Loaded data for %d users", len(self._table))
+        except FileNotFoundError:
+            # If the main file is not found, try to use the default file
+            logger.warning("User data file %s not found", self.path)
+            try:
+                if self.default_path is None:
+                    raise FileNotFoundError(self.path)
+                with open(self.default_path, "r") as f:
+                    self._table = json.load(f)
+                logger.info("Loaded default data template")
+            except (FileNotFoundError, json.JSONDecodeError):
+                # If no default file or it's invalid, start with empty data
+                logger.warning("No default user data found. Starting with empty data.")
+                self._table = {}
+
+            # Keep only the requested records (splits users.json between partitions)
+            if owns is not None:
+                self._table = {user_id: data for user_id, data in self._table.items() if owns(user_id)}
+
+            # Create the users.json file
+            try:
+                self._write()
+            except OSError as e:
+                # The first save tries again
+                logger.error("Failed to create %s: %s", self.path, e)
+        except json.JSONDecodeError as e:
+            # Starting empty would overwrite every farm at the first save
+            raise StorageError(
+                f"{self.path} is not valid JSON ({e}); recover the readable records with "
+                f"`python userdata.py convert {self.path} <new file>` and put that in its place"
+            ) from e
+
+        if owns is not None:
+            self._table = {user_id: data for user_id, data in self._table.items() if owns(user_id)}
+        return dict(self._table)
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Record]]:
+        return {user_id: self._table.get(user_id) for user_id in user_ids}
+
+    async def put_many(self, records: Dict[str, Record]):
+        self._table.update(records)
+        self._write()
+
+    def _write(self):
+        """Write the table out; OSError reaches the caller, so a failed save
+        stays marked for the next one"""
+        # Make sure the directory exists
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        # Write a new file and swap it in, so a crash mid-write leaves the old one intact
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._table, f, indent=4)
+        os.replace(temp_path, self.path)
+        logger.debug("User data saved successfully")
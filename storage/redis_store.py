@@ -0,0 +1,293 @@
+"""
+Redis Storage
+User records in a Redis-protocol key-value store shared by every bot
+instance: one hash per user, a set indexing the user ids, and a pub/sub
+channel announcing which users each write batch touched so the other
+instances can invalidate their cached copies.
+
+Hash fields are the record's keys, with nested dicts flattened to dotted
+names (generators.solar_panel) and values JSON-encoded, so numbers stay
+readable to HINCRBY and tools like redis-cli.
+
+Each user also has a version counter key, INCRed by every write in the same
+MULTI block. It lives outside the hash so that replacing the hash never
+resets it; put_if_version and apply_deltas WATCH it.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from storage.base import Deltas, Record, StorageError, UserStore
+from storage.resp import RespConnection, RespError, parse_url
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+def encode_record(record: Record, prefix: str = "") -> Dict[str, str]:
+    """Flatten a record into hash fields"""
+    fields = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            fields.update(encode_record(value, f"{prefix}{key}."))
+        else:
+            fields[f"{prefix}{key}"] = json.dumps(value)
+    return fields
+
+def decode_record(fields: List[str]) -> Optional[Record]:
+    """Rebuild a record from a flat HGETALL reply; None for a missing hash"""
+    if not fields:
+        return None
+    record: Record = {}
+    for name, value in zip(fields[::2], fields[1::2]):
+        target = record
+        *parents, leaf = name.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = json.loads(value)
+    return record
+
+class RedisStore(UserStore):
+    """User records in a Redis-protocol server (see storage/resp_server.py for a local stand-in)"""
+
+    shared = True
+
+    # Users written per MULTI/EXEC block
+    batch_size = 1000
+    
+    # Idle connections kept for put_if_version; busier moments open more
+    pool_size = 8
+
+    def __init__(self, url: str, namespace: str = "sunshine"):
+        super().__init__()
+        self.host, self.port, self.database = parse_url(url)
+        self.connection = RespConnection(self.host, self.port, self.database)
+        self.namespace = namespace
+        self.key_prefix = f"{namespace}:user:"
+        self.version_prefix = f"{namespace}:version:"
+        self.index_key = f"{namespace}:users"
+        self.channel = f"{namespace}:invalidate"
+        # Our own announcements are ignored by our listener
+        self.instance = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._idle: List[RespConnection] = []
+
+    def _key(self, user_id: str) -> str:
+        return self.key_prefix + user_id
+
+    def _version_key(self, user_id: str) -> str:
+        return self.version_prefix + user_id
+
+    @contextlib.asynccontextmanager
+    async def _watch_connection(self) -> AsyncIterator[RespConnection]:
+        """A connection of our own for WATCH, whose state is per connection.
+        Never waits for another transaction to finish with one."""
+        connection = self._idle.pop() if self._idle else RespConnection(self.host, self.port, self.database)
+        try:
+            yield connection
+        except BaseException:
+            await connection.close()
+            raise
+        if len(self._idle) < self.pool_size:
+            self._idle.append(connection)
+        else:
+            await connection.close()
+
+    def _write_commands(self, user_id: str, record: Record) -> List[tuple]:
+        """Replace a user's hash (so fields dropped from the record disappear) and count the write"""
+        fields = encode_record(record)
+        return [
+            ("DEL", self._key(user_id)),
+            ("HSET", self._key(user_id), *[item for pair in fields.items() for item in pair]),
+            ("INCR", self._version_key(user_id))
+        ]
+
+    @staticmethod
+    def _exec_result(replies: List) -> List:
+        """Reply list of an EXEC, raising the first error in it"""
+        result = replies[-1]
+        if isinstance(result, RespError):
+            raise result
+        errors = [reply for reply in result or () if isinstance(reply, RespError)]
+        if errors:
+            raise errors[0]
+        return result
+
+    def _start_listener(self):
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        """Mark records written by other instances as stale, reconnecting with backoff"""
+        delay = 1
+        subscribed = False
+        while True:
+            subscriber = RespConnection(self.host, self.port, self.database)
+            try:
+                await subscriber.subscribe(self.channel)
+                delay = 1
+                # Announcements published while we were disconnected are lost
+                if subscribed:
+                    await self._resync()
+                subscribed = True
+                while True:
+                    message = await subscriber.next_message()
+                    if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+                        writer, _, user_ids = message[2].partition(" ")
+                        if writer != self.instance:
+                            self.invalidate(user_ids.split())
+            except (OSError, StorageError, asyncio.IncompleteReadError) as e:
+                logger.warning("Redis invalidation listener lost its connection, retrying in %ss: %s", delay, e)
+            finally:
+                await subscriber.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _resync(self):
+        """Mark stale every record whose stored version is not the one we last
+        saw, including users added since, so the next refresh reads them"""
+        user_ids = await self.connection.execute("SMEMBERS", self.index_key)
+        changed = []
+        for start in range(0, len(user_ids), self.batch_size):
+            chunk = user_ids[start:start + self.batch_size]
+            versions = await self.connection.pipeline([("GET", self._version_key(user_id)) for user_id in chunk])
+            changed.extend(user_id for user_id, version in zip(chunk, versions)
+                           if int(version or 0) != self._versions.get(user_id))
+        self.invalidate(changed)
+        logger.info("Redis invalidation listener reconnected; %d users changed meanwhile", len(changed))
+
+    async def load_all(self, owns: Optional[Callable[[str], bool]] = None) -> Dict[str, Record]:
+        # Listen before reading, so no write after the read goes unnoticed
+        self._start_listener()
+        user_ids = [user_id for user_id in await self.connection.execute("SMEMBERS", self.index_key)
+                    if owns is None or owns(user_id)]
+        records = {user_id: record for user_id, record in (await self.get_many(user_ids)).items()
+                   if record is not None}
+        logger.info("Loaded data for %d users from redis://%s:%s/%s", len(records), self.host, self.port, self.database)
+        return records
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Record]]:
+        self._start_listener()
+        user_ids = list(user_ids)
+        records = {}
+        for start in range(0, len(user_ids), self.batch_size):
+            chunk = user_ids[start:start + self.batch_size]
+            # In one MULTI block, so no write lands between a hash and its version
+            commands: List[tuple] = [("MULTI",)]
+            for user_id in chunk:
+                commands.append(("HGETALL", self._key(user_id)))
+                commands.append(("GET", self._version_key(user_id)))
+            commands.append(("EXEC",))
+            result = self._exec_result(await self.connection.pipeline(commands))
+            for index, user_id in enumerate(chunk):
+                fields, version = result[2 * index], result[2 * index + 1]
+                records[user_id] = decode_record(fields)
+                self._versions[user_id] = int(version or 0)
+        return records
+
+    async def put_many(self, records: Dict[str, Record]):
+        self._start_listener()
+        # Encode everything before the first await, so the batch is a snapshot of this moment
+        encoded = [(user_id, self._write_commands(user_id, record)) for user_id, record in records.items()]
+        for start in range(0, len(encoded), self.batch_size):
+            chunk = encoded[start:start + self.batch_size]
+            commands: List[tuple] = [("MULTI",)]
+            for _, writes in chunk:
+                commands.extend(writes)
+            user_ids = [user_id for user_id, _ in chunk]
+            commands.append(("SADD", self.index_key, *user_ids))
+            commands.append(("PUBLISH", self.channel, " ".join([self.instance] + user_ids)))
+            commands.append(("EXEC",))
+
+            result = self._exec_result(await self.connection.pipeline(commands))
+            # The hashes now hold exactly what we wrote; the INCR replies are their versions
+            for index, user_id in enumerate(user_ids):
+                self._versions[user_id] = result[3 * index + 2]
+
+    async def put_if_version(self, user_id: str, record: Record, version: Optional[int]) -> bool:
+        self._start_listener()
+        writes = self._write_commands(user_id, record)
+        async with self._watch_connection() as connection:
+            replies = await connection.pipeline([
+                ("WATCH", self._version_key(user_id), self._key(user_id)),
+                ("GET", self._version_key(user_id)),
+                ("EXISTS", self._key(user_id))
+            ])
+            _, current, exists = replies
+            if version is None:
+                matches = not exists
+            else:
+                matches = bool(exists) and int(current or 0) == version
+            if not matches:
+                await connection.execute("UNWATCH")
+                return False
+            # EXEC returns nil if either key was written after the WATCH
+            replies = await connection.pipeline([
+                ("MULTI",),
+                *writes,
+                ("SADD", self.index_key, user_id),
+                ("PUBLISH", self.channel, f"{self.instance} {user_id}"),
+                ("EXEC",)
+            ])
+        result = self._exec_result(replies)
+        if result is None:
+            return False
+        self._versions[user_id] = result[2]
+        return True
+
+    async def apply_deltas(self, deltas: Deltas, expected: Dict[str, int]) -> Dict[str, Optional[int]]:
+        self._start_listener()
+        items = [(user_id, list(changes.items())) for user_id, changes in deltas.items()]
+        versions = {}
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            async with self._watch_connection() as connection:
+                while chunk:
+                    # Keep the users whose version is still the one the deltas were worked out from
+                    keys = [self._version_key(user_id) for user_id, _ in chunk]
+                    replies = await connection.pipeline([("WATCH", *keys), *(("GET", key) for key in keys)])
+                    current = []
+                    for (user_id, changes), stored in zip(chunk, replies[1:]):
+                        if int(stored or 0) == expected[user_id]:
+                            current.append((user_id, changes))
+                        else:
+                            versions[user_id] = None
+                    chunk = current
+                    if not chunk:
+                        await connection.execute("UNWATCH")
+                        break
+
+                    commands: List[tuple] = [("MULTI",)]
+                    # Where each user's INCR reply lands in the EXEC result (MULTI has none)
+                    positions = []
+                    for user_id, changes in chunk:
+                        for field, delta in changes:
+                            commands.append(("HINCRBY", self._key(user_id), field, delta))
+                        positions.append(len(commands) - 1)
+                        commands.append(("INCR", self._version_key(user_id)))
+                    commands.append(("PUBLISH", self.channel,
+                                     " ".join([self.instance] + [user_id for user_id, _ in chunk])))
+                    commands.append(("EXEC",))
+
+                    # EXEC returns nil if a watched version moved since the check; check again
+                    result = self._exec_result(await connection.pipeline(commands))
+                    if result is not None:
+                        for (user_id, _), position in zip(chunk, positions):
+                            versions[user_id] = result[position]
+                        break
+        return versions
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        for connection in self._idle:
+            await connection.close()
+        self._idle = []
+        await self.connection.close()
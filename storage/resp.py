@@ -0,0 +1,158 @@
+"""
+RESP Protocol
+A small asyncio client for the Redis serialization protocol (RESP2), enough
+for the Redis storage backend: single commands, pipelines and pub/sub. The
+encoder and reply reader are shared with the stand-in server in
+storage/resp_server.py.
+"""
+import asyncio
+from typing import Any, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from storage.base import StorageError
+
+class RespError(StorageError):
+    """Error reply sent by the server"""
+
+class SimpleString(str):
+    """Status reply such as OK or QUEUED"""
+
+def encode_command(*args) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, float):
+            data = repr(arg).encode()
+        else:
+            data = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+def encode_reply(value: Any) -> bytes:
+    """Encode a Python value as a RESP reply"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, SimpleString):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    data = value if isinstance(value, bytes) else str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one reply; error replies are returned as RespError instances"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return SimpleString(payload.decode())
+    if kind == b"-":
+        return RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise StorageError(f"malformed RESP reply: {line!r}")
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+    """Read one client command (array of bulk strings), or None at end of stream"""
+    try:
+        value = await read_reply(reader)
+    except ConnectionError:
+        return None
+    if not isinstance(value, list):
+        raise StorageError("expected a command array")
+    return value
+
+def parse_url(url: str) -> Tuple[str, int, int]:
+    """Host, port and database number of a redis://host:port/db URL"""
+    parsed = urlparse(url)
+    if parsed.scheme != "redis":
+        raise ValueError(f"unsupported storage URL '{url}', expected redis://host:port/db")
+    database = int(parsed.path.lstrip("/") or 0)
+    return parsed.hostname or "127.0.0.1", parsed.port or 6379, database
+
+class RespConnection:
+    """One connection running commands one request (or pipeline) at a time"""
+
+    def __init__(self, host: str, port: int, database: int = 0, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.database = database
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if self.database:
+            self._writer.write(encode_command("SELECT", self.database))
+            reply = await read_reply(self._reader)
+            if isinstance(reply, RespError):
+                raise reply
+
+    def _drop(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """Send several commands in one write and return their replies in order"""
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                self._writer.write(b"".join(encode_command(*command) for command in commands))
+                await self._writer.drain()
+                return [await asyncio.wait_for(read_reply(self._reader), self.timeout) for _ in commands]
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                # The reply stream is out of step now; reconnect on the next call
+                self._drop()
+                raise ConnectionError(f"Redis at {self.host}:{self.port} unavailable: "
+                                      f"{str(e) or type(e).__name__}") from e
+            except BaseException:
+                self._drop()
+                raise
+
+    async def execute(self, *args) -> Any:
+        """Run one command and return its reply, raising error replies"""
+        reply = (await self.pipeline([args]))[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def subscribe(self, channel: str):
+        """Switch this connection to pub/sub mode on one channel"""
+        if self._writer is None:
+            await self._connect()
+        self._writer.write(encode_command("SUBSCRIBE", channel))
+        await self._writer.drain()
+        await read_reply(self._reader)
+
+    async def next_message(self) -> Any:
+        """Wait for the next pub/sub push after subscribe"""
+        return await read_reply(self._reader)
+
+    async def close(self):
+        self._drop()
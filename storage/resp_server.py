@@ -0,0 +1,393 @@
+"""
+RESP Stand-in Server
+An in-process, in-memory server speaking the Redis protocol, covering the
+commands used by the Redis storage backend. It lets the redis backend run
+(and be exercised) locally without a Redis installation:
+
+    python -m storage.resp_server --port 6379
+
+Commands run to completion without awaiting, so each command and each
+MULTI/EXEC block is atomic, as in Redis. Key expiry (SET PX, PEXPIRE) and
+WATCH are supported for the tick lease in leader.py.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from storage.resp import RespError, SimpleString, encode_reply, read_command
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+OK = SimpleString("OK")
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+# Commands that modify the key in their first argument (DEL: every argument)
+WRITE_COMMANDS = {"DEL", "SET", "INCR", "HSET", "HDEL", "HINCRBY", "HINCRBYFLOAT", "SADD", "SREM", "PEXPIRE"}
+
+class ClientState:
+    """Per-connection state"""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.database = 0
+        self.queue: Optional[List[List[str]]] = None
+        self.queue_failed = False
+        self.channels: Set[str] = set()
+        # (database, key) -> version seen by WATCH
+        self.watched: Dict[Tuple[int, str], int] = {}
+        self.task: Optional[asyncio.Task] = asyncio.current_task()
+
+class RespServer:
+    """Minimal Redis-compatible server keeping everything in memory"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.databases: Dict[int, Dict[str, Any]] = {}
+        self.subscribers: Dict[str, Set[ClientState]] = {}
+        # (database, key) -> write counter for WATCH, and -> monotonic deadline
+        self.versions: Dict[Tuple[int, str], int] = {}
+        self.expiry: Dict[Tuple[int, str], float] = {}
+        self._server = None
+        self._clients: Set[ClientState] = set()
+        self.commands: Dict[str, Callable] = {
+            "PING": self._ping,
+            "ECHO": lambda state, message: message,
+            "SELECT": self._select,
+            "FLUSHDB": self._flushdb,
+            "DEL": self._del,
+            "EXISTS": self._exists,
+            "GET": self._get,
+            "SET": self._set,
+            "INCR": self._incr,
+            "PEXPIRE": self._pexpire,
+            "PTTL": self._pttl,
+            "HSET": self._hset,
+            "HGET": self._hget,
+            "HGETALL": self._hgetall,
+            "HDEL": self._hdel,
+            "HINCRBY": self._hincrby,
+            "HINCRBYFLOAT": self._hincrbyfloat,
+            "SADD": self._sadd,
+            "SREM": self._srem,
+            "SMEMBERS": self._smembers,
+            "SCARD": self._scard,
+            "PUBLISH": self._publish,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self):
+        """Start listening; with port 0 a free port is picked and stored in `port`"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("RESP stand-in server listening on %s:%s", self.host, self.port)
+
+    async def close(self):
+        """Stop listening and disconnect every client"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Closing the connections ends their handlers at the next read
+        clients = list(self._clients)
+        for state in clients:
+            state.writer.close()
+        await asyncio.gather(*(state.task for state in clients if state.task is not None), return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        state = ClientState(writer)
+        self._clients.add(state)
+        try:
+            while True:
+                try:
+                    command = await read_command(reader)
+                except RespError as e:
+                    writer.write(encode_reply(RespError(f"ERR Protocol error: {str(e)}")))
+                    break
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name = command[0].upper()
+                if name == "QUIT":
+                    writer.write(encode_reply(OK))
+                    break
+                writer.write(encode_reply(self._dispatch(state, name, command[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(state)
+            for channel in state.channels:
+                self.subscribers.get(channel, set()).discard(state)
+            writer.close()
+
+    def _dispatch(self, state: ClientState, name: str, args: List[str]) -> Any:
+        if name == "MULTI":
+            if state.queue is not None:
+                return RespError("ERR MULTI calls can not be nested")
+            state.queue, state.queue_failed = [], False
+            return OK
+        if name == "EXEC":
+            if state.queue is None:
+                return RespError("ERR EXEC without MULTI")
+            queue, failed, watched = state.queue, state.queue_failed, state.watched
+            state.queue, state.watched = None, {}
+            if failed:
+                return RespError("EXECABORT Transaction discarded because of previous errors.")
+            # A watched key changed (or expired) since WATCH: abort with a nil reply
+            self._expire_keys()
+            if any(self.versions.get(ident, 0) != version for ident, version in watched.items()):
+                return None
+            return [self._execute(state, command[0].upper(), command[1:]) for command in queue]
+        if name == "DISCARD":
+            if state.queue is None:
+                return RespError("ERR DISCARD without MULTI")
+            state.queue, state.watched = None, {}
+            return OK
+        if name == "WATCH":
+            if state.queue is not None:
+                return RespError("ERR WATCH inside MULTI is not allowed")
+            self._expire_keys()
+            for key in args:
+                ident = (state.database, key)
+                state.watched[ident] = self.versions.get(ident, 0)
+            return OK
+        if name == "UNWATCH":
+            state.watched = {}
+            return OK
+        if name == "SUBSCRIBE":
+            replies = []
+            for channel in args:
+                state.channels.add(channel)
+                self.subscribers.setdefault(channel, set()).add(state)
+                replies.append(["subscribe", channel, len(state.channels)])
+            # Every channel gets its own confirmation; send all but the last here
+            for reply in replies[:-1]:
+                state.writer.write(encode_reply(reply))
+            return replies[-1] if replies else RespError("ERR wrong number of arguments for 'subscribe' command")
+        if state.queue is not None:
+            if name not in self.commands:
+                state.queue_failed = True
+                return RespError(f"ERR unknown command '{name}'")
+            state.queue.append([name] + args)
+            return SimpleString("QUEUED")
+        return self._execute(state, name, args)
+
+    def _execute(self, state: ClientState, name: str, args: List[str]) -> Any:
+        handler = self.commands.get(name)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        self._expire_keys()
+        if name in WRITE_COMMANDS:
+            for key in (args if name == "DEL" else args[:1]):
+                self._touch(state.database, key)
+        try:
+            return handler(state, *args)
+        except RespError as e:
+            return e
+        except TypeError:
+            return RespError(f"ERR wrong number of arguments for '{name.lower()}' command")
+        except ValueError as e:
+            return RespError(f"ERR {str(e)}")
+
+    def _touch(self, database: int, key: str):
+        ident = (database, key)
+        self.versions[ident] = self.versions.get(ident, 0) + 1
+
+    def _expire_keys(self):
+        """Drop keys whose deadline has passed"""
+        now = time.monotonic()
+        for ident, deadline in list(self.expiry.items()):
+            if deadline <= now:
+                del self.expiry[ident]
+                self.databases.get(ident[0], {}).pop(ident[1], None)
+                self._touch(*ident)
+
+    def _db(self, state: ClientState) -> Dict[str, Any]:
+        return self.databases.setdefault(state.database, {})
+
+    def _typed(self, state: ClientState, key: str, kind: type, create: bool = False):
+        db = self._db(state)
+        value = db.get(key)
+        if value is None:
+            if not create:
+                return None
+            value = db[key] = kind()
+        if not isinstance(value, kind):
+            raise RespError(WRONGTYPE)
+        return value
+
+    def _ping(self, state: ClientState, message: Optional[str] = None):
+        return SimpleString("PONG") if message is None else message
+
+    def _select(self, state: ClientState, database: str):
+        state.database = int(database)
+        return OK
+
+    def _flushdb(self, state: ClientState):
+        db = self._db(state)
+        for key in db:
+            self._touch(state.database, key)
+            self.expiry.pop((state.database, key), None)
+        db.clear()
+        return OK
+
+    def _del(self, state: ClientState, *keys: str):
+        db = self._db(state)
+        for key in keys:
+            self.expiry.pop((state.database, key), None)
+        return sum(1 for key in keys if db.pop(key, None) is not None)
+
+    def _exists(self, state: ClientState, *keys: str):
+        db = self._db(state)
+        return sum(1 for key in keys if key in db)
+
+    def _get(self, state: ClientState, key: str):
+        return self._typed(state, key, str)
+
+    def _set(self, state: ClientState, key: str, value: str, *options: str):
+        db = self._db(state)
+        flags = set()
+        ttl_ms = None
+        options = [option.upper() for option in options]
+        index = 0
+        while index < len(options):
+            option = options[index]
+            if option in ("PX", "EX"):
+                ttl_ms = int(options[index + 1]) * (1 if option == "PX" else 1000)
+                if ttl_ms <= 0:
+                    raise ValueError("invalid expire time in 'set' command")
+                index += 2
+            elif option in ("NX", "XX"):
+                flags.add(option)
+                index += 1
+            else:
+                raise ValueError("syntax error")
+        if "NX" in flags and key in db:
+            return None
+        if "XX" in flags and key not in db:
+            return None
+        db[key] = value
+        if ttl_ms is None:
+            self.expiry.pop((state.database, key), None)
+        else:
+            self.expiry[(state.database, key)] = time.monotonic() + ttl_ms / 1000
+        return OK
+
+    def _incr(self, state: ClientState, key: str):
+        db = self._db(state)
+        try:
+            value = int(self._typed(state, key, str) or "0") + 1
+        except ValueError:
+            raise ValueError("value is not an integer or out of range")
+        db[key] = str(value)
+        return value
+
+    def _pexpire(self, state: ClientState, key: str, ttl_ms: str):
+        if key not in self._db(state):
+            return 0
+        self.expiry[(state.database, key)] = time.monotonic() + int(ttl_ms) / 1000
+        return 1
+
+    def _pttl(self, state: ClientState, key: str):
+        if key not in self._db(state):
+            return -2
+        deadline = self.expiry.get((state.database, key))
+        if deadline is None:
+            return -1
+        return max(0, int((deadline - time.monotonic()) * 1000))
+
+    def _hset(self, state: ClientState, key: str, *pairs: str):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        table = self._typed(state, key, dict, create=True)
+        added = sum(1 for field in pairs[::2] if field not in table)
+        table.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def _hget(self, state: ClientState, key: str, field: str):
+        table = self._typed(state, key, dict)
+        return None if table is None else table.get(field)
+
+    def _hgetall(self, state: ClientState, key: str):
+        table = self._typed(state, key, dict) or {}
+        return [item for pair in table.items() for item in pair]
+
+    def _hdel(self, state: ClientState, key: str, *fields: str):
+        table = self._typed(state, key, dict)
+        if table is None:
+            return 0
+        removed = sum(1 for field in fields if table.pop(field, None) is not None)
+        if not table:
+            del self._db(state)[key]
+        return removed
+
+    def _hincrby(self, state: ClientState, key: str, field: str, amount: str):
+        table = self._typed(state, key, dict, create=True)
+        table[field] = str(int(table.get(field, "0")) + int(amount))
+        return int(table[field])
+
+    def _hincrbyfloat(self, state: ClientState, key: str, field: str, amount: str):
+        table = self._typed(state, key, dict, create=True)
+        table[field] = repr(float(table.get(field, "0")) + float(amount))
+        return table[field]
+
+    def _sadd(self, state: ClientState, key: str, *members: str):
+        members_set = self._typed(state, key, set, create=True)
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return added
+
+    def _srem(self, state: ClientState, key: str, *members: str):
+        members_set = self._typed(state, key, set)
+        if members_set is None:
+            return 0
+        removed = len(members_set & set(members))
+        members_set.difference_update(members)
+        return removed
+
+    def _smembers(self, state: ClientState, key: str):
+        return sorted(self._typed(state, key, set) or ())
+
+    def _scard(self, state: ClientState, key: str):
+        return len(self._typed(state, key, set) or ())
+
+    def _publish(self, state: ClientState, channel: str, message: str):
+        receivers = self.subscribers.get(channel, set())
+        push = encode_reply(["message", channel, message])
+        for receiver in receivers:
+            receiver.writer.write(push)
+        return len(receivers)
+
+async def serve(host: str, port: int):
+    """Run a stand-in server until interrupted"""
+    server = RespServer(host, port)
+    await server.start()
+    print(f"RESP stand-in server on {server.url} (in memory, Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+def main():
+    """Parse arguments and run the server"""
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in for local development")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=6379, help="Port to listen on")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+SQLite Storage
+One row per user with the record stored as JSON. Several bot processes on
+the same host can share the database file: every batch stamps its rows with
+a new revision, and a process polls for rows stamped by other writers to
+invalidate its cached copies. Each row also counts its own writes in
+`version`, checked by put_if_version.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from storage.base import Deltas, Record, StorageError, UserStore
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    writer TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_revision ON users (revision);
+"""
+
+class SqliteStore(UserStore):
+    """User records in an SQLite database file"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.writer = uuid.uuid4().hex
+        # sqlite3 connections belong to one thread; a single worker keeps
+        # every query on it and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._revision = 0
+        self._data_version = None
+
+    async def _run(self, function, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        except sqlite3.Error as e:
+            raise StorageError(f"SQLite error on {self.path}: {str(e)}") from e
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            # Databases created before record versions get the column added
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(users)")]
+            if "version" not in columns:
+                connection.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._connection = connection
+        return self._connection
+
+    def _load_all(self, owns: Optional[Callable[[str], bool]]) -> tuple:
+        connection = self._connect()
+        rows = connection.execute("SELECT user_id, data, revision, version FROM users").fetchall()
+        self._revision = max((row[2] for row in rows), default=0)
+        self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        # Decode here too, off the event loop
+        records, versions = {}, {}
+        for user_id, data, _, version in rows:
+            if owns is None or owns(user_id):
+                records[user_id] = json.loads(data)
+                versions[user_id] = version
+        return records, versions
+
+    async def load_all(self, owns: Optional[Callable[[str], bool]] = None) -> Dict[str, Record]:
+        records, versions = await self._run(self._load_all, owns)
+        self._versions.update(versions)
+        logger.info("Loaded data for %d users from %s", len(records), self.path)
+        return records
+
+    def _get_many(self, user_ids: List[str]) -> tuple:
+        connection = self._connect()
+        records = dict.fromkeys(user_ids)
+        versions = {}
+        # Stay below SQLite's bound parameter limit
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for user_id, data, version in connection.execute(
+                f"SELECT user_id, data, version FROM users WHERE user_id IN ({placeholders})", chunk
+            ):
+                records[user_id] = json.loads(data)
+                versions[user_id] = version
+        return records, versions
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Record]]:
+        # Versions are recorded on the event loop, together with the records they describe
+        records, versions = await self._run(self._get_many, list(user_ids))
+        self._versions.update(versions)
+        return records
+
+    def _changed_elsewhere(self, connection: sqlite3.Connection) -> List[str]:
+        rows = connection.execute(
+            "SELECT user_id, revision FROM users WHERE revision > ? AND writer != ?",
+            (self._revision, self.writer)
+        ).fetchall()
+        self._revision = max([self._revision] + [row[1] for row in rows])
+        return [row[0] for row in rows]
+
+    def _write(self, connection: sqlite3.Connection, write) -> tuple:
+        """Run `write(connection, revision)` in a write transaction; returns its
+        result and the users other writers changed since our last look"""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Holding the write lock, pick up other writers' rows before stamping ours
+            changed = self._changed_elsewhere(connection)
+            revision = connection.execute("SELECT COALESCE(MAX(revision), 0) + 1 FROM users").fetchone()[0]
+            result = write(connection, revision)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._revision = revision
+        return result, changed
+
+    def _upsert(self, connection: sqlite3.Connection, rows: List[tuple], revision: int):
+        connection.executemany(
+            "INSERT INTO users (user_id, data, revision, writer, version) VALUES (?, ?, ?, ?, 1) "
+            "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, revision = excluded.revision, "
+            "writer = excluded.writer, version = users.version + 1",
+            [(user_id, data, revision, self.writer) for user_id, data in rows]
+        )
+
+    def _put_many(self, rows: List[tuple]) -> tuple:
+        def write(connection, revision):
+            self._upsert(connection, rows, revision)
+            # The rows now hold exactly what we wrote, so their versions are ours
+            versions = {}
+            for start in range(0, len(rows), 500):
+                chunk = [user_id for user_id, _ in rows[start:start + 500]]
+                placeholders = ",".join("?" * len(chunk))
+                versions.update(connection.execute(
+                    f"SELECT user_id, version FROM users WHERE user_id IN ({placeholders})", chunk
+                ))
+            return versions
+        return self._write(self._connect(), write)
+
+    async def put_many(self, records: Dict[str, Record]):
+        if not records:
+            return
+        # Serialize before handing off, so the batch is a snapshot of this moment
+        rows = [(user_id, json.dumps(record, separators=(",", ":"))) for user_id, record in records.items()]
+        versions, changed = await self._run(self._put_many, rows)
+        self._versions.update(versions)
+        self.invalidate(changed)
+
+    def _put_if_version(self, user_id: str, data: str, version: Optional[int]) -> tuple:
+        def write(connection, revision):
+            row = connection.execute("SELECT version FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if (row is None) != (version is None) or (row is not None and row[0] != version):
+                return False
+            self._upsert(connection, [(user_id, data)], revision)
+            return True
+        return self._write(self._connect(), write)
+
+    async def put_if_version(self, user_id: str, record: Record, version: Optional[int]) -> bool:
+        data = json.dumps(record, separators=(",", ":"))
+        written, changed = await self._run(self._put_if_version, user_id, data, version)
+        self.invalidate(changed)
+        if written:
+            self._versions[user_id] = (version or 0) + 1
+        return written
+
+    def _apply_deltas(self, deltas: Deltas, expected: Dict[str, int]) -> tuple:
+        def write(connection, revision):
+            versions = {}
+            for user_id, changes in deltas.items():
+                row = connection.execute("SELECT data, version FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                if row is None:
+                    # Unknown user, nothing to add to
+                    continue
+                if row[1] != expected[user_id]:
+                    # The deltas were worked out from an older record
+                    versions[user_id] = None
+                    continue
+                record = json.loads(row[0])
+                for field, delta in changes.items():
+                    record[field] = record.get(field, 0) + delta
+                connection.execute(
+                    "UPDATE users SET data = ?, revision = ?, writer = ?, version = version + 1 WHERE user_id = ?",
+                    (json.dumps(record, separators=(",", ":")), revision, self.writer, user_id)
+                )
+                versions[user_id] = connection.execute(
+                    "SELECT version FROM users WHERE user_id = ?", (user_id,)
+                ).fetchone()[0]
+            return versions
+        return self._write(self._connect(), write)
+
+    async def apply_deltas(self, deltas: Deltas, expected: Dict[str, int]) -> Dict[str, Optional[int]]:
+        if not deltas:
+            return {}
+        # Copy before handing off, so the batch is a snapshot of this moment
+        deltas = {user_id: dict(changes) for user_id, changes in deltas.items()}
+        versions, changed = await self._run(self._apply_deltas, deltas, dict(expected))
+        self.invalidate(changed)
+        return versions
+
+    def _poll(self) -> List[str]:
+        connection = self._connect()
+        # data_version only moves when another connection commits
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+        return self._changed_elsewhere(connection)
+
+    async def poll(self):
+        self.invalidate(await self._run(self._poll))
+
+    async def close(self):
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,208 @@
+"""
+Sunshine Solar Sim - Concurrency Stress Test
+Hammers a few farms with concurrent sells (including /sell all racing the
+tick's auto-sell), generator purchases, battery upgrades and auto-sell
+changes from several bot instances sharing one storage backend while the
+energy tick and maintenance run, then checks that no money or energy went
+missing: every stored farm must end where its starting balances plus the
+committed transactions and tick deltas put it, with money and energy never
+negative and energy within the battery's capacity.
+
+Usage:
+    python stress.py --backend sqlite --instances 3 --users 10 --commands 5000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import rules
+from bot import SunshineSolarBot
+from storage import open_storage
+from storage.resp_server import RespServer
+
+# Balances tracked by the ledger; all integers, so they must match exactly
+FIELDS = ("money", "energy", "energy_fraction")
+
+class StressBot(SunshineSolarBot):
+    """Bot on an explicit storage backend that never logs in"""
+
+    def __init__(self, backend: str, url: str, data_dir: str):
+        super().__init__()
+        self.storage_backend = backend
+        self.storage_url = url
+        self.users_file_path = str(Path(data_dir) / "users.json")
+        self.default_file_path = str(Path(data_dir) / "default_users.json")
+
+def starting_farm(index: int) -> Dict[str, Any]:
+    """A farm rich enough to keep buying, with generators producing in any weather"""
+    data = rules.new_user(f"stress{index}")
+    data["money"] = 10_000_000
+    data["generators"].update({"solar_panel": 20, "wind_turbine": 20, "gas_generator": 5})
+    return data
+
+def tracked(operation):
+    """Wrap a transaction body so it reports the balances it changed"""
+    def mutate(data):
+        if data is None:
+            raise rules.RuleError("no farm")
+        before = {field: data[field] for field in FIELDS}
+        operation(data)
+        return {field: data[field] - before[field] for field in FIELDS}
+    return mutate
+
+async def stress(backend: str, instances: int, users: int, commands: int, ticks: int, seed: int) -> bool:
+    """Run the workload and compare the stored farms with the ledger"""
+    rng = random.Random(seed)
+    server = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        if backend == "redis":
+            server = RespServer()
+            await server.start()
+            url = server.url
+        else:
+            url = str(Path(data_dir) / "users.db")
+
+        bots: List[StressBot] = [StressBot(backend, url, data_dir) for _ in range(instances)]
+        user_ids = [str(1000 + index) for index in range(users)]
+        await bots[0].load_data()
+        ledger: Dict[str, Dict[str, int]] = {}
+        for index, user_id in enumerate(user_ids):
+            data = starting_farm(index)
+            await bots[0].create_farm(user_id, data)
+            ledger[user_id] = {field: data[field] for field in FIELDS}
+        await bots[0].flush_data()
+        for bot in bots[1:]:
+            await bot.load_data()
+        game_config = bots[0].game_config
+
+        # Only the first instance ticks, as the lease holder would
+        ticker = bots[0]
+        def record_deltas(deltas: Dict[str, Dict[str, int]]):
+            for user_id, changes in deltas.items():
+                for field, delta in changes.items():
+                    ledger[user_id][field] += delta
+        if ticker.storage.shared:
+            # Only the increments storage accepted count; the rest are redone on fresh records
+            apply_deltas = ticker.storage.apply_deltas
+            async def apply_and_record(deltas, expected):
+                versions = await apply_deltas(deltas, expected)
+                record_deltas({user_id: deltas[user_id] for user_id, version in versions.items()
+                               if version is not None})
+                return versions
+            ticker.storage.apply_deltas = apply_and_record
+
+        async def run_tick(task: str):
+            if ticker.storage.shared:
+                await getattr(ticker, task)()
+                return
+            # Unshared storage ticks without yielding, so a snapshot diff is exact
+            before = {user_id: dict(ticker.user_data[user_id]) for user_id in user_ids}
+            await getattr(ticker, task)()
+            record_deltas({user_id: {field: ticker.user_data[user_id][field] - before[user_id][field]
+                                         for field in FIELDS} for user_id in user_ids})
+
+        # The checks the cogs make before applying each rule
+        def buy(data):
+            generator_type = rng.choice(game_config["generator_types"])
+            if data["money"] >= game_config["generator_prices"][generator_type]:
+                rules.buy_generators(data, generator_type, 1, game_config)
+
+        def upgrade(data):
+            tier = data["battery_tier"] + 1
+            if tier <= rules.max_battery_tier(game_config) and data["money"] >= game_config["battery_prices"][tier]:
+                rules.upgrade_battery(data, game_config)
+
+        operations = [
+            lambda data: rules.sell_energy(data, int(data["energy"] * rng.random()), game_config),
+            # /sell all, racing the tick's auto-sell for the same energy
+            lambda data: rules.sell_energy(data, data["energy"], game_config),
+            buy,
+            upgrade,
+            # The tick then sells for these farms too
+            lambda data: data.update(auto_sell={"mode": rng.choice(rules.AUTO_SELL_MODES),
+                                                "amount": rng.randint(0, 2000)}),
+        ]
+        stats = {"committed": 0, "busy": 0}
+
+        async def worker(count: int):
+            for _ in range(count):
+                bot, user_id = rng.choice(bots), rng.choice(user_ids)
+                try:
+                    changes, _ = await bot.update_farm(user_id, tracked(rng.choice(operations)))
+                except rules.RuleError:
+                    stats["busy"] += 1
+                    continue
+                for field, delta in changes.items():
+                    ledger[user_id][field] += delta
+                stats["committed"] += 1
+                await asyncio.sleep(0)
+
+        async def tick_loop():
+            for tick in range(ticks):
+                await run_tick("generate_energy")
+                if tick % 10 == 9:
+                    await run_tick("apply_maintenance_costs")
+                await asyncio.sleep(0.001)
+
+        workers = 50
+        began = time.perf_counter()
+        await asyncio.gather(tick_loop(), *(worker(commands // workers) for _ in range(workers)))
+        elapsed = time.perf_counter() - began
+
+        for bot in bots:
+            await bot.close()
+
+        # Read the final state back through a fresh backend instance
+        store = open_storage(backend, url, str(Path(data_dir) / "users.json"))
+        stored = await store.load_all()
+        await store.close()
+        if server is not None:
+            await server.close()
+
+    ok = True
+    capacities = game_config["battery_capacities"]
+    for user_id in user_ids:
+        data = stored[user_id]
+        # Every rule keeps these, whatever order the writes landed in
+        if data["money"] < 0 or not 0 <= data["energy"] <= capacities[data["battery_tier"]]:
+            print(f"user {user_id}: money {data['money']!r}, energy {data['energy']!r} "
+                  f"with capacity {capacities[data['battery_tier']]} breaks the rules")
+            ok = False
+        for field in FIELDS:
+            expected, actual = ledger[user_id][field], stored[user_id][field]
+            if expected != actual:
+                print(f"user {user_id}: {field} is {actual!r}, ledger says {expected!r}")
+                ok = False
+    print(f"{backend}: {instances} instances, {users} farms, {stats['committed']} transactions committed, "
+          f"{stats['busy']} given up as busy, {ticks} ticks in {elapsed:.2f}s: {'ok' if ok else 'LOST UPDATES'}")
+    return ok
+
+def main():
+    """Parse arguments and run the stress test"""
+    parser = argparse.ArgumentParser(description="Check that concurrent commands and ticks lose no updates")
+    parser.add_argument("--backend", choices=("json", "sqlite", "redis"), default="sqlite",
+                        help="Storage backend (redis uses the in-process stand-in server)")
+    parser.add_argument("--instances", type=int, help="Bot instances sharing the storage (default 3, 1 for json)")
+    parser.add_argument("--users", type=int, default=10, help="Number of farms; fewer means more contention")
+    parser.add_argument("--commands", type=int, default=5000, help="Number of transactions")
+    parser.add_argument("--ticks", type=int, default=50, help="Number of energy ticks during the run")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+    if args.instances is None:
+        args.instances = 1 if args.backend == "json" else 3
+    if args.backend == "json" and args.instances != 1:
+        parser.error("the json backend supports a single instance")
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    ok = asyncio.run(stress(args.backend, args.instances, args.users, args.commands, args.ticks, args.seed))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,527 @@
+"""
+Sunshine Solar Sim - User Data Tool
+Streams the user table between storage formats offline, one record at a
+time, so tables of millions of users convert in constant memory:
+
+    json      the bot's users.json, {user_id: record, ...}
+    ndjson    one {"user_id": ..., "record": {...}} object per line
+    sqlite    the SQLite backend's database (usable as STORAGE_URL)
+    snapshot  compact binary: zlib-compressed blocks of NDJSON lines, each
+              with a CRC32, ending in the record count
+
+Records from older versions are migrated on the way (rules.migrate_record)
+and every record is checked with rules.validate_record. Records that cannot
+be decoded or fail the checks are not written; they go to a quarantine
+NDJSON file with the reasons, so they can be fixed and imported again.
+A truncated or hand-broken users.json loses only the damaged records.
+
+Stop the bot before converting its live data. The output is written to a
+temporary file and only moved into place once complete.
+
+Usage:
+    python userdata.py convert data/users.json data/users.db
+    python userdata.py convert data/users.db backup.snap
+    python userdata.py check data/users.json
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+import config
+import rules
+from storage.sqlite_store import SCHEMA as SQLITE_SCHEMA
+
+logger = logging.getLogger("userdata")
+
+FORMATS = ("json", "ndjson", "sqlite", "snapshot")
+SUFFIXES = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".db": "sqlite",
+            ".sqlite": "sqlite", ".sqlite3": "sqlite", ".snap": "snapshot"}
+
+# Characters read from a JSON table at a time
+CHUNK_SIZE = 1 << 20
+# A JSON record this large that still does not parse is treated as damaged
+MAX_RECORD_SIZE = 16 << 20
+# Start of the next top-level entry in a table written by the bot (json.dump with indent=4)
+NEXT_ENTRY = re.compile(r',\n {4}"')
+WHITESPACE = re.compile(r"\s*")
+# Quarantined text of unreadable input is cut to this many characters
+RAW_LIMIT = 10_000
+
+# Records per SQLite transaction and per snapshot block
+BATCH_SIZE = 5000
+
+SNAPSHOT_MAGIC = b"SSSNAP"
+SNAPSHOT_VERSION = 1
+# Block header: records, uncompressed bytes, compressed bytes, CRC32 of the compressed bytes.
+# A block of zero records ends the snapshot and is followed by the total record count
+BLOCK_HEADER = struct.Struct("<IIII")
+SNAPSHOT_FOOTER = struct.Struct("<Q")
+
+class Unreadable(NamedTuple):
+    """Input that could not be decoded into a record"""
+    reason: str
+    raw: str
+
+def detect_format(path: str) -> str:
+    """Format implied by a file name (a trailing .gz is ignored)"""
+    name = path[:-3] if path.endswith(".gz") else path
+    fmt = SUFFIXES.get(os.path.splitext(name)[1].lower())
+    if fmt is None:
+        raise ValueError(f"cannot tell the format of {path}; name it with --from or --to ({', '.join(FORMATS)})")
+    return fmt
+
+def open_text(path: str, mode: str, compressed: Optional[bool] = None):
+    """Open a text file, gzip-compressed if the name ends in .gz (or `compressed` says so)"""
+    if compressed if compressed is not None else path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _line(user_id: str, record: Any) -> str:
+    return json.dumps({"user_id": user_id, "record": record}, separators=(",", ":"))
+
+def _parse_line(line: str) -> Tuple[Optional[str], Any]:
+    """(user id, record) of an NDJSON line, or an Unreadable in place of the record"""
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, Unreadable(f"invalid JSON: {e.msg}", line[:RAW_LIMIT])
+    if not isinstance(entry, dict) or not isinstance(entry.get("user_id"), str) or "record" not in entry:
+        return None, Unreadable("line is not a {user_id, record} object", line[:RAW_LIMIT])
+    return entry["user_id"], entry["record"]
+
+class JsonTableReader:
+    """Streams the entries of a JSON object {user_id: record} without loading it whole.
+
+    A damaged entry is reported as Unreadable and reading resumes at the
+    next entry, which can be found in tables laid out as the bot writes them.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        # Start of the entry being read, kept in the buffer so damage can be quarantined whole
+        self.mark: Optional[int] = None
+        self.eof = False
+
+    def _more(self) -> bool:
+        """Append a chunk to the unread part of the buffer; False at the end of the file"""
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        keep = self.pos if self.mark is None else min(self.pos, self.mark)
+        self.buffer = self.buffer[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark -= keep
+        return True
+
+    def _peek(self) -> str:
+        """Next character after any whitespace; empty at the end of the file"""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._more():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def _decode(self) -> Any:
+        """Decode the JSON value at the current position, reading on while it is incomplete"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Running out of buffer fails near its end; anything earlier is damage
+                if (self.eof or e.pos < len(self.buffer) - 4096
+                        or len(self.buffer) - self.pos > MAX_RECORD_SIZE or not self._more()):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and isinstance(value, (int, float)) and self._more():
+                continue
+            self.pos = end
+            return value
+
+    def _expect(self, token: str):
+        if self._peek() != token:
+            found = self._peek() or "end of file"
+            raise json.JSONDecodeError(f"expected '{token}', found {found!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def _resync(self) -> Optional[str]:
+        """Skip to the next entry; returns the skipped text, or None if no entry follows"""
+        skipped = ""
+        while True:
+            match = NEXT_ENTRY.search(self.buffer, self.pos)
+            if match is not None:
+                skipped += self.buffer[self.pos:match.start()]
+                self.pos = match.start()
+                return skipped[:RAW_LIMIT]
+            # Keep a tail in case the separator straddles two chunks
+            keep = max(self.pos, len(self.buffer) - 8)
+            skipped = (skipped + self.buffer[self.pos:keep])[:RAW_LIMIT]
+            self.pos = keep
+            if not self._more():
+                return None
+
+    def __iter__(self) -> Iterator[Tuple[Optional[str], Any]]:
+        try:
+            self._expect("{")
+            if self._peek() == "}":
+                return
+        except json.JSONDecodeError as e:
+            raise ValueError(f"not a JSON object of user records: {e.msg}") from None
+
+        first = True
+        while True:
+            self.mark = self.pos
+            user_id = None
+            try:
+                if not first:
+                    if self._peek() == "}":
+                        return
+                    self._expect(",")
+                    self.mark = self.pos
+                first = False
+                user_id = self._decode()
+                if not isinstance(user_id, str):
+                    raise json.JSONDecodeError("user id is not a string", self.buffer, self.pos)
+                self._expect(":")
+                record = self._decode()
+            except json.JSONDecodeError as e:
+                user_id = user_id if isinstance(user_id, str) else None
+                if self.eof and not NEXT_ENTRY.search(self.buffer, self.pos):
+                    yield user_id, Unreadable(f"invalid JSON ({e.msg}); the table ends here",
+                                              self.buffer[self.mark:][:RAW_LIMIT])
+                    return
+                raw = self.buffer[self.mark:self.pos]
+                self.mark = None
+                skipped = self._resync()
+                yield user_id, Unreadable(f"invalid JSON ({e.msg})", (raw + (skipped or ""))[:RAW_LIMIT])
+                if skipped is None:
+                    return
+                continue
+            yield user_id, record
+
+def read_json(path: str) -> Iterator[Tuple[Optional[str], Any]]:
+    with open_text(path, "r") as f:
+        yield from JsonTableReader(f)
+
+def read_ndjson(path: str) -> Iterator[Tuple[Optional[str], Any]]:
+    with open_text(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield _parse_line(line)
+
+def read_sqlite(path: str) -> Iterator[Tuple[Optional[str], Any]]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        # Rows are fetched as the cursor advances, not all at once
+        for user_id, data in connection.execute("SELECT user_id, data FROM users ORDER BY user_id"):
+            try:
+                yield user_id, json.loads(data)
+            except json.JSONDecodeError as e:
+                yield user_id, Unreadable(f"invalid JSON: {e.msg}", data[:RAW_LIMIT])
+    finally:
+        connection.close()
+
+def read_snapshot(path: str) -> Iterator[Tuple[Optional[str], Any]]:
+    with open(path, "rb") as f:
+        header = f.read(len(SNAPSHOT_MAGIC) + 2)
+        if header[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a user data snapshot")
+        version, = struct.unpack("<H", header[len(SNAPSHOT_MAGIC):])
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is snapshot version {version}, this tool reads {SNAPSHOT_VERSION}")
+
+        total = 0
+        while True:
+            block = f.read(BLOCK_HEADER.size)
+            if len(block) < BLOCK_HEADER.size:
+                yield None, Unreadable(f"snapshot is truncated after {total} records", "")
+                return
+            count, raw_size, size, checksum = BLOCK_HEADER.unpack(block)
+            if count == 0:
+                footer = f.read(SNAPSHOT_FOOTER.size)
+                if len(footer) < SNAPSHOT_FOOTER.size or SNAPSHOT_FOOTER.unpack(footer)[0] != total:
+                    yield None, Unreadable(f"snapshot footer does not match the {total} records read", "")
+                return
+            compressed = f.read(size)
+            total += count
+            if len(compressed) < size or zlib.crc32(compressed) != checksum:
+                yield None, Unreadable(f"block of {count} records failed its checksum", "")
+                continue
+            for line in zlib.decompress(compressed, bufsize=raw_size).decode("utf-8").splitlines():
+                yield _parse_line(line)
+
+READERS = {"json": read_json, "ndjson": read_ndjson, "sqlite": read_sqlite, "snapshot": read_snapshot}
+
+class Writer:
+    """Writes records to a temporary file that replaces `path` on commit"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.temp_path = f"{path}.partial"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write(self, user_id: str, record: Dict[str, Any]):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the temporary file"""
+
+    def commit(self):
+        self.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+class JsonWriter(Writer):
+    """The layout JsonStore writes, so the bot can load the result directly"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.f = open_text(self.temp_path, "w", path.endswith(".gz"))
+        self.count = 0
+
+    def write(self, user_id: str, record: Dict[str, Any]):
+        self.f.write(",\n    " if self.count else "{\n    ")
+        self.f.write(f"{json.dumps(user_id)}: {json.dumps(record, indent=4)}".replace("\n", "\n    "))
+        self.count += 1
+
+    def close(self):
+        if not self.f.closed:
+            self.f.write("\n}" if self.count else "{}")
+            self.f.close()
+
+class NdjsonWriter(Writer):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.f = open_text(self.temp_path, "w", path.endswith(".gz"))
+
+    def write(self, user_id: str, record: Dict[str, Any]):
+        self.f.write(_line(user_id, record) + "\n")
+
+    def close(self):
+        self.f.close()
+
+class SqliteWriter(Writer):
+    """A fresh database in the SQLite backend's schema, filled in batched transactions"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.connection = sqlite3.connect(self.temp_path, isolation_level=None)
+        # The file only becomes live after a complete run, so skip the journal
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.executescript(SQLITE_SCHEMA)
+        self.rows = []
+
+    def write(self, user_id: str, record: Dict[str, Any]):
+        self.rows.append((user_id, json.dumps(record)))
+        if len(self.rows) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self.connection.execute("BEGIN")
+        # A user id seen twice keeps its last record, as json.load would
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO users (user_id, data, revision, writer, version) VALUES (?, ?, 1, 'import', 1)",
+            self.rows
+        )
+        self.connection.execute("COMMIT")
+        self.rows = []
+
+    def close(self):
+        if self.connection is not None:
+            if self.rows:
+                self._flush()
+            self.connection.close()
+            self.connection = None
+
+class SnapshotWriter(Writer):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.f = open(self.temp_path, "wb")
+        self.f.write(SNAPSHOT_MAGIC + struct.pack("<H", SNAPSHOT_VERSION))
+        self.lines = []
+        self.total = 0
+
+    def write(self, user_id: str, record: Dict[str, Any]):
+        self.lines.append(_line(user_id, record))
+        if len(self.lines) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        raw = "\n".join(self.lines).encode("utf-8")
+        compressed = zlib.compress(raw, 6)
+        self.f.write(BLOCK_HEADER.pack(len(self.lines), len(raw), len(compressed), zlib.crc32(compressed)))
+        self.f.write(compressed)
+        self.total += len(self.lines)
+        self.lines = []
+
+    def close(self):
+        if not self.f.closed:
+            if self.lines:
+                self._flush()
+            self.f.write(BLOCK_HEADER.pack(0, 0, 0, 0) + SNAPSHOT_FOOTER.pack(self.total))
+            self.f.close()
+
+WRITERS = {"json": JsonWriter, "ndjson": NdjsonWriter, "sqlite": SqliteWriter, "snapshot": SnapshotWriter}
+
+class Quarantine:
+    """NDJSON file of rejected records, opened at the first one"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.f = None
+        self.count = 0
+
+    def add(self, user_id: Optional[str], problems: list, record: Any = None, raw: Optional[str] = None):
+        if self.f is None:
+            self.f = open_text(self.path, "w")
+        entry = {"user_id": user_id, "errors": problems}
+        if raw is not None:
+            entry["raw"] = raw
+        else:
+            entry["record"] = record
+        self.f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+def check_record(user_id: Optional[str], record: Any, game_config: Dict[str, Any]) -> Tuple[list, bool]:
+    """Migrate a record in place if it is old; returns its problems and whether it was migrated"""
+    if not isinstance(user_id, str) or not user_id.isdigit():
+        return ["user id is not a Discord id"], False
+    migrated = False
+    if isinstance(record, dict) and record.get("schema", 1) < rules.SCHEMA_VERSION:
+        try:
+            migrated = rules.migrate_record(record, game_config)
+        except (TypeError, ValueError, AttributeError):
+            return ["record cannot be migrated"], False
+    return rules.validate_record(record, game_config), migrated
+
+def convert(source: str, source_format: str, target: Optional[str], target_format: Optional[str],
+            quarantine_path: str, game_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Stream every record from source to target (None only checks) and return the counts"""
+    counts = Counter()
+    problems_seen = Counter()
+    quarantine = Quarantine(quarantine_path)
+    writer = WRITERS[target_format](target) if target is not None else None
+    began = time.perf_counter()
+    try:
+        for user_id, record in READERS[source_format](source):
+            counts["read"] += 1
+            if isinstance(record, Unreadable):
+                problems_seen[record.reason] += 1
+                quarantine.add(user_id, [record.reason], raw=record.raw)
+                continue
+            problems, migrated = check_record(user_id, record, game_config)
+            counts["migrated"] += migrated
+            if problems:
+                problems_seen.update(problems)
+                quarantine.add(user_id, problems, record=record)
+                continue
+            if writer is not None:
+                writer.write(user_id, record)
+            counts["written"] += 1
+            if counts["read"] % 100_000 == 0:
+                logger.info("%d records read", counts["read"])
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        quarantine.close()
+    if writer is not None:
+        writer.commit()
+    return {
+        "elapsed": time.perf_counter() - began,
+        "read": counts["read"],
+        "written": counts["written"],
+        "migrated": counts["migrated"],
+        "quarantined": quarantine.count,
+        "problems": problems_seen
+    }
+
+def print_report(result: Dict[str, Any], target: Optional[str], quarantine_path: str):
+    """Print the counts and the most common problems"""
+    elapsed = result["elapsed"]
+    valid = "written to " + target if target is not None else "valid"
+    print(f"Read {result['read']:,} records in {elapsed:.2f}s "
+          f"({result['read'] / elapsed if elapsed else 0:,.0f}/s): {result['written']:,} {valid}, "
+          f"{result['migrated']:,} migrated from older versions")
+    if result["quarantined"]:
+        print(f"{result['quarantined']:,} records quarantined in {quarantine_path}:")
+        for problem, count in result["problems"].most_common(20):
+            print(f"  {count:>10,}  {problem}")
+
+def main():
+    """Parse arguments and run the conversion or check"""
+    parser = argparse.ArgumentParser(description="Convert, migrate and check Sunshine Solar Sim user data offline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="Copy the valid records to another file or format")
+    convert_parser.add_argument("source", help="Input file")
+    convert_parser.add_argument("target", help="Output file; must not exist unless --force is given")
+    convert_parser.add_argument("--to", dest="target_format", choices=FORMATS, help="Output format (default: from the name)")
+    convert_parser.add_argument("--force", action="store_true", help="Replace the output file if it exists")
+    check_parser = commands.add_parser("check", help="Only validate the records")
+    check_parser.add_argument("source", help="Input file")
+    for subparser in (convert_parser, check_parser):
+        subparser.add_argument("--from", dest="source_format", choices=FORMATS, help="Input format (default: from the name)")
+        subparser.add_argument("--quarantine", help="Where rejected records go (default: next to the output)")
+        subparser.add_argument("--balance", default=config.BALANCE_FILE, help="Balance file to validate against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    target = getattr(args, "target", None)
+    try:
+        source_format = args.source_format or detect_format(args.source)
+        target_format = None
+        if target is not None:
+            target_format = args.target_format or detect_format(target)
+            if os.path.abspath(target) == os.path.abspath(args.source):
+                parser.error("the output must be a different file from the input")
+            if os.path.exists(target) and not args.force:
+                parser.error(f"{target} exists; pass --force to replace it")
+    except ValueError as e:
+        parser.error(str(e))
+    quarantine_path = args.quarantine or f"{target or args.source}.rejected.ndjson"
+    game_config = config.load_balance(args.balance).config
+
+    try:
+        result = convert(args.source, source_format, target, target_format, quarantine_path, game_config)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error("Failed to read %s: %s", args.source, e)
+        return 2
+    print_report(result, target, quarantine_path)
+    return 1 if result["quarantined"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Production Model
+Deterministic, seedable time-of-day and weather multipliers for generator
+output.
+
+Each generator type has a profile: "solar" follows a daily sun curve dimmed
+by cloud cover, "wind" follows a mean-reverting random walk and "constant"
+always runs at its rated output. A day's multipliers are precomputed into
+per-minute tables (plus running totals) the first time that day is needed,
+so a tick costs one table lookup per generator type, and accrual over any
+span of minutes costs two lookups per type.
+"""
+import math
+import random
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+MINUTES_PER_DAY = 60 * 24
+
+PROFILES = ("constant", "solar", "wind")
+
+class DayTable:
+    """Per-minute multipliers of one game day for every profile"""
+    __slots__ = ("multipliers", "cumulative")
+
+    def __init__(self, multipliers: Dict[str, List[float]]):
+        self.multipliers = multipliers
+        # cumulative[profile][m] is the sum of the first m multipliers
+        self.cumulative = {}
+        for profile, values in multipliers.items():
+            running = [0.0]
+            total = 0.0
+            for value in values:
+                total += value
+                running.append(total)
+            self.cumulative[profile] = running
+
+class ProductionModel:
+    """Seeded multiplier tables keyed by absolute game minute (Unix time // 60)"""
+
+    # Day tables kept in memory: yesterday, today and tomorrow cover every tick
+    cache_days = 3
+
+    def __init__(self, settings: Dict[str, Any], profiles: Sequence[str]):
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise ValueError(f"unknown production profile '{profile}', expected one of {', '.join(PROFILES)}")
+        self.profiles = tuple(profiles)
+        self.seed = settings.get("seed", 0)
+        self.sunrise = settings.get("sunrise_hour", 6) * 60
+        self.sunset = settings.get("sunset_hour", 20) * 60
+        self.mean_cloud = settings.get("mean_cloud", 0.25)
+        self.cloud_variability = settings.get("cloud_variability", 0.15)
+        self.wind_reversion = settings.get("wind_reversion", 0.02)
+        self.wind_volatility = settings.get("wind_volatility", 0.05)
+        self.wind_max = settings.get("wind_max", 2.5)
+        if not 0 <= self.sunrise < self.sunset <= MINUTES_PER_DAY:
+            raise ValueError("production: sunrise_hour must be before sunset_hour, both within the day")
+        if not 0 <= self.mean_cloud < 1:
+            raise ValueError("production: mean_cloud must be in [0, 1)")
+        self._days: "OrderedDict[int, DayTable]" = OrderedDict()
+
+    def _rng(self, day: int, profile: str) -> random.Random:
+        # String seeds hash deterministically, unlike hash() of a tuple
+        return random.Random(f"{self.seed}:{day}:{profile}")
+
+    def _solar(self, day: int) -> List[float]:
+        rng = self._rng(day, "solar")
+        daylight = self.sunset - self.sunrise
+        # A half sine over daylight has mean 2/pi across the daylight hours;
+        # scale it so the clear-sky day averages 1, then undo the mean cloud
+        # cover so the expected daily output matches the rated output.
+        scale = (MINUTES_PER_DAY / daylight) * (math.pi / 2) / (1 - self.mean_cloud)
+        cloud = min(0.95, max(0.0, rng.gauss(self.mean_cloud, self.cloud_variability)))
+        values = []
+        for minute in range(MINUTES_PER_DAY):
+            if minute % 60 == 0:
+                # Cloud cover drifts hour to hour
+                cloud += (self.mean_cloud - cloud) * 0.3 + rng.gauss(0, self.cloud_variability / 2)
+                cloud = min(0.95, max(0.0, cloud))
+            if self.sunrise <= minute < self.sunset:
+                sun = math.sin(math.pi * (minute - self.sunrise + 0.5) / daylight)
+                values.append(sun * scale * (1 - cloud))
+            else:
+                values.append(0.0)
+        return values
+
+    def _wind(self, day: int) -> List[float]:
+        rng = self._rng(day, "wind")
+        speed = min(self.wind_max, max(0.0, rng.gauss(1.0, 0.4)))
+        values = []
+        for _ in range(MINUTES_PER_DAY):
+            speed += self.wind_reversion * (1.0 - speed) + rng.gauss(0, self.wind_volatility)
+            speed = min(self.wind_max, max(0.0, speed))
+            values.append(speed)
+        return values
+
+    def day_table(self, day: int) -> DayTable:
+        """Tables for one day, computed on first use"""
+        table = self._days.get(day)
+        if table is None:
+            multipliers = {"constant": [1.0] * MINUTES_PER_DAY}
+            if "solar" in self.profiles:
+                multipliers["solar"] = self._solar(day)
+            if "wind" in self.profiles:
+                multipliers["wind"] = self._wind(day)
+            table = self._days[day] = DayTable(multipliers)
+            while len(self._days) > self.cache_days:
+                self._days.popitem(last=False)
+        else:
+            self._days.move_to_end(day)
+        return table
+
+    def multipliers(self, minute: int) -> Tuple[float, ...]:
+        """Multiplier of each generator type (catalog order) for an absolute minute"""
+        day, minute_of_day = divmod(minute, MINUTES_PER_DAY)
+        table = self.day_table(day).multipliers
+        return tuple(table[profile][minute_of_day] for profile in self.profiles)
+
+    def accrued(self, start: int, end: int) -> Tuple[float, ...]:
+        """Sum of each generator type's multipliers over minutes [start, end)"""
+        totals = [0.0] * len(self.profiles)
+        minute = start
+        while minute < end:
+            day, offset = divmod(minute, MINUTES_PER_DAY)
+            stop = min(end - day * MINUTES_PER_DAY, MINUTES_PER_DAY)
+            cumulative = self.day_table(day).cumulative
+            for index, profile in enumerate(self.profiles):
+                totals[index] += cumulative[profile][stop] - cumulative[profile][offset]
+            minute = day * MINUTES_PER_DAY + stop
+        return tuple(totals)